@@ -2,7 +2,7 @@
 
 import { useEffect, useMemo, useState } from 'react';
 import { useParams, useRouter } from 'next/navigation';
-import axios from '@/lib/api';
+import axios, { fetchProjectBundle } from '@/lib/api';
 import { useAuth } from '@/contexts/AuthContext';
 import toast from 'react-hot-toast';
 
@@ -30,6 +30,7 @@ interface Proposal {
   cover_letter?: string;
   status: 'pending' | 'accepted' | 'rejected';
   created_at: string;
+  version?: number;
   executor?: UserLite;
 }
 interface FileUpload {
@@ -79,51 +80,29 @@ export default function ProjectDetailPage() {
     return user.role === 'admin' || user.id === project.employer_id || user.id === project.executor_id;
   }, [user, project]);
 
+  // One request for everything the page shows; sections the user may not
+  // see come back as null.
+  const loadBundle = async (projectId: number) => {
+    const bundle = await fetchProjectBundle(projectId);
+    setProject(bundle.project);
+    setProposals(bundle.proposals ?? []);
+    setFiles(bundle.files ?? []);
+  };
+
   useEffect(() => {
     if (!id) return;
-    const fetchAll = async () => {
-      try {
-        const [pRes] = await Promise.all([
-          axios.get(`/projects/${id}`),
-        ]);
-        setProject(pRes.data);
-        // Proposals for employer/admin
-        if (user && (user.role === 'admin' || user.id === pRes.data.employer_id)) {
-          fetchProposals(id);
-        }
-        // Files for involved users
-        if (user && (user.role === 'admin' || user.id === pRes.data.employer_id || user.id === pRes.data.executor_id)) {
-          fetchFiles(id);
-        }
-      } catch (e) {
-        router.push('/projects');
-      } finally {
-        setLoading(false);
-      }
-    };
-    fetchAll();
+    loadBundle(id)
+      .catch(() => router.push('/projects'))
+      .finally(() => setLoading(false));
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [id, user]);
 
-  const fetchProposals = async (projectId: number) => {
-    try {
-      const res = await axios.get(`/projects/${projectId}/proposals`);
-      setProposals(res.data);
-    } catch (e) {
-      // ignore if unauthorized
-    }
-  };
-
-  const fetchFiles = async (projectId: number) => {
+  const handleSubmitProposal = async (e: React.FormEvent) => {
+    e.preventDefault();
+    if (!id) return;
+    setSubmittingProposal(true);
     try {
-      const res = await axios.get(`/projects/${projectId}/files`);
-      setFiles(res.data);
-    } catch (e) {
-      // ignore if unauthorized
-    }
-  };
-
-  const handleAfterProposal = async () => {\r\n    if (id && user && (user.role === 'admin' || user.id === project?.employer_id)) {\r\n      await fetchProposals(id);\r\n    }\r\n  };\r\n
+      const payload: any = { project_id: id, cover_letter: proposalForm.cover_letter };
       if (proposalForm.proposed_price) payload.proposed_price = Number(proposalForm.proposed_price);
       if (proposalForm.proposed_timeline) payload.proposed_timeline = proposalForm.proposed_timeline;
 
@@ -140,13 +119,19 @@ export default function ProjectDetailPage() {
   const handleProposalDecision = async (proposalId: number, status: 'accepted' | 'rejected') => {
     if (!id) return;
     try {
-      await axios.put(`/proposals/${proposalId}`, { status });
+      // Only decide on the version shown; if it changed meanwhile the backend answers 412
+      const version = proposals.find((p) => p.id === proposalId)?.version;
+      const headers = version ? { 'If-Match': `"${version}"` } : undefined;
+      await axios.put(`/proposals/${proposalId}`, { status }, { headers });
       toast.success(status === 'accepted' ? 'پیشنهاد پذیرفته شد' : 'پیشنهاد رد شد');
-      await fetchProposals(id);
-      // Refresh project to reflect executor/status
-      const p = await axios.get(`/projects/${id}`);
-      setProject(p.data);
+      // Refresh proposals and the project's executor/status together
+      await loadBundle(id);
     } catch (error: any) {
+      if (error.response?.status === 412) {
+        toast.error('این پیشنهاد در این فاصله تغییر کرده است؛ نسخهٔ جدید بارگذاری شد');
+        await loadBundle(id);
+        return;
+      }
       toast.error(error.response?.data?.detail || 'عملیات ناموفق بود');
     }
   };
@@ -163,7 +148,7 @@ export default function ProjectDetailPage() {
       toast.success('فایل با موفقیت بارگذاری شد');
       setSelectedFile(null);
       setIsFinalDelivery(false);
-      await fetchFiles(id);
+      await loadBundle(id);
     } catch (error: any) {
       toast.error(error.response?.data?.detail || 'بارگذاری ناموفق بود');
     } finally {
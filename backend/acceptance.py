@@ -0,0 +1,79 @@
+"""
+Proposal acceptance workflow.
+
+Accepting a proposal assigns the executor, moves the project to
+IN_PROGRESS, rejects every other pending proposal and marks the source idea
+as IN_PROJECT, all in the caller's transaction. The project row is read
+with SELECT ... FOR UPDATE, so concurrent acceptances for the same project
+queue behind each other; the assignment itself is a compare-and-set on
+`executor_id IS NULL`, so on databases without row locks (SQLite) exactly
+one acceptance still wins and the others see a conflict. These are Core
+UPDATEs, so they bump each row's `version` themselves (see etags.py).
+"""
+from typing import Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import events
+from database import Idea, IdeaStatus, Project, ProjectStatus, Proposal, ProposalStatus
+
+
+def load_for_update(db: Session, proposal_id: int, lock: bool = False) -> Optional[Tuple[Proposal, Project]]:
+    """A proposal and its project in one query; `lock` takes a row lock on the project."""
+    query = db.query(Proposal, Project).join(Project, Project.id == Proposal.project_id).filter(Proposal.id == proposal_id)
+    if lock:
+        query = query.with_for_update(of=Project)
+    return query.first()
+
+
+def accept_proposal(db: Session, proposal: Proposal, project: Project, actor_id: Optional[int] = None) -> bool:
+    """Accept `proposal`; False if the project already has an executor. The caller commits."""
+    claimed = db.execute(
+        update(Project)
+        .where(
+            Project.id == project.id,
+            Project.executor_id.is_(None),
+            Project.status == ProjectStatus.NEW,
+        )
+        .values(executor_id=proposal.executor_id, status=ProjectStatus.IN_PROGRESS, version=Project.version + 1),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    if claimed != 1:
+        return False
+
+    db.execute(
+        update(Proposal).where(Proposal.id == proposal.id)
+        .values(status=ProposalStatus.ACCEPTED, version=Proposal.version + 1),
+        execution_options={"synchronize_session": False},
+    )
+    rejected = db.execute(
+        update(Proposal)
+        .where(
+            Proposal.project_id == project.id,
+            Proposal.id != proposal.id,
+            Proposal.status == ProposalStatus.PENDING,
+        )
+        .values(status=ProposalStatus.REJECTED, version=Proposal.version + 1)
+        .returning(Proposal.id, Proposal.executor_id),
+        execution_options={"synchronize_session": False},
+    ).all()
+    if project.idea_id is not None:
+        db.execute(
+            update(Idea).where(Idea.id == project.idea_id)
+            .values(status=IdeaStatus.IN_PROJECT, version=Idea.version + 1),
+            execution_options={"synchronize_session": False},
+        )
+
+    events.emit(
+        db, "proposal.accepted",
+        project_id=project.id, actor_id=actor_id, proposal_id=proposal.id,
+        executor_id=proposal.executor_id, employer_id=project.employer_id,
+    )
+    for proposal_id, executor_id in rejected:
+        events.emit(
+            db, "proposal.rejected",
+            project_id=project.id, actor_id=actor_id, proposal_id=proposal_id,
+            executor_id=executor_id, employer_id=project.employer_id,
+        )
+    return True
@@ -0,0 +1,311 @@
+"""
+Daily platform rollups for the admin analytics endpoints.
+
+`run_rollup` maintains one daily_stats row per UTC day and one
+daily_project_status row per (day, status). Together they hold:
+  - new ideas, projects and proposals
+  - accepted and rejected proposals, and the acceptance rate derived
+    from them
+  - distinct projects proposed on, for proposals per project
+  - the median proposed price, the median budget and the median
+    proposed-price-to-budget ratio
+  - ratings and their sum, for the average rating
+  - projects by their current ProjectStatus
+
+Decisions and status changes count on the day the proposal or project
+was created, so they can change a day long after it was first rolled up.
+The job is incremental. Each round recomputes the days from the newest
+rollup minus ROLLUP_LOOKBACK_DAYS. It also goes back to the creation day
+of any proposal or project whose `updated_at` is newer than the last
+round. That covers a proposal accepted a month after it was made. Raw
+rows of that window are read once, from a replica
+when one is configured. They are grouped per day with NumPy (unique,
+bincount, lexsort) rather than a GROUP BY per metric, so the primary only
+receives the small rollup writes.
+
+Admin endpoints read the rollup tables only.
+
+Run it on a schedule with `python analytics.py --rollup` (every
+ROLLUP_INTERVAL_SECONDS). Pass `--once` for a single round or `--full` to
+rebuild from the first day.
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import DailyProjectStatus, DailyStats, Idea, Project, ProjectStatus, Proposal, ProposalStatus, Rating
+from storage import naive_utc
+
+logger = logging.getLogger("masna.analytics")
+
+ROLLUP_LOOKBACK_DAYS = int(os.getenv("ROLLUP_LOOKBACK_DAYS", "7"))
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("ROLLUP_INTERVAL_SECONDS", "3600"))
+# Changes are looked for this far before the last round, to cover replica lag and clock skew.
+ROLLUP_CHANGE_SLACK_SECONDS = int(os.getenv("ROLLUP_CHANGE_SLACK_SECONDS", "300"))
+EPOCH = date(1970, 1, 1)
+
+
+def _day_numbers(values) -> "np.ndarray":
+    """Days since the epoch (UTC) of a sequence of datetimes."""
+    import numpy as np
+
+    return np.array([naive_utc(v) for v in values], dtype="datetime64[D]").astype(np.int64)
+
+
+def _grouped_medians(keys, values) -> Dict[int, float]:
+    """Median of `values` per distinct key, from one sort of both arrays."""
+    import numpy as np
+
+    if len(keys) == 0:
+        return {}
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    unique, starts = np.unique(keys, return_index=True)
+    ends = np.append(starts[1:], len(keys))
+    return {int(k): float(np.median(values[s:e])) for k, s, e in zip(unique, starts, ends)}
+
+
+def _counts(days, first: int, size: int, weights=None):
+    import numpy as np
+
+    if len(days) == 0:
+        return np.zeros(size, dtype=np.int64)
+    return np.bincount(days - first, weights=weights, minlength=size)
+
+
+def compute_rollups(db: Session, start: date, end: date) -> Tuple[List[dict], List[dict]]:
+    """daily_stats and daily_project_status rows for the days start..end (inclusive)."""
+    import numpy as np
+
+    # Taken before reading: a row changed while this round reads is seen as changed by the next one.
+    now = datetime.utcnow()
+    since = datetime.combine(start, datetime.min.time())
+    until = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    first = (start - EPOCH).days
+    size = (end - start).days + 1
+
+    idea_days = _day_numbers([r[0] for r in db.query(Idea.created_at).filter(
+        Idea.created_at >= since, Idea.created_at < until)])
+
+    projects = db.query(Project.created_at, Project.status).filter(
+        Project.created_at >= since, Project.created_at < until).all()
+    project_days = _day_numbers([r[0] for r in projects])
+    project_status = np.array([r[1].value if r[1] else "new" for r in projects], dtype=object)
+
+    proposals = (
+        db.query(Proposal.created_at, Proposal.status, Proposal.project_id, Proposal.proposed_price, Project.budget)
+        .join(Project, Project.id == Proposal.project_id)
+        .filter(Proposal.created_at >= since, Proposal.created_at < until)
+        .all()
+    )
+    proposal_days = _day_numbers([r[0] for r in proposals])
+    proposal_status = np.array([r[1].value if r[1] else "pending" for r in proposals], dtype=object)
+    project_ids = np.array([r[2] for r in proposals], dtype=np.int64)
+    prices = np.array([r[3] if r[3] is not None else np.nan for r in proposals], dtype=float)
+    budgets = np.array([r[4] if r[4] is not None else np.nan for r in proposals], dtype=float)
+
+    ratings = db.query(Rating.created_at, Rating.rating).filter(
+        Rating.created_at >= since, Rating.created_at < until).all()
+    rating_days = _day_numbers([r[0] for r in ratings])
+    rating_values = np.array([r[1] for r in ratings], dtype=float)
+
+    new_ideas = _counts(idea_days, first, size)
+    new_projects = _counts(project_days, first, size)
+    new_proposals = _counts(proposal_days, first, size)
+    accepted = _counts(proposal_days[proposal_status == ProposalStatus.ACCEPTED.value], first, size)
+    rejected = _counts(proposal_days[proposal_status == ProposalStatus.REJECTED.value], first, size)
+    # Distinct (day, project) pairs, counted per day.
+    pairs = np.unique(np.stack([proposal_days, project_ids], axis=1), axis=0) if len(proposals) else np.empty((0, 2), np.int64)
+    projects_proposed_on = _counts(pairs[:, 0], first, size)
+    new_ratings = _counts(rating_days, first, size)
+    rating_sum = _counts(rating_days, first, size, weights=rating_values)
+
+    priced = ~np.isnan(prices)
+    median_price = _grouped_medians(proposal_days[priced], prices[priced])
+    budgeted = ~np.isnan(budgets)
+    median_budget = _grouped_medians(proposal_days[budgeted], budgets[budgeted])
+    comparable = priced & budgeted & (budgets > 0)
+    median_ratio = _grouped_medians(proposal_days[comparable], prices[comparable] / budgets[comparable])
+
+    stats = []
+    for i in range(size):
+        day_number = first + i
+        stats.append({
+            "day": EPOCH + timedelta(days=day_number),
+            "new_ideas": int(new_ideas[i]),
+            "new_projects": int(new_projects[i]),
+            "new_proposals": int(new_proposals[i]),
+            "accepted_proposals": int(accepted[i]),
+            "rejected_proposals": int(rejected[i]),
+            "projects_with_proposals": int(projects_proposed_on[i]),
+            "median_proposed_price": median_price.get(day_number),
+            "median_budget": median_budget.get(day_number),
+            "median_price_to_budget": median_ratio.get(day_number),
+            "new_ratings": int(new_ratings[i]),
+            "rating_sum": int(rating_sum[i]),
+            "computed_at": now,
+        })
+
+    statuses = []
+    for status in np.unique(project_status) if len(projects) else []:
+        counts = _counts(project_days[project_status == status], first, size)
+        for i in np.nonzero(counts)[0]:
+            statuses.append({
+                "day": EPOCH + timedelta(days=first + int(i)), "status": ProjectStatus(status), "projects": int(counts[i]),
+            })
+    return stats, statuses
+
+
+def first_activity_day(db: Session) -> Optional[date]:
+    firsts = [db.query(func.min(column)).scalar() for column in
+              (Idea.created_at, Project.created_at, Proposal.created_at, Rating.created_at)]
+    firsts = [naive_utc(f) for f in firsts if f is not None]
+    return min(firsts).date() if firsts else None
+
+
+def first_changed_day(db: Session, since: datetime) -> Optional[date]:
+    """Creation day of the oldest proposal or project changed (decided, status set) since `since`."""
+    firsts = [db.query(func.min(model.created_at)).filter(model.updated_at >= since).scalar()
+              for model in (Proposal, Project)]
+    firsts = [naive_utc(f) for f in firsts if f is not None]
+    return min(firsts).date() if firsts else None
+
+
+def run_rollup(db: Session, read_db: Optional[Session] = None, full: bool = False,
+               lookback_days: int = ROLLUP_LOOKBACK_DAYS, today: Optional[date] = None) -> int:
+    """Recompute the stale days; returns how many days were written."""
+    read_db = read_db or db
+    today = today or datetime.utcnow().date()
+    newest = None if full else db.query(func.max(DailyStats.day)).scalar()
+    if newest is not None:
+        start = min(newest, today) - timedelta(days=lookback_days)
+        last_round = db.query(func.max(DailyStats.computed_at)).scalar()
+        if last_round is not None:
+            changed = first_changed_day(
+                read_db, naive_utc(last_round) - timedelta(seconds=ROLLUP_CHANGE_SLACK_SECONDS))
+            if changed is not None and changed < start:
+                start = changed
+    else:
+        start = first_activity_day(read_db)
+        if start is None:
+            return 0
+    stats, statuses = compute_rollups(read_db, start, today)
+
+    db.query(DailyStats).filter(DailyStats.day >= start).delete(synchronize_session=False)
+    db.query(DailyProjectStatus).filter(DailyProjectStatus.day >= start).delete(synchronize_session=False)
+    db.bulk_insert_mappings(DailyStats, stats)
+    db.bulk_insert_mappings(DailyProjectStatus, statuses)
+    db.commit()
+    return len(stats)
+
+
+def _daily_row(row: DailyStats, statuses: Dict[str, int]) -> dict:
+    decided = row.accepted_proposals + row.rejected_proposals
+    return {
+        "day": row.day,
+        "new_ideas": row.new_ideas,
+        "new_projects": row.new_projects,
+        "new_proposals": row.new_proposals,
+        "accepted_proposals": row.accepted_proposals,
+        "rejected_proposals": row.rejected_proposals,
+        "acceptance_rate": row.accepted_proposals / decided if decided else None,
+        "proposals_per_project": (row.new_proposals / row.projects_with_proposals
+                                  if row.projects_with_proposals else None),
+        "median_proposed_price": row.median_proposed_price,
+        "median_budget": row.median_budget,
+        "median_price_to_budget": row.median_price_to_budget,
+        "new_ratings": row.new_ratings,
+        "average_rating": row.rating_sum / row.new_ratings if row.new_ratings else None,
+        "projects_by_status": statuses,
+    }
+
+
+def daily(db: Session, start: date, end: date) -> List[dict]:
+    rows = db.query(DailyStats).filter(DailyStats.day >= start, DailyStats.day <= end).order_by(DailyStats.day).all()
+    statuses: Dict[date, Dict[str, int]] = {}
+    for row in db.query(DailyProjectStatus).filter(DailyProjectStatus.day >= start, DailyProjectStatus.day <= end):
+        statuses.setdefault(row.day, {})[row.status.value] = row.projects
+    return [_daily_row(row, statuses.get(row.day, {})) for row in rows]
+
+
+def summary(db: Session, start: date, end: date) -> dict:
+    """Totals over start..end; rates are weighted by the underlying counts, not averaged per day."""
+    totals = db.query(
+        func.coalesce(func.sum(DailyStats.new_ideas), 0),
+        func.coalesce(func.sum(DailyStats.new_projects), 0),
+        func.coalesce(func.sum(DailyStats.new_proposals), 0),
+        func.coalesce(func.sum(DailyStats.accepted_proposals), 0),
+        func.coalesce(func.sum(DailyStats.rejected_proposals), 0),
+        func.coalesce(func.sum(DailyStats.projects_with_proposals), 0),
+        func.coalesce(func.sum(DailyStats.new_ratings), 0),
+        func.coalesce(func.sum(DailyStats.rating_sum), 0),
+        func.max(DailyStats.computed_at),
+    ).filter(DailyStats.day >= start, DailyStats.day <= end).one()
+    ideas, projects, proposals, accepted, rejected, proposed_on, ratings, rating_sum, computed_at = totals
+    by_status = dict(
+        db.query(DailyProjectStatus.status, func.sum(DailyProjectStatus.projects))
+        .filter(DailyProjectStatus.day >= start, DailyProjectStatus.day <= end)
+        .group_by(DailyProjectStatus.status)
+        .all()
+    )
+    return {
+        "start": start,
+        "end": end,
+        "new_ideas": ideas,
+        "new_projects": projects,
+        "new_proposals": proposals,
+        "acceptance_rate": accepted / (accepted + rejected) if accepted + rejected else None,
+        "proposals_per_project": proposals / proposed_on if proposed_on else None,
+        "new_ratings": ratings,
+        "average_rating": rating_sum / ratings if ratings else None,
+        "projects_by_status": {status.value: int(count) for status, count in by_status.items()},
+        "computed_at": computed_at,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily analytics rollups")
+    parser.add_argument("--rollup", action="store_true", help="Recompute the recent days")
+    parser.add_argument("--full", action="store_true", help="Rebuild every day from the first activity")
+    parser.add_argument("--once", action="store_true", help="Run one round and exit instead of looping")
+    parser.add_argument("--interval", type=int, default=ROLLUP_INTERVAL_SECONDS, help="Seconds between rounds")
+    parser.add_argument("--lookback-days", type=int, default=ROLLUP_LOOKBACK_DAYS)
+    args = parser.parse_args()
+
+    if not args.rollup:
+        parser.print_help()
+        return
+
+    from database import SessionLocal, replica_router
+
+    logging.basicConfig(level=logging.INFO)
+    full = args.full
+    while True:
+        db = SessionLocal()
+        replica = replica_router.pick()
+        read_db = replica.session_factory() if replica else db
+        try:
+            started = time.perf_counter()
+            days = run_rollup(db, read_db, full=full, lookback_days=args.lookback_days)
+            logger.info("Rolled up %d days in %.2fs", days, time.perf_counter() - started)
+            full = False
+        except Exception:
+            logger.exception("Rollup round failed")
+            db.rollback()
+        finally:
+            if read_db is not db:
+                read_db.close()
+            db.close()
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
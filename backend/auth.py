@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Dict, Optional
+import threading
+import time
+import uuid
+from jose import JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from database import get_db, User
+from database import get_db, User, UserRole
 from schemas import TokenData
 import os
 from dotenv import load_dotenv
@@ -15,17 +17,120 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+
+# "database" resolves every request's user from the DB; "stateless" trusts the
+# signed id/role/version claims and only checks the version against a cache.
+AUTH_MODE = os.getenv("AUTH_MODE", "database")
+
+def _load_signing_keys() -> Dict[str, str]:
+    """Parse JWT_SIGNING_KEYS ("kid1:secret1,kid2:secret2"); falls back to SECRET_KEY."""
+    keys = {}
+    for item in os.getenv("JWT_SIGNING_KEYS", "").split(","):
+        if ":" in item:
+            kid, secret = item.split(":", 1)
+            keys[kid.strip()] = secret.strip()
+    if not keys:
+        keys["default"] = SECRET_KEY
+    return keys
+
+# Tokens are signed with the active key; every key listed stays valid for
+# verification, so a rotation adds a key, switches JWT_ACTIVE_KID, and drops
+# the old key once its tokens have expired.
+SIGNING_KEYS = _load_signing_keys()
+ACTIVE_KID = os.getenv("JWT_ACTIVE_KID") or next(iter(SIGNING_KEYS))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=12)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# For endpoints anonymous visitors may read: a missing token yields None instead of 401
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+
+class TokenVersionCache:
+    """Per-user token version counters, in Redis when REDIS_URL is set, else in-process."""
+
+    def __init__(self, redis_url: Optional[str] = None, ttl_seconds: Optional[int] = None):
+        # Redis is shared by every worker and updated on revocation, so it can
+        # hold versions for long; an in-process copy goes stale in the other
+        # workers and must expire quickly.
+        self.ttl_seconds = ttl_seconds or (3600 if redis_url else 30)
+        self._local: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url, socket_connect_timeout=0.2, socket_timeout=0.2)
+
+    def get(self, user_id: int) -> Optional[int]:
+        if self._redis is not None:
+            try:
+                value = self._redis.get(f"token_version:{user_id}")
+                return int(value) if value is not None else None
+            except Exception:
+                return None
+        with self._lock:
+            entry = self._local.get(user_id)
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def set(self, user_id: int, version: int) -> None:
+        if self._redis is not None:
+            try:
+                self._redis.set(f"token_version:{user_id}", version, ex=self.ttl_seconds)
+            except Exception:
+                pass
+            return
+        with self._lock:
+            self._local[user_id] = (version, time.monotonic() + self.ttl_seconds)
+
+token_versions = TokenVersionCache(os.getenv("REDIS_URL") if AUTH_MODE == "stateless" else None)
+
+class Principal:
+    """The authenticated caller as described by a stateless access token."""
+
+    def __init__(self, id: int, email: str, role: UserRole, token_version: int):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.token_version = token_version
+        self.is_active = True
+
+# passlib and jose.jwt (with its crypto backends) are imported on first use
+# rather than at startup; most workers never hash a password in their first second.
+_pwd_context = None
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=12)
+    return _pwd_context
+
+def __getattr__(name):
+    if name == "pwd_context":
+        return get_pwd_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hash a password."""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+def _encode(claims: dict) -> str:
+    from jose import jwt
+
+    return jwt.encode(claims, SIGNING_KEYS[ACTIVE_KID], algorithm=ALGORITHM, headers={"kid": ACTIVE_KID})
+
+def _decode(token: str) -> dict:
+    from jose import jwt
+
+    kid = jwt.get_unverified_header(token).get("kid")
+    key = SIGNING_KEYS.get(kid) if kid else SECRET_KEY
+    if key is None:
+        raise JWTError("Unknown signing key")
+    return jwt.decode(token, key, algorithms=[ALGORITHM])
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
@@ -34,35 +139,68 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+    to_encode.update({"exp": expire, "typ": "access"})
+    encoded_jwt = _encode(to_encode)
     return encoded_jwt
 
-def verify_token(token: str, credentials_exception):
+def create_refresh_token(user: User) -> str:
+    """Create a long-lived refresh token bound to the user's token version."""
+    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    return _encode({
+        "sub": user.email,
+        "uid": user.id,
+        "ver": user.token_version or 0,
+        "typ": "refresh",
+        "jti": uuid.uuid4().hex,
+        "exp": expire,
+    })
+
+def create_user_tokens(user: User) -> dict:
+    """Issue an access/refresh token pair carrying the user's id, role and token version."""
+    access_token = create_access_token(
+        data={"sub": user.email, "uid": user.id, "role": user.role.value, "ver": user.token_version or 0},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    return {"access_token": access_token, "refresh_token": create_refresh_token(user), "token_type": "bearer"}
+
+def verify_token(token: str, credentials_exception, token_type: str = "access"):
     """Verify and decode a JWT token."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode(token)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        token_data = TokenData(email=email)
-    except JWTError:
+        # Tokens issued before typed tokens existed carry no "typ" and are access tokens.
+        if payload.get("typ", "access") != token_type:
+            raise credentials_exception
+        token_data = TokenData(
+            email=email,
+            user_id=payload.get("uid"),
+            role=payload.get("role"),
+            version=payload.get("ver"),
+        )
+    except (JWTError, ValueError):
         raise credentials_exception
     return token_data
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get the current authenticated user."""
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Get the current authenticated user."""
+    credentials_exception = _credentials_exception()
+
     token_data = verify_token(token, credentials_exception)
     user = db.query(User).filter(User.email == token_data.email).first()
     if user is None:
         raise credentials_exception
+    if token_data.version is not None and token_data.version != user.token_version:
+        raise credentials_exception
     return user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)):
@@ -71,6 +209,54 @@ def get_current_active_user(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+def current_token_version(db: Session, user_id: int) -> Optional[int]:
+    """Token version of a user, from the cache or (on a miss) the database."""
+    version = token_versions.get(user_id)
+    if version is None:
+        row = db.query(User.token_version, User.is_active).filter(User.id == user_id).first()
+        if row is None or not row.is_active:
+            return None
+        version = row.token_version
+        token_versions.set(user_id, version)
+    return version
+
+def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Get the caller for read-only authorization.
+
+    In stateless mode the id and role come straight from the token and the DB
+    is only consulted on a token version cache miss; otherwise this is the
+    regular database-backed active user.
+    """
+    credentials_exception = _credentials_exception()
+    token_data = verify_token(token, credentials_exception)
+    if AUTH_MODE != "stateless" or None in (token_data.user_id, token_data.role, token_data.version):
+        return get_current_active_user(get_current_user(token, db))
+
+    if current_token_version(db, token_data.user_id) != token_data.version:
+        raise credentials_exception
+    return Principal(token_data.user_id, token_data.email, UserRole(token_data.role.value), token_data.version)
+
+def get_optional_principal(token: Optional[str] = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)):
+    """Like get_current_principal, but None for a request without a token; a bad token is still 401."""
+    if token is None:
+        return None
+    return get_current_principal(token, db)
+
+def refresh_user_tokens(db: Session, refresh_token: str) -> dict:
+    """Exchange a valid refresh token for a fresh token pair."""
+    credentials_exception = _credentials_exception()
+    token_data = verify_token(refresh_token, credentials_exception, token_type="refresh")
+    user = db.query(User).filter(User.id == token_data.user_id).first()
+    if user is None or not user.is_active or user.token_version != token_data.version:
+        raise credentials_exception
+    return create_user_tokens(user)
+
+def revoke_user_tokens(db: Session, user: User) -> None:
+    """Invalidate every token issued to the user by bumping their token version."""
+    user.token_version = (user.token_version or 0) + 1
+    db.commit()
+    token_versions.set(user.id, user.token_version)
+
 def authenticate_user(db: Session, email: str, password: str):
     """Authenticate a user with email and password."""
     user = db.query(User).filter(User.email == email).first()
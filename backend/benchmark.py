@@ -0,0 +1,281 @@
+"""
+Load-testing and benchmark suite for the API.
+
+Seeds a synthetic dataset at a configurable scale (see datagen.py), drives the real endpoints
+with concurrent clients and reports p50/p95/p99 latency and requests per
+second for each endpoint. Results can be saved as a JSON baseline; a later
+run compared against that baseline exits non-zero on regression.
+
+Examples:
+    python benchmark.py --database-url sqlite:///./bench.db --users 200
+    python benchmark.py --database-url sqlite:///./bench.db --save-baseline bench_baseline.json
+    python benchmark.py --database-url sqlite:///./bench.db --baseline bench_baseline.json --threshold 0.25
+    python benchmark.py --base-url http://localhost:8000 --no-seed
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+SEARCH_TERMS = ["app", "shop", "data", "سامانه", "هوشمند", "platform"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, math.ceil(pct / 100.0 * len(values)) - 1))
+    return values[rank]
+
+
+class Dataset:
+    """Ids and credentials of the seeded rows the scenarios pick from."""
+
+    def __init__(self):
+        self.user_ids: List[int] = []
+        self.idea_ids: List[int] = []
+        self.project_ids: List[int] = []
+        # project_id -> (employer_id, executor_id or None)
+        self.project_members: Dict[int, tuple] = {}
+        self.emails: Dict[int, str] = {}
+        self.roles: Dict[int, str] = {}
+
+
+def load_dataset(session) -> Dataset:
+    """Collect ids the scenarios need from whatever is in the database."""
+    from database import User, Idea, Project
+
+    data = Dataset()
+    for uid, email, role in session.query(User.id, User.email, User.role).all():
+        data.user_ids.append(uid)
+        data.emails[uid] = email
+        data.roles[uid] = role.value
+    data.idea_ids = [r[0] for r in session.query(Idea.id).all()]
+    for pid, employer_id, executor_id in session.query(Project.id, Project.employer_id, Project.executor_id).all():
+        data.project_ids.append(pid)
+        data.project_members[pid] = (employer_id, executor_id)
+    return data
+
+
+class Scenario:
+    """One endpoint to drive: a name and a function building each request."""
+
+    def __init__(self, name: str, build: Callable[[random.Random], dict]):
+        self.name = name
+        self.build = build
+
+
+def build_scenarios(data: Dataset, tokens: Dict[int, str]) -> List[Scenario]:
+    def auth(uid):
+        return {"Authorization": f"Bearer {tokens[uid]}"}
+
+    assigned = [pid for pid, (_, executor_id) in data.project_members.items() if executor_id]
+    any_user = list(tokens)
+
+    scenarios = [
+        Scenario("GET /ideas", lambda r: {"method": "GET", "url": "/ideas?limit=50"}),
+        Scenario("GET /ideas?search", lambda r: {"method": "GET", "url": f"/ideas?limit=50&search={r.choice(SEARCH_TERMS)}"}),
+        Scenario("GET /projects", lambda r: {"method": "GET", "url": "/projects?limit=50"}),
+        Scenario("GET /projects?search", lambda r: {"method": "GET", "url": f"/projects?limit=50&search={r.choice(SEARCH_TERMS)}"}),
+        Scenario("GET /users/me", lambda r: {"method": "GET", "url": "/users/me", "headers": auth(r.choice(any_user))}),
+        Scenario("GET /dashboard/stats", lambda r: {"method": "GET", "url": "/dashboard/stats", "headers": auth(r.choice(any_user))}),
+        Scenario("GET /users/{id}/ratings", lambda r: {"method": "GET", "url": f"/users/{r.choice(data.user_ids)}/ratings"}),
+    ]
+    if data.idea_ids:
+        scenarios.append(Scenario("GET /ideas/{id}", lambda r: {"method": "GET", "url": f"/ideas/{r.choice(data.idea_ids)}"}))
+    if data.project_ids:
+        scenarios.append(Scenario("GET /projects/{id}", lambda r: {"method": "GET", "url": f"/projects/{r.choice(data.project_ids)}"}))
+
+    owned = [pid for pid in data.project_ids if data.project_members[pid][0] in tokens]
+    if owned:
+        def proposals(r):
+            pid = r.choice(owned)
+            return {"method": "GET", "url": f"/projects/{pid}/proposals", "headers": auth(data.project_members[pid][0])}
+        scenarios.append(Scenario("GET /projects/{id}/proposals", proposals))
+
+    talking = [pid for pid in assigned if data.project_members[pid][0] in tokens]
+    if talking:
+        def messages(r):
+            pid = r.choice(talking)
+            return {"method": "GET", "url": f"/projects/{pid}/messages", "headers": auth(data.project_members[pid][0])}
+
+        def send(r):
+            pid = r.choice(talking)
+            employer_id, executor_id = data.project_members[pid]
+            return {
+                "method": "POST",
+                "url": "/messages",
+                "headers": auth(employer_id),
+                "json": {"project_id": pid, "receiver_id": executor_id, "content": "benchmark ping"},
+            }
+        scenarios.append(Scenario("GET /projects/{id}/messages", messages))
+        scenarios.append(Scenario("POST /messages", send))
+    return scenarios
+
+
+def run_scenario(client, scenario: Scenario, requests: int, concurrency: int, seed: int) -> dict:
+    """Fire `requests` calls at one endpoint from `concurrency` threads."""
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    rng = random.Random(seed)
+    calls = [scenario.build(rng) for _ in range(requests)]
+
+    def fire(call):
+        nonlocal errors
+        started = time.perf_counter()
+        response = client.request(**call)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fire, calls))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "rps": round(requests / wall, 2) if wall > 0 else 0.0,
+    }
+
+
+def compare_to_baseline(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Return a description of every endpoint that regressed past `threshold` or fails more often."""
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if base["rps"] and current["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{name}: rps {base['rps']} -> {current['rps']}")
+        # Fast 4xx/5xx responses would otherwise read as a latency improvement.
+        base_rate = base.get("errors", 0) / base["requests"] if base.get("requests") else 0.0
+        current_rate = current["errors"] / current["requests"] if current["requests"] else 0.0
+        if current_rate > base_rate:
+            regressions.append(f"{name}: errors {base.get('errors', 0)}/{base.get('requests', 0)} -> "
+                               f"{current['errors']}/{current['requests']}")
+    return regressions
+
+
+def print_report(results: Dict[str, dict]) -> None:
+    header = f"{'endpoint':<32} {'reqs':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<32} {r['requests']:>6} {r['errors']:>5} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['rps']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API against a seeded dataset")
+    parser.add_argument("--database-url", default=None,
+                        help="Disposable database to seed and serve from; required unless --no-seed")
+    parser.add_argument("--base-url", default=None, help="Drive a running server instead of the in-process app")
+    parser.add_argument("--no-seed", action="store_true", help="Use the data already in the database")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--ideas", type=int, default=1000)
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--proposals", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--ratings", type=int, default=300)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients per endpoint")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-baseline", default=None, help="Write results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Compare results with this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+    args = parser.parse_args()
+    if not args.no_seed and not args.database_url:
+        # Seeding drops every table, so it never falls back to the app's DATABASE_URL.
+        parser.error("seeding drops all tables: pass --database-url for a disposable database, or --no-seed")
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    # The in-process app would otherwise throttle the load generator itself.
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    # Imported after DATABASE_URL is set; database.py reads it at import time.
+    import database
+    from auth import create_access_token
+    from datagen import DEFAULT_PASSWORD, generate
+
+    session = database.SessionLocal()
+    try:
+        if not args.no_seed:
+            database.Base.metadata.drop_all(bind=database.engine)
+            database.Base.metadata.create_all(bind=database.engine)
+            scale = {k: getattr(args, k) for k in ("users", "ideas", "projects", "proposals", "messages", "ratings", "files")}
+            started = time.perf_counter()
+            generate(database.engine, scale, seed=args.seed, log=lambda line: None)
+            print(f"Seeded dataset {scale} in {time.perf_counter() - started:.1f}s")
+        data = load_dataset(session)
+    finally:
+        session.close()
+
+    if not data.user_ids:
+        print("Database is empty; run without --no-seed.")
+        sys.exit(1)
+
+    rng = random.Random(args.seed)
+    sample = rng.sample(data.user_ids, min(len(data.user_ids), 50))
+    # Every employer that owns a project gets a token so proposal and message
+    # scenarios can authenticate as the project owner.
+    sample = set(sample) | {members[0] for members in data.project_members.values()}
+
+    if args.base_url:
+        import httpx
+        client = httpx.Client(base_url=args.base_url, timeout=30.0)
+        tokens = {}
+        for uid in sample:
+            r = client.post("/auth/login", data={"username": data.emails[uid], "password": DEFAULT_PASSWORD})
+            if r.status_code == 200:
+                tokens[uid] = r.json()["access_token"]
+    else:
+        from fastapi.testclient import TestClient
+        from main import app
+        client = TestClient(app, raise_server_exceptions=False)
+        tokens = {uid: create_access_token({"sub": data.emails[uid]}) for uid in sample}
+    if not tokens:
+        print("No test user could log in (is the server's login rate limit on?); nothing to authenticate with.")
+        sys.exit(1)
+
+    results = {}
+    for i, scenario in enumerate(build_scenarios(data, tokens)):
+        results[scenario.name] = run_scenario(client, scenario, args.requests, args.concurrency, args.seed + i)
+    print_report(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions detected:")
+            for line in regressions:
+                print(f" - {line}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
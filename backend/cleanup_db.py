@@ -1,9 +1,16 @@
 import argparse
 from typing import List, Tuple
 
-from sqlalchemy import func
+import os
 
-from database import SessionLocal, Project, Idea, ProjectStatus, IdeaStatus
+from sqlalchemy import delete, func, update
+
+from database import (
+    SessionLocal, Project, Idea, ProjectStatus, IdeaStatus, Proposal, Message, Rating, FileUpload,
+    UploadSession, ProjectEvent, Notification
+)
+import feed
+import storage
 
 
 def find_idea_duplicates(session) -> List[int]:
@@ -18,6 +25,28 @@ def find_idea_duplicates(session) -> List[int]:
     return [r[0] for r in rows]
 
 
+def delete_project(session, project: Project) -> None:
+    """Delete a project and the rows that reference it; the caller commits.
+
+    None of the foreign keys to projects.id cascade, so dependents go first.
+    Notifications only lose their project link: deleting them would leave
+    users.unread_notifications off.
+    """
+    project_id = project.id
+    feed.remove_project(session, project_id)
+    for (session_id,) in session.query(UploadSession.id).filter(UploadSession.project_id == project_id):
+        try:
+            os.remove(storage.staging_path(session_id))
+        except FileNotFoundError:
+            pass
+    session.execute(delete(UploadSession).where(UploadSession.project_id == project_id))
+    storage.delete_files(session, session.query(FileUpload).filter(FileUpload.project_id == project_id).all(), commit=False)
+    for model in (Rating, Message, Proposal, ProjectEvent):
+        session.execute(delete(model).where(model.project_id == project_id))
+    session.execute(update(Notification).where(Notification.project_id == project_id).values(project_id=None))
+    session.delete(project)
+
+
 def cleanup_duplicates(session, delete: bool = False, keep: str = "latest", dry_run: bool = False, reset_idea_status: bool = False) -> int:
     """
     Clean up duplicate projects created for the same idea.
@@ -56,13 +85,14 @@ def cleanup_duplicates(session, delete: bool = False, keep: str = "latest", dry_
             if delete:
                 print(f" - DELETE project id={p.id}")
                 if not dry_run:
-                    session.delete(p)
+                    delete_project(session, p)
                     modified += 1
             else:
                 if p.status != ProjectStatus.CANCELLED:
                     print(f" - CANCEL project id={p.id}")
                     if not dry_run:
                         p.status = ProjectStatus.CANCELLED
+                        feed.remove_project(session, p.id)
                         modified += 1
 
         if reset_idea_status and not dry_run:
@@ -0,0 +1,240 @@
+"""
+Response compression with Accept-Encoding negotiation.
+
+CompressionMiddleware compresses textual responses (JSON, text, XML, SVG)
+with zstd, Brotli or gzip, whichever the client accepts with the highest
+q-value; ties go to the server's order in COMPRESSION_ENCODINGS. Responses
+smaller than COMPRESSION_MIN_SIZE, responses that already carry a
+Content-Encoding, non-textual types (images, archives, PDFs) and everything
+under /uploads are passed through untouched. Streaming responses are
+compressed incrementally.
+
+zstd and Brotli need the optional `zstandard` and `brotli` packages; an
+encoding whose package is missing is simply never offered. Levels come
+from COMPRESSION_LEVELS ("zstd:3,br:4,gzip:6"); compression_bench.py shows
+the CPU time against bytes saved for each level on a real listing.
+"""
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        # Emit what is buffered so a streamed chunk reaches the client now.
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, level: int):
+        import brotli
+
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    name = "zstd"
+
+    def __init__(self, level: int):
+        import zstandard
+
+        self._zstd = zstandard
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(self._zstd.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+ENCODERS = {"zstd": ZstdEncoder, "br": BrotliEncoder, "gzip": GzipEncoder}
+
+
+def available_encodings(preferred: List[str]) -> List[str]:
+    """The encodings in `preferred` whose compression library can be imported."""
+    available = []
+    for name in preferred:
+        try:
+            if name == "br":
+                import brotli  # noqa: F401
+            elif name == "zstd":
+                import zstandard  # noqa: F401
+            elif name != "gzip":
+                continue
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def parse_levels(value: str) -> Dict[str, int]:
+    levels = dict(DEFAULT_LEVELS)
+    for item in value.split(","):
+        if ":" in item:
+            name, level = item.split(":", 1)
+            levels[name.strip()] = int(level)
+    return levels
+
+
+def negotiate(accept_encoding: str, supported: List[str]) -> Optional[str]:
+    """Best encoding in `supported` (server preference order) for an Accept-Encoding header."""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token.strip()] = q
+    best, best_q = None, 0.0
+    for name in supported:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def is_compressible(headers: List[Tuple[bytes, bytes]]) -> bool:
+    content_type = b""
+    for key, value in headers:
+        key = key.lower()
+        if key == b"content-encoding":
+            return False
+        if key == b"content-type":
+            content_type = value.lower()
+    return content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES)
+
+
+def weaken_etag(value: bytes) -> bytes:
+    # The encoded bytes differ from the identity body, so a strong tag no longer holds.
+    return value if value.startswith(b"W/") else b"W/" + value
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: Optional[int] = None, encodings: Optional[List[str]] = None,
+                 levels: Optional[Dict[str, int]] = None, excluded_paths: Tuple[str, ...] = ("/uploads",),
+                 enabled: Optional[bool] = None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+        if encodings is None:
+            encodings = [e.strip() for e in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if e.strip()]
+        self.encodings = available_encodings(encodings)
+        self.levels = levels or parse_levels(os.getenv("COMPRESSION_LEVELS", ""))
+        self.excluded_paths = excluded_paths
+        if enabled is None:
+            enabled = os.getenv("COMPRESSION_ENABLED", "true").lower() != "false"
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.enabled
+            or scope["method"] == "HEAD"
+            or scope["path"].startswith(self.excluded_paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept, self.encodings) if accept else None
+        responder = _CompressingResponder(
+            send, ENCODERS[encoding] if encoding else None, self.levels.get(encoding or "", 0), self.minimum_size
+        )
+        await self.app(scope, receive, responder)
+
+
+class _CompressingResponder:
+    """Wraps `send`: holds the response start until the first body chunk decides what to do."""
+
+    def __init__(self, send, encoder_class, level: int, minimum_size: int):
+        self.send = send
+        self.encoder_class = encoder_class
+        self.level = level
+        self.minimum_size = minimum_size
+        self.start = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            headers = list(message.get("headers", []))
+            if message["status"] in (204, 304) or not is_compressible(headers):
+                self.passthrough = True
+                await self.send(message)
+                return
+            # Caches must keep compressed and identity variants apart.
+            headers = [(k, v) for k, v in headers if k.lower() != b"vary"] + [
+                (b"vary", b", ".join([v for k, v in headers if k.lower() == b"vary"] + [b"Accept-Encoding"]))
+            ]
+            self.start = dict(message, headers=headers)
+            return
+        if kind != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            if self.encoder_class is None or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            self.encoder = self.encoder_class(self.level)
+            headers = [(k, weaken_etag(v) if k.lower() == b"etag" else v)
+                       for k, v in start["headers"] if k.lower() != b"content-length"]
+            headers.append((b"content-encoding", self.encoder.name.encode()))
+            if not more_body:
+                compressed = self.encoder.compress(body) + self.encoder.finish()
+                headers.append((b"content-length", str(len(compressed)).encode()))
+                await self.send(dict(start, headers=headers))
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            await self.send(dict(start, headers=headers))
+
+        if more_body:
+            chunk = self.encoder.compress(body) + self.encoder.flush()
+            if chunk:
+                await self.send({"type": "http.response.body", "body": chunk, "more_body": True})
+        else:
+            await self.send({"type": "http.response.body", "body": self.encoder.compress(body) + self.encoder.finish()})
@@ -0,0 +1,103 @@
+"""
+Compression level benchmark for JSON responses.
+
+Seeds a synthetic dataset (see datagen.py), fetches representative
+`/projects?limit=100` pages uncompressed and compresses each with every
+available encoding and level, reporting the compressed size, ratio and the
+median CPU time per response. Use it to pick COMPRESSION_LEVELS: past a
+point higher levels cost far more CPU per request than the bytes they save.
+
+Examples:
+    python compression_bench.py --database-url sqlite:///./bench.db
+    python compression_bench.py --no-seed --pages 10 --repeat 50
+"""
+import argparse
+import os
+import statistics
+import time
+from typing import Dict, List
+
+LEVELS = {"gzip": [1, 4, 6, 9], "br": [1, 4, 6, 9, 11], "zstd": [1, 3, 6, 12, 19]}
+
+
+def compress_once(encoding: str, level: int, body: bytes) -> bytes:
+    from compression import ENCODERS
+
+    encoder = ENCODERS[encoding](level)
+    return encoder.compress(body) + encoder.finish()
+
+
+def measure(encoding: str, level: int, bodies: List[bytes], repeat: int) -> Dict[str, float]:
+    sizes, timings = [], []
+    for body in bodies:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            compressed = compress_once(encoding, level, body)
+            timings.append(time.perf_counter() - started)
+        sizes.append(len(compressed))
+    raw = sum(len(b) for b in bodies)
+    return {
+        "bytes": sum(sizes) / len(sizes),
+        "ratio": raw / max(sum(sizes), 1),
+        "median_ms": statistics.median(timings) * 1000,
+        "mb_per_s": (raw / len(bodies)) / max(statistics.median(timings), 1e-9) / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare response compression encodings and levels")
+    parser.add_argument("--database-url", default=None,
+                        help="Disposable database to seed and serve from; required unless --no-seed")
+    parser.add_argument("--no-seed", action="store_true", help="Use the data already in the database")
+    parser.add_argument("--projects", type=int, default=2000)
+    parser.add_argument("--pages", type=int, default=5, help="Distinct /projects?limit=100 pages to sample")
+    parser.add_argument("--repeat", type=int, default=20, help="Compressions per page and level")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if not args.no_seed and not args.database_url:
+        # Seeding drops every table, so it never falls back to the app's DATABASE_URL.
+        parser.error("seeding drops all tables: pass --database-url for a disposable database, or --no-seed")
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    # Imported after DATABASE_URL is set; database.py reads it at import time.
+    import database
+    from compression import available_encodings
+    from datagen import generate
+
+    if not args.no_seed:
+        database.Base.metadata.drop_all(bind=database.engine)
+        database.Base.metadata.create_all(bind=database.engine)
+        scale = {"users": 300, "ideas": args.projects, "projects": args.projects, "proposals": 0,
+                 "messages": 0, "ratings": 0, "files": 0}
+        generate(database.engine, scale, seed=args.seed, log=lambda line: None)
+
+    from fastapi.testclient import TestClient
+    from main import app
+
+    bodies = []
+    with TestClient(app) as client:
+        for page in range(args.pages):
+            r = client.get("/projects", params={"skip": page * 100, "limit": 100},
+                           headers={"Accept-Encoding": "identity"})
+            r.raise_for_status()
+            if r.json():
+                bodies.append(r.content)
+    if not bodies:
+        print("No projects to fetch; run without --no-seed.")
+        return
+
+    average = sum(len(b) for b in bodies) / len(bodies)
+    print(f"{len(bodies)} pages of /projects?limit=100, {average / 1024:.1f} KiB uncompressed on average\n")
+    print(f"{'encoding':<9}{'level':>6}{'KiB':>9}{'ratio':>8}{'ms':>9}{'MB/s':>9}")
+    for encoding in available_encodings(["gzip", "br", "zstd"]):
+        for level in LEVELS[encoding]:
+            result = measure(encoding, level, bodies, args.repeat)
+            print(f"{encoding:<9}{level:>6}{result['bytes'] / 1024:>9.1f}{result['ratio']:>8.2f}"
+                  f"{result['median_ms']:>9.3f}{result['mb_per_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,31 @@
 # Database Migration Script
+#
+# Brings the database to the latest schema with `alembic upgrade head`, so it
+# also adds the columns and tables an older database is missing. See
+# migrations/versions for what each revision changes.
 import os
 import sys
+from alembic import command
+from alembic.config import Config
 from sqlalchemy import create_engine
-from database import Base
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+def upgrade(connection, revision: str = "head"):
+    """Run the migrations up to `revision` on an open connection."""
+    config = Config(ALEMBIC_INI)
+    config.attributes["connection"] = connection
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, revision)
 
 def create_tables():
-    """Create all database tables."""
+    """Create or upgrade all database tables."""
     database_url = os.getenv("DATABASE_URL", "postgresql://postgres:password@db:5432/idea_project_db")
     engine = create_engine(database_url)
-    
+
     try:
-        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            upgrade(connection)
         print("✅ Database tables created successfully!")
     except Exception as e:
         print(f"❌ Error creating tables: {e}")
@@ -0,0 +1,441 @@
+"""
+Synthetic data generator for scale testing.
+
+Bulk-loads every table in database.py with a deterministic (seeded) dataset
+with production-like shape: mixed Persian and English text, a heavily skewed
+project-to-proposal fan-out and a long tail of very long message threads.
+
+Rows are written in batches: PostgreSQL uses COPY, every other database uses
+executemany inserts. Primary keys are assigned here so child rows can be
+generated without reading anything back.
+
+Examples:
+    python datagen.py --users 100000 --projects 500000 --proposals 3000000 --messages 5000000
+    python datagen.py --database-url sqlite:///./scale.db --scale 0.01 --reset
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import create_engine, func, insert, select, text, update
+
+from database import (
+    Base, User, Idea, Project, Proposal, Message, Rating, FileUpload,
+    UserRole, ProjectStatus, IdeaStatus, ProposalStatus,
+)
+
+DEFAULT_PASSWORD = "masna-pass-123"
+
+DEFAULT_SCALE = {
+    "users": 100_000,
+    "ideas": 300_000,
+    "projects": 500_000,
+    "proposals": 3_000_000,
+    "messages": 5_000_000,
+    "ratings": 200_000,
+    "files": 500_000,
+}
+
+EN_WORDS = (
+    "platform mobile app website marketplace delivery payment analytics dashboard "
+    "design logo brand startup online shop booking education health travel food "
+    "social network chat video streaming api integration backend frontend cloud "
+    "automation machine learning data secure fast scalable simple modern smart"
+).split()
+
+FA_WORDS = (
+    "سامانه اپلیکیشن موبایل وبسایت فروشگاه اینترنتی پرداخت تحلیل داشبورد طراحی "
+    "لوگو برند استارتاپ رزرو آموزش سلامت سفر غذا شبکه اجتماعی گفتگو ویدیو "
+    "یکپارچه سازی هوشمند سریع امن ساده مدرن مدیریت مشتری سفارش تحویل کاربر"
+).split()
+
+SKILLS = [
+    "python", "django", "fastapi", "react", "nextjs", "typescript", "flutter",
+    "kotlin", "swift", "ui/ux", "figma", "seo", "content", "postgresql",
+    "devops", "docker", "ml", "data-analysis", "wordpress", "laravel",
+    "طراحی", "برنامه نویسی", "تولید محتوا", "بازاریابی", "عکاسی",
+]
+
+FIRST_NAMES = ["Ali", "Sara", "Reza", "Maryam", "Omid", "Neda", "علی", "زهرا", "محمد", "فاطمه", "حسین", "مریم"]
+LAST_NAMES = ["Ahmadi", "Karimi", "Hosseini", "Rahimi", "Moradi", "احمدی", "کریمی", "حسینی", "رحیمی", "مرادی"]
+
+FILE_TYPES = [
+    ("application/pdf", "pdf"), ("image/png", "png"), ("image/jpeg", "jpg"),
+    ("application/zip", "zip"), ("text/plain", "txt"),
+]
+
+# Roles are drawn with these weights; executors dominate like on the live site.
+ROLE_WEIGHTS = [
+    (UserRole.EXECUTOR, 0.5),
+    (UserRole.EMPLOYER, 0.2),
+    (UserRole.IDEA_CREATOR, 0.28),
+    (UserRole.ADMIN, 0.02),
+]
+
+PROJECT_STATUS_WEIGHTS = [
+    (ProjectStatus.NEW, 0.45),
+    (ProjectStatus.IN_PROGRESS, 0.3),
+    (ProjectStatus.COMPLETED, 0.2),
+    (ProjectStatus.CANCELLED, 0.05),
+]
+
+
+class Generator:
+    """Deterministic row factory; the same seed always yields the same rows."""
+
+    def __init__(self, seed: int, days: int = 730):
+        self.rng = random.Random(seed)
+        self.now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.days = days
+
+    def words(self, low: int, high: int) -> str:
+        rng = self.rng
+        pool = FA_WORDS if rng.random() < 0.6 else EN_WORDS
+        return " ".join(rng.choice(pool) for _ in range(rng.randint(low, high)))
+
+    def paragraph(self, sentences: int) -> str:
+        return ". ".join(self.words(5, 14) for _ in range(sentences))
+
+    def timestamp(self, after: Optional[datetime] = None) -> datetime:
+        start = after or self.now - timedelta(days=self.days)
+        span = max(1, int((self.now - start).total_seconds()))
+        return start + timedelta(seconds=self.rng.randrange(span))
+
+    def weighted(self, choices) -> object:
+        roll = self.rng.random()
+        for value, weight in choices:
+            roll -= weight
+            if roll <= 0:
+                return value
+        return choices[-1][0]
+
+    def skewed_counts(self, buckets: int, total: int, alpha: float) -> List[int]:
+        """Split `total` over `buckets` with a Pareto-shaped (long tail) distribution."""
+        if buckets == 0:
+            return []
+        weights = [self.rng.paretovariate(alpha) for _ in range(buckets)]
+        scale = total / sum(weights)
+        counts = [int(w * scale) for w in weights]
+        for _ in range(total - sum(counts)):
+            counts[self.rng.randrange(buckets)] += 1
+        return counts
+
+
+class BatchWriter:
+    """Writes rows in batches with executemany; subclasses may use COPY."""
+
+    def __init__(self, conn, batch_size: int):
+        self.conn = conn
+        self.batch_size = batch_size
+
+    def write(self, table, rows: Iterator[dict]) -> int:
+        written = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                written += self.flush(table, batch)
+                batch = []
+        if batch:
+            written += self.flush(table, batch)
+        return written
+
+    def flush(self, table, batch: List[dict]) -> int:
+        self.conn.execute(insert(table), batch)
+        return len(batch)
+
+    def finish(self, tables) -> None:
+        pass
+
+
+class CopyWriter(BatchWriter):
+    """PostgreSQL writer streaming each batch through COPY ... FROM STDIN."""
+
+    def flush(self, table, batch: List[dict]) -> int:
+        columns = list(batch[0].keys())
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in batch:
+            writer.writerow([self._value(row[c]) for c in columns])
+        buf.seek(0)
+        cursor = self.conn.connection.cursor()
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buf,
+        )
+        return len(batch)
+
+    @staticmethod
+    def _value(value):
+        if value is None:
+            return "\\N"
+        if hasattr(value, "name") and hasattr(value, "value"):
+            # SQLAlchemy stores Python enums by member name.
+            return value.name
+        if isinstance(value, bool):
+            return "t" if value else "f"
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    def finish(self, tables) -> None:
+        # Ids were assigned explicitly, so move each serial sequence past them.
+        for table in tables:
+            self.conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+            ))
+
+
+def next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def generate(engine, scale: Dict[str, int], seed: int = 42, batch_size: int = 10_000,
+             password: str = DEFAULT_PASSWORD, log=print) -> Dict[str, int]:
+    """Generate and load the dataset; returns the number of rows per table."""
+    from auth import get_password_hash
+
+    gen = Generator(seed)
+    rng = gen.rng
+    hashed = get_password_hash(password)
+    counts = {}
+
+    with engine.begin() as conn:
+        writer_cls = CopyWriter if engine.dialect.name == "postgresql" else BatchWriter
+        writer = writer_cls(conn, batch_size)
+
+        def load(name, model, rows):
+            started = time.perf_counter()
+            counts[name] = writer.write(model.__table__, rows)
+            log(f"  {name:<10} {counts[name]:>10} rows in {time.perf_counter() - started:.1f}s")
+
+        # Users
+        first_user = next_id(conn, User)
+        roles = [gen.weighted(ROLE_WEIGHTS) for _ in range(scale["users"])]
+        user_created = [gen.timestamp() for _ in roles]
+        by_role = {role: [] for role in UserRole}
+        for offset, role in enumerate(roles):
+            by_role[role].append(first_user + offset)
+        # Guarantee every role exists so child tables always have owners.
+        for role in (UserRole.EXECUTOR, UserRole.EMPLOYER, UserRole.IDEA_CREATOR):
+            if not by_role[role]:
+                roles.append(role)
+                user_created.append(gen.timestamp())
+                by_role[role].append(first_user + len(roles) - 1)
+
+        def users():
+            for offset, role in enumerate(roles):
+                uid = first_user + offset
+                skills = rng.sample(SKILLS, rng.randint(1, 6)) if role == UserRole.EXECUTOR else None
+                yield {
+                    "id": uid,
+                    "email": f"user{uid}@example.com",
+                    "hashed_password": hashed,
+                    "full_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    "role": role,
+                    "bio": gen.paragraph(rng.randint(1, 3)) if rng.random() < 0.7 else None,
+                    "skills": json.dumps(skills, ensure_ascii=False) if skills else None,
+                    "portfolio_url": None,
+                    "is_active": rng.random() > 0.02,
+                    "is_verified": rng.random() < 0.4,
+                    "created_at": user_created[offset],
+                }
+        load("users", User, users())
+
+        executors = by_role[UserRole.EXECUTOR]
+        employers = by_role[UserRole.EMPLOYER] + by_role[UserRole.ADMIN]
+        creators = by_role[UserRole.IDEA_CREATOR]
+
+        # Ideas
+        first_idea = next_id(conn, Idea)
+
+        def ideas():
+            for offset in range(scale["ideas"]):
+                created = gen.timestamp()
+                yield {
+                    "id": first_idea + offset,
+                    "title": gen.words(2, 6),
+                    "description": gen.paragraph(rng.randint(2, 6)),
+                    "tags": json.dumps(rng.sample(SKILLS, rng.randint(0, 4)), ensure_ascii=False),
+                    "requirements": gen.words(4, 12) if rng.random() < 0.5 else None,
+                    "status": IdeaStatus.UNDER_REVIEW,
+                    "creator_id": rng.choice(creators),
+                    "created_at": created,
+                }
+        load("ideas", Idea, ideas())
+
+        # Projects; roughly a fifth are derived from an idea, at most once each.
+        first_project = next_id(conn, Project)
+        project_rows = []
+        idea_pool = list(range(first_idea, first_idea + scale["ideas"]))
+        rng.shuffle(idea_pool)
+
+        def projects():
+            for offset in range(scale["projects"]):
+                pid = first_project + offset
+                status = gen.weighted(PROJECT_STATUS_WEIGHTS)
+                employer_id = rng.choice(employers)
+                executor_id = rng.choice(executors) if status in (ProjectStatus.IN_PROGRESS, ProjectStatus.COMPLETED) else None
+                created = gen.timestamp()
+                project_rows.append((pid, employer_id, executor_id, status, created))
+                yield {
+                    "id": pid,
+                    "title": gen.words(2, 7),
+                    "description": gen.paragraph(rng.randint(2, 8)),
+                    "budget": float(round(rng.lognormvariate(6.5, 1.0), -1)),
+                    "deadline": created + timedelta(days=rng.randint(7, 180)),
+                    "requirements": ", ".join(rng.sample(SKILLS, rng.randint(1, 5))),
+                    "status": status,
+                    "employer_id": employer_id,
+                    "executor_id": executor_id,
+                    "idea_id": idea_pool.pop() if idea_pool and rng.random() < 0.2 else None,
+                    "created_at": created,
+                }
+        load("projects", Project, projects())
+        conn.execute(
+            update(Idea)
+            .where(Idea.id.in_(select(Project.idea_id).where(Project.idea_id.isnot(None))))
+            .values(status=IdeaStatus.IN_PROJECT)
+        )
+
+        # Proposals: Pareto fan-out, a few projects attract hundreds of bids.
+        first_proposal = next_id(conn, Proposal)
+        fan_out = gen.skewed_counts(len(project_rows), scale["proposals"], alpha=1.3)
+
+        def proposals():
+            next_pid = first_proposal
+            for (pid, _, executor_id, status, created), wanted in zip(project_rows, fan_out):
+                bidders = rng.sample(executors, min(wanted, len(executors)))
+                if executor_id is not None and executor_id not in bidders:
+                    bidders.append(executor_id)
+                for bidder in bidders:
+                    if bidder == executor_id:
+                        state = ProposalStatus.ACCEPTED
+                    elif status == ProjectStatus.NEW:
+                        state = ProposalStatus.PENDING
+                    else:
+                        state = ProposalStatus.REJECTED
+                    yield {
+                        "id": next_pid,
+                        "project_id": pid,
+                        "executor_id": bidder,
+                        "proposed_price": float(round(rng.lognormvariate(6.5, 0.8), -1)),
+                        "proposed_timeline": f"{rng.randint(1, 12)} {rng.choice(['weeks', 'هفته', 'days', 'روز'])}",
+                        "cover_letter": gen.paragraph(rng.randint(1, 4)),
+                        "status": state,
+                        "created_at": gen.timestamp(created),
+                    }
+                    next_pid += 1
+        load("proposals", Proposal, proposals())
+
+        # Messages: only projects with an executor talk; thread length is long-tailed.
+        assigned = [row for row in project_rows if row[2] is not None]
+        first_message = next_id(conn, Message)
+        thread_lengths = gen.skewed_counts(len(assigned), scale["messages"], alpha=1.1)
+
+        def messages():
+            next_mid = first_message
+            for (pid, employer_id, executor_id, _, created), length in zip(assigned, thread_lengths):
+                at = gen.timestamp(created)
+                for i in range(length):
+                    at += timedelta(seconds=rng.randint(5, 36_000))
+                    from_employer = rng.random() < 0.5
+                    yield {
+                        "id": next_mid,
+                        "project_id": pid,
+                        "sender_id": employer_id if from_employer else executor_id,
+                        "receiver_id": executor_id if from_employer else employer_id,
+                        "content": gen.words(2, 30),
+                        "is_read": i < length - 3,
+                        "created_at": at,
+                    }
+                    next_mid += 1
+        load("messages", Message, messages())
+
+        # Ratings: both sides of completed projects rate each other.
+        completed = [row for row in project_rows if row[3] == ProjectStatus.COMPLETED]
+        first_rating = next_id(conn, Rating)
+
+        def ratings():
+            rid = first_rating
+            for pid, employer_id, executor_id, _, created in completed:
+                for rater, rated in ((employer_id, executor_id), (executor_id, employer_id)):
+                    if rid - first_rating >= scale["ratings"]:
+                        return
+                    yield {
+                        "id": rid,
+                        "rater_id": rater,
+                        "rated_user_id": rated,
+                        "project_id": pid,
+                        "rating": min(5, max(1, int(round(rng.gauss(4.1, 0.9))))),
+                        "comment": gen.words(3, 20) if rng.random() < 0.6 else None,
+                        "created_at": gen.timestamp(created),
+                    }
+                    rid += 1
+        load("ratings", Rating, ratings())
+
+        # File uploads on assigned projects; rows only, nothing is written to disk.
+        first_file = next_id(conn, FileUpload)
+
+        def files():
+            for offset in range(scale["files"] if assigned else 0):
+                pid, employer_id, executor_id, status, created = rng.choice(assigned)
+                content_type, ext = rng.choice(FILE_TYPES)
+                name = f"{gen.words(1, 3).replace(' ', '_')}.{ext}"
+                yield {
+                    "id": first_file + offset,
+                    "project_id": pid,
+                    "uploaded_by": rng.choice((employer_id, executor_id)),
+                    "filename": name,
+                    "file_url": f"/uploads/project_{pid}/{first_file + offset}_{name}",
+                    "file_type": content_type,
+                    "file_size": int(rng.lognormvariate(12, 2)),
+                    "is_final_delivery": status == ProjectStatus.COMPLETED and rng.random() < 0.3,
+                    "created_at": gen.timestamp(created),
+                }
+        load("files", FileUpload, files())
+
+        writer.finish([m.__table__ for m in (User, Idea, Project, Proposal, Message, Rating, FileUpload)])
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load a deterministic synthetic dataset")
+    parser.add_argument("--database-url", default=None, help="Target database (defaults to DATABASE_URL)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every default table size")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="Password shared by every generated user")
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables first")
+    for name, default in DEFAULT_SCALE.items():
+        parser.add_argument(f"--{name}", type=int, default=None, help=f"Rows for {name} (default {default} x scale)")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from database import engine
+
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    scale = {
+        name: getattr(args, name) if getattr(args, name) is not None else int(default * args.scale)
+        for name, default in DEFAULT_SCALE.items()
+    }
+    print(f"Generating {scale} with seed {args.seed}")
+    started = time.perf_counter()
+    counts = generate(engine, scale, seed=args.seed, batch_size=args.batch_size, password=args.password)
+    print(f"Loaded {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
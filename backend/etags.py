@@ -0,0 +1,63 @@
+"""
+ETags and conditional requests from row versions.
+
+User, Idea, Project and Proposal carry a `version` column, which is
+SQLAlchemy's version_id_col. Every ORM flush that changes a row runs
+`UPDATE ... WHERE id = ? AND version = ?` and increments the version. If
+another writer got there first, the UPDATE matches no row and raises
+StaleDataError, which the API maps to 412 or 409. Core UPDATEs that change
+what clients see bump `version` themselves, as in acceptance.py. Two kinds
+of columns are written without a bump. Counters such as storage_bytes and
+unread_notifications are not part of any response. Proposal scores (see
+proposal_ranking.py) are derived from other rows, and a rescore must not
+make an employer's If-Match stale.
+
+An ETag lists the versions of every row in a representation. The resource
+comes first, then the rows it embeds: an idea's ETag is "<idea>.<creator>".
+So a renamed creator still changes the idea's ETag.
+  - If-None-Match on a GET: 304 when the client's copy is current.
+  - If-Match on an update: only the resource's own version (the first
+    number) is compared. A mismatch is 412 before anything is written. A
+    race between that check and the write is caught by the conditional
+    UPDATE.
+Weak tags (W/"...") compare like strong ones, because they carry the same
+versions. CompressionMiddleware weakens ETags on the bodies it encodes.
+"""
+from typing import List, Optional
+
+from fastapi import HTTPException, Request
+
+
+def make_etag(resource, *embedded) -> str:
+    """Strong ETag from the versions of `resource` and the rows embedded in its representation."""
+    versions = [resource.version] + [row.version if row is not None else 0 for row in embedded]
+    return '"' + ".".join(str(v) for v in versions) + '"'
+
+
+def parse_tags(header: Optional[str]) -> List[str]:
+    """Opaque tags of an If-Match/If-None-Match header, without W/ and quotes; ["*"] for a wildcard."""
+    if not header:
+        return []
+    tags = []
+    for part in header.split(","):
+        part = part.strip()
+        if part.startswith("W/"):
+            part = part[2:]
+        if part:
+            tags.append(part.strip('"'))
+    return tags
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Whether a GET's If-None-Match already names `etag`."""
+    tags = parse_tags(request.headers.get("if-none-match"))
+    return "*" in tags or etag.strip('"') in tags
+
+
+def check_if_match(request: Request, version: int) -> None:
+    """Raise 412 unless If-Match is absent, "*" or names the resource's current `version`."""
+    tags = parse_tags(request.headers.get("if-match"))
+    if not tags or "*" in tags:
+        return
+    if str(version) not in (tag.split(".", 1)[0] for tag in tags):
+        raise HTTPException(status_code=412, detail="Resource was modified; fetch it again and retry")
@@ -0,0 +1,39 @@
+"""
+In-process domain events.
+
+State changes call `emit(db, name, **data)`; every handler subscribed to
+that name (or to "*") is called synchronously with the caller's session,
+inside the caller's transaction, so anything a handler writes commits or
+rolls back together with the change that triggered it. Handlers must not
+commit themselves.
+
+    @events.subscribe("proposal.accepted")
+    def on_accepted(db, name, data):
+        ...
+"""
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from sqlalchemy.orm import Session
+
+Handler = Callable[[Session, str, dict], None]
+
+_handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+
+def subscribe(name: str) -> Callable[[Handler], Handler]:
+    def register(handler: Handler) -> Handler:
+        if handler not in _handlers[name]:
+            _handlers[name].append(handler)
+        return handler
+    return register
+
+
+def unsubscribe(name: str, handler: Handler) -> None:
+    if handler in _handlers[name]:
+        _handlers[name].remove(handler)
+
+
+def emit(db: Session, name: str, **data) -> None:
+    for handler in _handlers[name] + _handlers["*"]:
+        handler(db, name, data)
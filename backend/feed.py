@@ -0,0 +1,203 @@
+"""
+Personalized project feed for executors.
+
+Every NEW project an executor's skills overlap with is materialized as a
+FeedItem row carrying a precomputed score, so reading a feed is one range
+scan over the (user_id, score) index. The score is
+
+    log2(affinity) + created_at / FEED_HALF_LIFE_SECONDS
+
+where affinity grows with skill overlap and budget. Because recency enters
+as an additive term on a log scale, a project posted one half-life later
+outranks an equally good older one by exactly a factor of two in affinity,
+and stored scores never need to be decayed.
+
+Rows are written when a project is created, removed when it leaves NEW, and
+rebuilt for one executor when their skills change. `python feed.py
+--rebuild` recomputes every feed from scratch.
+"""
+import argparse
+import json
+import math
+import os
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session, selectinload
+
+from database import FeedItem, Idea, Project, ProjectStatus, User, UserRole
+from recommendations import tokenize
+
+HALF_LIFE_SECONDS = float(os.getenv("FEED_HALF_LIFE_SECONDS", str(3 * 24 * 3600)))
+# Only the newest NEW projects are considered when (re)building one user's feed.
+REBUILD_WINDOW = int(os.getenv("FEED_REBUILD_WINDOW", "5000"))
+
+
+def skill_terms(skills: Optional[str]) -> Set[str]:
+    if not skills:
+        return set()
+    try:
+        parsed = json.loads(skills)
+    except (json.JSONDecodeError, TypeError):
+        parsed = [skills]
+    if not isinstance(parsed, list):
+        parsed = [parsed]
+    return {term for skill in parsed for term in tokenize(str(skill))}
+
+
+def project_terms(project: Project) -> Set[str]:
+    return set(tokenize(" ".join(filter(None, (project.title, project.description, project.requirements)))))
+
+
+def score(skills: Set[str], terms: Set[str], project: Project) -> Optional[float]:
+    """Feed score of a project for an executor, or None when nothing overlaps."""
+    overlap = len(skills & terms) / len(skills) if skills else 0.0
+    if overlap == 0:
+        return None
+    budget = min(1.0, math.log10(1.0 + (project.budget or 0.0)) / 5.0)
+    affinity = 1.0 + 4.0 * overlap + budget
+    created = project.created_at.timestamp() if project.created_at else 0.0
+    return math.log2(affinity) + created / HALF_LIFE_SECONDS
+
+
+def executor_skills(db: Session, user_ids: Optional[List[int]] = None) -> Dict[int, Set[str]]:
+    query = db.query(User.id, User.skills).filter(
+        User.role == UserRole.EXECUTOR, User.is_active.is_(True), User.skills.isnot(None)
+    )
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+    return {uid: terms for uid, skills in query if (terms := skill_terms(skills))}
+
+
+def on_project_created(db: Session, project: Project) -> None:
+    """Fan a new project out into the feed of every executor it matches."""
+    if project.status is not None and project.status != ProjectStatus.NEW:
+        return
+    terms = project_terms(project)
+    rows = []
+    for user_id, skills in executor_skills(db).items():
+        value = score(skills, terms, project)
+        if value is not None:
+            rows.append({"user_id": user_id, "project_id": project.id, "score": value})
+    if rows:
+        db.execute(insert(FeedItem), rows)
+    db.commit()
+
+
+def remove_project(db: Session, project_id: int) -> None:
+    """Delete a project from every feed; the caller commits."""
+    db.execute(delete(FeedItem).where(FeedItem.project_id == project_id))
+
+
+def on_project_status_changed(db: Session, project: Project) -> None:
+    """Drop a project from every feed once it is no longer open (or re-add it)."""
+    remove_project(db, project.id)
+    if project.status == ProjectStatus.NEW:
+        on_project_created(db, project)
+    else:
+        db.commit()
+
+
+def rebuild_user_feed(db: Session, user_id: int) -> int:
+    """Recompute one executor's feed, e.g. after they edited their skills."""
+    db.execute(delete(FeedItem).where(FeedItem.user_id == user_id))
+    skills = executor_skills(db, [user_id]).get(user_id)
+    rows = []
+    if skills:
+        projects = (
+            db.query(Project)
+            .filter(Project.status == ProjectStatus.NEW)
+            .order_by(Project.id.desc())
+            .limit(REBUILD_WINDOW)
+        )
+        for project in projects:
+            value = score(skills, project_terms(project), project)
+            if value is not None:
+                rows.append({"user_id": user_id, "project_id": project.id, "score": value})
+    if rows:
+        db.execute(insert(FeedItem), rows)
+    db.commit()
+    return len(rows)
+
+
+def read_feed(db: Session, user_id: int, skip: int = 0, limit: int = 50) -> List[Project]:
+    """Projects of a user's feed, best first."""
+    rows = (
+        db.query(FeedItem.project_id)
+        .filter(FeedItem.user_id == user_id)
+        .order_by(FeedItem.score.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    ids = [r[0] for r in rows]
+    if not ids:
+        return []
+    projects = {
+        p.id: p
+        for p in db.query(Project)
+        .options(
+            selectinload(Project.employer),
+            selectinload(Project.executor),
+            selectinload(Project.idea).selectinload(Idea.creator),
+        )
+        .filter(Project.id.in_(ids))
+        .all()
+    }
+    return [projects[pid] for pid in ids if pid in projects]
+
+
+def rebuild_all(db: Session, batch_size: int = 500) -> int:
+    """Recompute every feed from scratch."""
+    db.execute(delete(FeedItem))
+    db.commit()
+    skills_by_user = executor_skills(db)
+    total = 0
+    last_id = 0
+    while True:
+        projects = (
+            db.query(Project)
+            .filter(Project.status == ProjectStatus.NEW, Project.id > last_id)
+            .order_by(Project.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not projects:
+            break
+        rows = []
+        for project in projects:
+            terms = project_terms(project)
+            for user_id, skills in skills_by_user.items():
+                value = score(skills, terms, project)
+                if value is not None:
+                    rows.append({"user_id": user_id, "project_id": project.id, "score": value})
+        if rows:
+            db.execute(insert(FeedItem), rows)
+        db.commit()
+        total += len(rows)
+        last_id = projects[-1].id
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain materialized executor feeds")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every feed from scratch")
+    parser.add_argument("--user", type=int, default=None, help="Recompute only this executor's feed")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        if args.user is not None:
+            print(f"Feed of user {args.user}: {rebuild_user_feed(session, args.user)} items")
+        elif args.rebuild:
+            print(f"Rebuilt feeds: {rebuild_all(session)} items")
+        else:
+            parser.print_help()
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Production server profile: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn_conf.py main:app
+
+The app is imported once in the master (preload_app) and forked into the
+workers, so workers start in milliseconds and share the imported code pages.
+Engines are created lazily, but any pool the master did open must not be
+shared across processes, so each worker discards its inherited connections
+right after the fork; the lifespan hook then warms a fresh pool per worker.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# One async worker already keeps a core busy, so run about one per CPU. Each worker
+# holds its own pool of up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections to the
+# primary and to each replica: workers * (pool_size + max_overflow), summed over
+# every host running this profile, must stay under PostgreSQL's max_connections.
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Pending connections the kernel queues while every worker is busy.
+backlog = int(os.getenv("BACKLOG", "2048"))
+# Longer than the proxy/load balancer idle timeout, so the proxy closes first.
+keepalive = int(os.getenv("KEEPALIVE_SECONDS", "75"))
+timeout = int(os.getenv("WORKER_TIMEOUT_SECONDS", "60"))
+# Time a worker gets after SIGTERM to drain (SHUTDOWN_DRAIN_SECONDS), finish in-flight
+# requests and run lifespan shutdown.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+
+# Recycle workers periodically to bound memory growth; jitter avoids restarting all at once.
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+preload_app = True
+accesslog = os.getenv("ACCESS_LOG", "-")
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def post_fork(server, worker):
+    import database
+
+    # close=False: leave the parent's sockets alone, just stop using them here.
+    database.dispose_engines(close=False)
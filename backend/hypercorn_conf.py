@@ -0,0 +1,38 @@
+"""
+HTTP/2 server profile: hypercorn serving the app over HTTP/2 and HTTP/1.1.
+
+    hypercorn --config file:hypercorn_conf.py main:app
+
+Browsers only speak HTTP/2 over TLS. With TLS_CERTFILE and TLS_KEYFILE set,
+ALPN offers h2 first, and the frontend's concurrent API calls share one
+multiplexed connection per origin. Without them the HTTP/1.1 connections
+are kept alive. Behind a proxy that speaks cleartext HTTP/2 (h2c) to the
+backend, hypercorn accepts that as well.
+
+Keep-alive is longer than the proxy's or load balancer's idle timeout, so
+the proxy always closes first and never reuses a connection the server is
+about to drop. Workers are spawned rather than forked, so no database
+connection is ever inherited.
+"""
+import multiprocessing
+import os
+
+bind = [os.getenv("BIND", "0.0.0.0:8000")]
+# One async worker already keeps a core busy, so run about one per CPU. Each worker
+# holds its own pool of up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections to the
+# primary and to each replica: workers * (pool_size + max_overflow), summed over
+# every host running this profile, must stay under PostgreSQL's max_connections.
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = os.getenv("HYPERCORN_WORKER_CLASS", "uvloop")
+
+certfile = os.getenv("TLS_CERTFILE") or None
+keyfile = os.getenv("TLS_KEYFILE") or None
+alpn_protocols = ["h2", "http/1.1"]
+
+keep_alive_timeout = int(os.getenv("KEEPALIVE_SECONDS", "75"))
+# Streams one client may have open on a connection: a whole page's API calls.
+h2_max_concurrent_streams = int(os.getenv("H2_MAX_CONCURRENT_STREAMS", "100"))
+backlog = int(os.getenv("BACKLOG", "2048"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+
+accesslog = os.getenv("ACCESS_LOG", "-")
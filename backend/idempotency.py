@@ -0,0 +1,316 @@
+"""
+Idempotency-Key support for write endpoints.
+
+A client that retries a POST or PATCH (after a timeout, a dropped connection
+or a 502 from the proxy) sends the same `Idempotency-Key` header as the first
+attempt. IdempotencyMiddleware runs the handler for the first request with a
+key and stores its response in `idempotency_keys`. Later requests with that
+key get the stored response back, marked `Idempotent-Replayed: true`, and the
+handler does not run again. A retried create therefore never makes a second
+project, proposal, message, rating or upload.
+
+  - Keys are scoped to the caller, i.e. the user id in the bearer token.
+    Anonymous requests and /auth/ pass through untouched, because /auth/
+    responses carry tokens that must not be stored.
+  - The first request claims a key by inserting its row. The unique
+    constraint on (owner, key) makes that insert a lock across workers. A
+    duplicate that arrives while the first request still runs waits up to
+    IDEMPOTENCY_WAIT_SECONDS for the stored response. After that it gets 409
+    with Retry-After. If a worker dies mid-request, its claim can be taken
+    over after IDEMPOTENCY_LOCK_SECONDS.
+  - Reusing a key for a different request (method, path, query or body) is
+    rejected with 422. Bodies larger than IDEMPOTENCY_MAX_BODY are not
+    compared, and neither are multipart bodies, whose boundary changes on
+    every send.
+  - 5xx responses and exceptions are not stored, and the claim is released,
+    so a retry runs the handler again.
+  - Keys expire after IDEMPOTENCY_TTL_SECONDS. `python idempotency.py --purge`
+    deletes expired rows, and an expired key is replaced when it is reused.
+
+The middleware sits inside CompressionMiddleware, so stored bodies are
+uncompressed and each replay is encoded for the retrying client.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import anyio
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.responses import JSONResponse
+
+from database import IdempotencyKey, SessionLocal
+from ratelimit import caller_key
+from storage import naive_utc
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() != "false"
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# Longer than the slowest write (large uploads), or a live request loses its claim.
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "900"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "5"))
+IDEMPOTENCY_MAX_BODY = int(os.getenv("IDEMPOTENCY_MAX_BODY", str(1024 * 1024)))
+
+MAX_KEY_LENGTH = 255
+MAX_STORED_RESPONSE = 1024 * 1024
+POLL_SECONDS = 0.1
+METHODS = {"POST", "PATCH"}
+EXCLUDED_PREFIXES = ("/auth/", "/uploads/")
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+
+logger = logging.getLogger("masna.idempotency")
+
+# (status code, [[name, value], ...], body) of a stored response
+StoredResponse = Tuple[int, List[List[str]], bytes]
+
+
+def fingerprint(method: str, path: str, query: bytes, content_type: str, body: Optional[bytes]) -> str:
+    """SHA-256 identifying a request; `body` None means the body is not compared."""
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query, content_type.encode()):
+        digest.update(part + b"\0")
+    if body is not None:
+        digest.update(b"body\0" + body)
+    return digest.hexdigest()
+
+
+def claim(db: Session, owner: str, key: str, fp: str,
+          now: Optional[datetime] = None) -> Tuple[str, Optional[IdempotencyKey]]:
+    """Claim `key` for a request.
+
+    Returns ("claimed", row) when the caller should run the handler,
+    ("replay", row) when a stored response exists, ("busy", row) while another
+    request holds the key and ("mismatch", row) when the key belongs to a
+    different request.
+    """
+    now = now or datetime.utcnow()
+    lock_until = now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+    for _ in range(3):
+        record = IdempotencyKey(owner=owner, key=key, fingerprint=fp, locked_until=lock_until,
+                                expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS))
+        db.add(record)
+        try:
+            db.commit()
+            return "claimed", record
+        except IntegrityError:
+            db.rollback()
+
+        existing = db.query(IdempotencyKey).filter(IdempotencyKey.owner == owner, IdempotencyKey.key == key).first()
+        if existing is None:
+            continue  # Released in the meantime
+        if naive_utc(existing.expires_at) <= now:
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.id == existing.id, IdempotencyKey.expires_at <= now
+            ).delete(synchronize_session=False)
+            db.commit()
+            continue
+        if existing.fingerprint != fp:
+            return "mismatch", existing
+        if existing.status_code is not None:
+            return "replay", existing
+        if existing.locked_until is not None and naive_utc(existing.locked_until) <= now:
+            # The WHERE clause is re-checked under the row lock, so one takeover wins.
+            taken = db.query(IdempotencyKey).filter(
+                IdempotencyKey.id == existing.id,
+                IdempotencyKey.status_code.is_(None),
+                IdempotencyKey.locked_until <= now,
+            ).update({"locked_until": lock_until}, synchronize_session=False)
+            db.commit()
+            if taken:
+                return "claimed", existing
+            continue
+        return "busy", existing
+    return "busy", None
+
+
+def complete(db: Session, record_id: int, status_code: int, headers: List[List[str]], body: bytes) -> None:
+    db.query(IdempotencyKey).filter(IdempotencyKey.id == record_id).update(
+        {"status_code": status_code, "headers": json.dumps(headers), "body": body, "locked_until": None},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def release(db: Session, record_id: int) -> None:
+    """Forget an unfinished claim so the next retry runs the handler."""
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.id == record_id, IdempotencyKey.status_code.is_(None)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def purge_expired(db: Session, now: Optional[datetime] = None, batch_size: int = 1000) -> int:
+    now = now or datetime.utcnow()
+    removed = 0
+    while True:
+        ids = [r[0] for r in db.query(IdempotencyKey.id).filter(IdempotencyKey.expires_at <= now).limit(batch_size)]
+        if not ids:
+            return removed
+        db.query(IdempotencyKey).filter(IdempotencyKey.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        removed += len(ids)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _read_body(scope, receive):
+    """(body, receive) with small bodies buffered; body None when it is not compared."""
+    content_type = _header(scope, b"content-type") or ""
+    length = _header(scope, b"content-length")
+    if content_type.startswith("multipart/") or not (length or "").isdigit() or int(length) > IDEMPOTENCY_MAX_BODY:
+        return None, receive
+
+    chunks, pending = [], []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            pending.append(message)
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body = b"".join(chunks)
+    pending.insert(0, {"type": "http.request", "body": body, "more_body": False})
+
+    async def replay():
+        if pending:
+            return pending.pop(0)
+        return await receive()
+
+    return body, replay
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, enabled: Optional[bool] = None, session_factory=None):
+        self.app = app
+        self.enabled = IDEMPOTENCY_ENABLED if enabled is None else enabled
+        self.session_factory = session_factory or SessionLocal
+
+    def _claim(self, owner: str, key: str, fp: str) -> Tuple[str, Optional[int], Optional[StoredResponse]]:
+        db = self.session_factory()
+        try:
+            state, record = claim(db, owner, key, fp)
+            if state == "replay":
+                return state, record.id, (record.status_code, json.loads(record.headers or "[]"), record.body or b"")
+            return state, record.id if record is not None else None, None
+        finally:
+            db.close()
+
+    def _finish(self, record_id: int, response: Optional[StoredResponse]) -> None:
+        db = self.session_factory()
+        try:
+            if response is None:
+                release(db, record_id)
+            else:
+                complete(db, record_id, *response)
+        except Exception:
+            # The claim then expires after IDEMPOTENCY_LOCK_SECONDS; the response already went out.
+            logger.exception("Could not store idempotent response %s", record_id)
+        finally:
+            db.close()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or not self.enabled or scope["method"] not in METHODS
+            or scope["path"].startswith(EXCLUDED_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+        key = _header(scope, b"idempotency-key")
+        owner = caller_key(scope) if key is not None else None
+        if owner is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"},
+                                    status_code=400)
+            await response(scope, receive, send)
+            return
+
+        body, receive = await _read_body(scope, receive)
+        fp = fingerprint(scope["method"], scope["path"], scope.get("query_string", b""),
+                         _header(scope, b"content-type") or "", body)
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            state, record_id, stored = await run_in_threadpool(self._claim, owner, key, fp)
+            if state != "busy" or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(POLL_SECONDS)
+
+        if state == "mismatch":
+            response = JSONResponse({"detail": "Idempotency-Key was already used for a different request"},
+                                    status_code=422)
+            await response(scope, receive, send)
+            return
+        if state == "busy":
+            response = JSONResponse({"detail": "A request with this Idempotency-Key is still in progress"},
+                                    status_code=409, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        if state == "replay":
+            status_code, headers, content = stored
+            await send({
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers] + [REPLAYED_HEADER],
+            })
+            await send({"type": "http.response.body", "body": content})
+            return
+
+        status_code, headers, chunks, size = None, [], [], 0
+
+        async def send_recording(message):
+            nonlocal status_code, headers, chunks, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = [[k.decode("latin-1"), v.decode("latin-1")] for k, v in message.get("headers", [])]
+            elif message["type"] == "http.response.body" and chunks is not None:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                # Too large to keep: released below, and a retry runs the handler again.
+                if size <= MAX_STORED_RESPONSE:
+                    chunks.append(chunk)
+                else:
+                    chunks = None
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_recording)
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(self._finish, record_id, None)
+            raise
+        storable = status_code is not None and status_code < 500 and chunks is not None
+        result = (status_code, headers, b"".join(chunks)) if storable else None
+        await run_in_threadpool(self._finish, record_id, result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain stored idempotent responses")
+    parser.add_argument("--purge", action="store_true", help="Delete expired idempotency keys")
+    args = parser.parse_args()
+
+    if not args.purge:
+        parser.print_help()
+        return
+
+    db = SessionLocal()
+    try:
+        print(f"Removed {purge_expired(db)} expired idempotency keys")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Application lifecycle: startup warm-up, graceful draining and readiness.
+
+On startup the lifespan hook opens a few database connections so the first
+requests don't pay for connection setup, checks replica health and warms the
+in-process caches.
+
+SIGTERM starts draining: readiness turns 503 while the worker keeps serving
+for SHUTDOWN_DRAIN_SECONDS, so the load balancer stops routing here before
+the listener closes. The server is then stopped through its own SIGINT
+handler, which finishes in-flight requests and runs the lifespan shutdown:
+stop the media workers and dispose every connection pool. Drain time plus
+the slowest request must fit in the server's graceful timeout.
+"""
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
+
+import database
+import media
+
+logger = logging.getLogger("masna.lifecycle")
+
+WARM_CONNECTIONS = int(os.getenv("DB_POOL_WARM_CONNECTIONS", "2"))
+WARM_CACHES = os.getenv("WARM_CACHES", "true").lower() == "true"
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "10"))
+
+
+class LifecycleState:
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
+        self.started_at = None
+
+
+state = LifecycleState()
+
+
+class InFlightMiddleware:
+    """Counts HTTP requests currently being served so shutdown can wait for them."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        state.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            state.in_flight -= 1
+
+
+def warm_pool(engine, connections: int) -> None:
+    """Check out `connections` connections at once so the pool keeps them open."""
+    held = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            held.append(conn)
+    finally:
+        for conn in held:
+            conn.close()
+
+
+def warm_caches() -> None:
+    from recommendations import ensure_index
+
+    db = database.SessionLocal()
+    try:
+        ensure_index(db)
+    finally:
+        db.close()
+
+
+def pool_status(engine) -> dict:
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    for name in ("size", "checkedout", "checkedin", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            status[name] = method()
+    return status
+
+
+def begin_draining(loop, stop, delay: float = SHUTDOWN_DRAIN_SECONDS) -> None:
+    """Fail readiness now and call `stop` once the load balancer has had `delay` seconds to notice."""
+    if state.draining:
+        return
+    state.draining = True
+    logger.info("Draining: readiness is 503, stopping in %.1fs", delay)
+    loop.call_later(delay, stop)
+
+
+def _stop_server() -> None:
+    # uvicorn and hypercorn shut down gracefully on SIGINT just as they would on SIGTERM.
+    signal.raise_signal(signal.SIGINT)
+
+
+def install_drain_handler(loop) -> bool:
+    """Route SIGTERM through begin_draining; the server installed its handlers before the lifespan starts."""
+    if threading.current_thread() is not threading.main_thread():
+        return False
+    try:
+        loop.add_signal_handler(signal.SIGTERM, begin_draining, loop, _stop_server)
+    except (NotImplementedError, RuntimeError):
+        return False
+    return True
+
+
+def readiness() -> tuple:
+    """(ready, details) reflecting draining state, primary pool health and replicas."""
+    details = {"draining": state.draining, "in_flight": state.in_flight}
+    ok = state.ready and not state.draining
+    started = time.perf_counter()
+    try:
+        with database.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        details["database"] = {
+            "ok": True,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "pool": pool_status(database.engine),
+        }
+    except Exception as exc:
+        ok = False
+        details["database"] = {"ok": False, "error": exc.__class__.__name__}
+    if database.replica_router.replicas:
+        details["replicas"] = {r.url.rsplit("@", 1)[-1]: r.healthy for r in database.replica_router.replicas}
+    return ok, details
+
+
+@asynccontextmanager
+async def lifespan(app):
+    loop = asyncio.get_running_loop()
+    state.started_at = time.time()
+    try:
+        await loop.run_in_executor(None, warm_pool, database.engine, WARM_CONNECTIONS)
+        await loop.run_in_executor(None, database.replica_router.check_all)
+        if WARM_CACHES:
+            await loop.run_in_executor(None, warm_caches)
+    except Exception:
+        # A cold cache or pool is slower, not broken; readiness reports the DB state.
+        logger.exception("Startup warm-up failed")
+    state.ready = True
+    state.draining = False
+    install_drain_handler(loop)
+    yield
+
+    # The server has stopped accepting and waited out its graceful timeout by now.
+    state.draining = True
+    if state.in_flight:
+        logger.warning("Shutting down with %d requests still in flight", state.in_flight)
+    media.processor.shutdown()
+    database.dispose_engines()
+    state.ready = False
@@ -1,18 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status, WebSocket
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy import or_
 from typing import List, Optional
 import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import os
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
 
-from database import get_db, User, Idea, Project, Proposal, Message, Rating, FileUpload
+from database import (
+    get_db, get_read_db, SessionLocal, ReadYourWritesMiddleware,
+    User, Idea, Project, Proposal, Message, Rating, FileUpload, ProposalStatus, UploadSession
+)
+from ratelimit import RateLimitMiddleware
+from compression import CompressionMiddleware
+from idempotency import IdempotencyMiddleware
+from sqlprofile import SQLProfilerMiddleware
+from lifecycle import InFlightMiddleware, lifespan, readiness
+from recommendations import recommend_executors, refresh_executor
+import acceptance
+import analytics
+import etags
+import events
+import feed
+import media
+import notifications
+import proposal_ranking
+import similarity
+import sqlprofile
+import storage
+import timeline
 
 def parse_user_skills(user):
     """Parse user skills from JSON string to list."""
+    if isinstance(getattr(user, 'skills', None), list):
+        return user
     if hasattr(user, 'skills') and user.skills:
         try:
             user.skills = json.loads(user.skills)
@@ -23,20 +51,23 @@ def parse_user_skills(user):
     return user
 from schemas import (
     UserCreate, UserResponse, UserUpdate,
-    IdeaCreate, IdeaResponse, IdeaUpdate,
+    IdeaCreate, IdeaResponse, IdeaUpdate, SimilarIdeaResponse,
     ProjectCreate, ProjectResponse, ProjectUpdate,
-    ProposalCreate, ProposalResponse, ProposalUpdate,
+    ProposalCreate, ProposalResponse, ProposalUpdate, ProposalComparison, ExecutorRecommendation,
     MessageCreate, MessageResponse,
     RatingCreate, RatingResponse,
-    FileUploadResponse, LoginRequest, Token
+    FileUploadResponse, ProjectBundle, LoginRequest, Token, RefreshRequest, TimelinePage,
+    NotificationPage, UnreadCount, UploadSessionCreate, UploadSessionResponse, StorageUsage,
+    SlowQueryStats, RequestProfileSummary, RequestProfileResponse, DailyAnalytics, AnalyticsSummary
 )
 from auth import (
-    authenticate_user, create_access_token, get_current_active_user,
-    get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES
+    authenticate_user, create_user_tokens, get_current_active_user,
+    get_current_principal, get_optional_principal, get_password_hash,
+    refresh_user_tokens, revoke_user_tokens
 )
 
 APP_NAME = os.getenv("APP_NAME", "Masna")
-app = FastAPI(title=f"{APP_NAME}", version="1.0.0")
+app = FastAPI(title=f"{APP_NAME}", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
@@ -50,18 +81,60 @@ additional_origins = [
 ]
 allow_origins = list({frontend_url, *additional_origins})
 
+# Innermost: replay stored responses to retried writes carrying an Idempotency-Key
+app.add_middleware(IdempotencyMiddleware)
+
+# Compress JSON bodies negotiated via Accept-Encoding (uploads are served as-is)
+app.add_middleware(CompressionMiddleware)
+
+# Time SQL per request: slow-query log always, full profiles on demand
+sqlprofile.install()
+app.add_middleware(SQLProfilerMiddleware)
+
+# Rate limiting and admission control; added before CORS so CORS wraps its 429/503 responses
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Read-Your-Writes"],
 )
 
+# Read-your-writes: after a successful write, keep this client on the primary
+# for a few seconds so replica lag never hides what it just changed.
+app.add_middleware(ReadYourWritesMiddleware)
+
+# A versioned UPDATE matched no row: another request changed it since it was read
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    if request.headers.get("if-match"):
+        return JSONResponse({"detail": "Resource was modified; fetch it again and retry"}, status_code=412)
+    return JSONResponse({"detail": "Resource was modified concurrently; retry"}, status_code=409)
+
+# Outermost: count every request so shutdown can drain them
+app.add_middleware(InFlightMiddleware)
+
 # Static files for uploads
-UPLOAD_ROOT = os.getenv("UPLOAD_DIR", "uploads")
-os.makedirs(UPLOAD_ROOT, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_ROOT), name="uploads")
+UPLOAD_ROOT = storage.UPLOAD_ROOT
+# The directory is created by the first upload, not at import time.
+app.mount("/uploads", StaticFiles(directory=UPLOAD_ROOT, check_dir=False), name="uploads")
+
+# Health endpoints
+@app.get("/health/live")
+def liveness():
+    """The process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+def readiness_check(response: Response):
+    """Whether this worker should receive traffic: not draining and the DB pool is healthy."""
+    ok, details = readiness()
+    if not ok:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return dict(details, status="ok" if ok else "unavailable")
 
 # Auth endpoints
 @app.post("/auth/register", response_model=UserResponse)
@@ -90,6 +163,10 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    if db_user.role.value == "executor":
+        refresh_executor(db, db_user.id)
+        if db_user.skills:
+            feed.rebuild_user_feed(db, db_user.id)
     
     # Convert skills back to list for response
     if db_user.skills:
@@ -108,17 +185,33 @@ def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = D
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return create_user_tokens(user)
+
+@app.post("/auth/refresh", response_model=Token)
+def refresh_tokens(payload: RefreshRequest, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access/refresh token pair."""
+    return refresh_user_tokens(db, payload.refresh_token)
+
+@app.post("/auth/logout", status_code=204)
+def logout_user(
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Revoke every access and refresh token issued to the current user."""
+    revoke_user_tokens(db, current_user)
 
 # User endpoints
 @app.get("/users/me", response_model=UserResponse)
-def get_current_user_profile(current_user: User = Depends(get_current_active_user)):
+def get_current_user_profile(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_active_user)
+):
     """Get current user's profile."""
+    etag = etags.make_etag(current_user)
+    if etags.not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     if current_user.skills:
         current_user.skills = json.loads(current_user.skills)
     return current_user
@@ -126,10 +219,13 @@ def get_current_user_profile(current_user: User = Depends(get_current_active_use
 @app.put("/users/me", response_model=UserResponse)
 def update_current_user_profile(
     user_update: UserUpdate,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Update current user's profile."""
+    etags.check_if_match(request, current_user.version)
     update_data = user_update.dict(exclude_unset=True)
     
     if "skills" in update_data and update_data["skills"]:
@@ -140,7 +236,14 @@ def update_current_user_profile(
     
     db.commit()
     db.refresh(current_user)
+    if current_user.role.value == "executor":
+        refresh_executor(db, current_user.id)
+        if "skills" in update_data:
+            feed.rebuild_user_feed(db, current_user.id)
+            if proposal_ranking.rescore_executor(db, current_user.id):
+                db.commit()
     
+    response.headers["ETag"] = etags.make_etag(current_user)
     if current_user.skills:
         current_user.skills = json.loads(current_user.skills)
     
@@ -150,10 +253,11 @@ def update_current_user_profile(
 @app.post("/ideas", response_model=IdeaResponse)
 def create_idea(
     idea: IdeaCreate,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Create a new idea."""
+    """Create a new idea; near-duplicates already submitted are listed in X-Similar-Ideas."""
     if current_user.role.value not in ["idea_creator", "admin"]:
         raise HTTPException(
             status_code=403,
@@ -171,6 +275,13 @@ def create_idea(
     db.add(db_idea)
     db.commit()
     db.refresh(db_idea)
+
+    sig = similarity.index_idea(db, db_idea)
+    db.commit()
+    if sig:
+        similar = similarity.find_similar(db, sig, exclude_id=db_idea.id)
+        if similar:
+            response.headers["X-Similar-Ideas"] = ",".join(str(idea_id) for idea_id, _ in similar)
     
     # Load creator relationship and parse skills
     db.refresh(db_idea, ["creator"])
@@ -188,7 +299,7 @@ def get_ideas(
     status: Optional[str] = None,
     creator_id: Optional[int] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get all ideas with optional filtering."""
     query = db.query(Idea)
@@ -214,13 +325,17 @@ def get_ideas(
     return ideas
 
 @app.get("/ideas/{idea_id}", response_model=IdeaResponse)
-def get_idea(idea_id: int, db: Session = Depends(get_db)):
+def get_idea(idea_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
     """Get a specific idea by ID."""
     idea = db.query(Idea).filter(Idea.id == idea_id).first()
     if not idea:
         raise HTTPException(status_code=404, detail="Idea not found")
     
     db.refresh(idea, ["creator"])
+    etag = etags.make_etag(idea, idea.creator)
+    if etags.not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     if idea.tags:
         idea.tags = json.loads(idea.tags)
     if idea.creator:
@@ -228,20 +343,57 @@ def get_idea(idea_id: int, db: Session = Depends(get_db)):
     
     return idea
 
+@app.get("/ideas/{idea_id}/similar", response_model=List[SimilarIdeaResponse])
+def get_similar_ideas(
+    idea_id: int,
+    threshold: float = similarity.DEFAULT_THRESHOLD,
+    limit: int = 10,
+    db: Session = Depends(get_db)
+):
+    """Get near-duplicates of an idea, most similar first."""
+    idea = db.query(Idea).filter(Idea.id == idea_id).first()
+    if not idea:
+        raise HTTPException(status_code=404, detail="Idea not found")
+    if not idea.minhash:
+        return []
+
+    matches = similarity.find_similar(
+        db, similarity.unpack(idea.minhash), exclude_id=idea.id,
+        threshold=threshold, limit=max(1, min(limit, 50))
+    )
+    ideas = {i.id: i for i in db.query(Idea).filter(Idea.id.in_([m[0] for m in matches])).all()}
+    results = []
+    for match_id, score in matches:
+        # Deleted between the LSH lookup and the load above.
+        similar = ideas.get(match_id)
+        if similar is None:
+            continue
+        db.refresh(similar, ["creator"])
+        if similar.tags:
+            similar.tags = json.loads(similar.tags)
+        if similar.creator:
+            parse_user_skills(similar.creator)
+        similar.similarity = score
+        results.append(similar)
+    return results
+
 @app.put("/ideas/{idea_id}", response_model=IdeaResponse)
 def update_idea(
     idea_id: int,
     idea_update: IdeaUpdate,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Update an idea."""
+    """Update an idea; with If-Match, only if it is unchanged since that ETag."""
     idea = db.query(Idea).filter(Idea.id == idea_id).first()
     if not idea:
         raise HTTPException(status_code=404, detail="Idea not found")
     
     if idea.creator_id != current_user.id and current_user.role.value != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to update this idea")
+    etags.check_if_match(request, idea.version)
     
     update_data = idea_update.dict(exclude_unset=True)
     
@@ -251,9 +403,12 @@ def update_idea(
     for field, value in update_data.items():
         setattr(idea, field, value)
     
+    if "title" in update_data or "description" in update_data:
+        similarity.index_idea(db, idea)
     db.commit()
     db.refresh(idea)
     db.refresh(idea, ["creator"])
+    response.headers["ETag"] = etags.make_etag(idea, idea.creator)
     
     if idea.tags:
         idea.tags = json.loads(idea.tags)
@@ -313,8 +468,11 @@ def create_project(
     )
     
     db.add(db_project)
+    db.flush()
+    events.emit(db, "project.created", project_id=db_project.id, actor_id=current_user.id, title=db_project.title)
     db.commit()
     db.refresh(db_project)
+    feed.on_project_created(db, db_project)
 
     # If linked to an idea, update its status to in_project
     if db_project.idea_id:
@@ -353,7 +511,7 @@ def get_projects(
     status: Optional[str] = None,
     employer_id: Optional[int] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get all projects with optional filtering."""
     query = db.query(Project)
@@ -391,7 +549,7 @@ def get_projects(
     return projects
 
 @app.get("/projects/{project_id}", response_model=ProjectResponse)
-def get_project(project_id: int, db: Session = Depends(get_db)):
+def get_project(project_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
     """Get a specific project by ID."""
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
@@ -403,6 +561,12 @@ def get_project(project_id: int, db: Session = Depends(get_db)):
             db.refresh(project.idea, ["creator"])
         except Exception:
             pass
+    etag = etags.make_etag(
+        project, project.employer, project.executor, project.idea, project.idea.creator if project.idea else None
+    )
+    if etags.not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     if project.idea and getattr(project.idea, "tags", None):
         try:
             project.idea.tags = json.loads(project.idea.tags)
@@ -416,6 +580,119 @@ def get_project(project_id: int, db: Session = Depends(get_db)):
         parse_user_skills(project.idea.creator)
     return project
 
+@app.get("/projects/{project_id}/bundle", response_model=ProjectBundle)
+def get_project_bundle(
+    project_id: int,
+    current_user: Optional[User] = Depends(get_optional_principal),
+    db: Session = Depends(get_read_db)
+):
+    """The project page in one round trip: project, proposals, files, messages and ratings.
+
+    Auth is resolved once and every section is loaded with a fixed number of
+    queries (relationships are batch-loaded), instead of one request and one
+    auth lookup per section plus a refresh per row. Anonymous visitors get
+    the public sections only: the project and its ratings.
+    """
+    project = (
+        db.query(Project)
+        .options(
+            selectinload(Project.employer), selectinload(Project.executor),
+            selectinload(Project.idea).selectinload(Idea.creator),
+        )
+        .filter(Project.id == project_id)
+        .first()
+    )
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project.idea and getattr(project.idea, "tags", None):
+        try:
+            project.idea.tags = json.loads(project.idea.tags)
+        except Exception:
+            pass
+
+    user_id = current_user.id if current_user is not None else None
+    is_admin = current_user is not None and current_user.role.value == "admin"
+    is_member = user_id is not None and user_id in (project.employer_id, project.executor_id)
+    bundle = {"project": project, "proposals": None, "files": None, "messages": None}
+    if is_admin or (user_id is not None and user_id == project.employer_id):
+        bundle["proposals"] = (
+            db.query(Proposal).options(selectinload(Proposal.executor))
+            .filter(Proposal.project_id == project_id).order_by(Proposal.id).all()
+        )
+    if is_admin or is_member:
+        bundle["files"] = (
+            db.query(FileUpload).options(selectinload(FileUpload.artifacts), selectinload(FileUpload.uploader))
+            .filter(FileUpload.project_id == project_id).order_by(FileUpload.id).all()
+        )
+    if is_member:
+        bundle["messages"] = (
+            db.query(Message).options(selectinload(Message.sender))
+            .filter(Message.project_id == project_id).order_by(Message.id).all()
+        )
+    bundle["ratings"] = (
+        db.query(Rating).options(selectinload(Rating.rater))
+        .filter(Rating.project_id == project_id).order_by(Rating.id).all()
+    )
+
+    users = [project.employer, project.executor, project.idea.creator if project.idea else None]
+    users += [p.executor for p in bundle["proposals"] or []]
+    users += [f.uploader for f in bundle["files"] or []]
+    users += [m.sender for m in bundle["messages"] or []]
+    users += [r.rater for r in bundle["ratings"]]
+    for user in users:
+        if user is not None:
+            parse_user_skills(user)
+    return bundle
+
+@app.get("/projects/{project_id}/recommended-executors", response_model=List[ExecutorRecommendation])
+def get_recommended_executors(
+    project_id: int,
+    limit: int = 10,
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Rank executors for a project by skill/text match weighted by their ratings."""
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    if project.employer_id != current_user.id and current_user.role.value != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view recommendations for this project")
+
+    ranked = recommend_executors(db, project, limit=max(1, min(limit, 100)))
+    users = {
+        u.id: parse_user_skills(u)
+        for u in db.query(User).filter(User.id.in_([r["executor_id"] for r in ranked])).all()
+    }
+    return [dict(r, executor=users[r["executor_id"]]) for r in ranked if r["executor_id"] in users]
+
+# Feed endpoints
+@app.get("/feed/projects", response_model=List[ProjectResponse])
+def get_project_feed(
+    skip: int = 0,
+    limit: int = 50,
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Open projects ranked for the calling executor by skills, budget and recency."""
+    if current_user.role.value not in ["executor", "admin"]:
+        raise HTTPException(status_code=403, detail="Only executors have a project feed")
+
+    projects = feed.read_feed(db, current_user.id, skip=skip, limit=min(limit, 100))
+    for project in projects:
+        if project.idea and getattr(project.idea, "tags", None):
+            try:
+                project.idea.tags = json.loads(project.idea.tags)
+            except Exception:
+                pass
+        if project.employer:
+            parse_user_skills(project.employer)
+        if project.executor:
+            parse_user_skills(project.executor)
+        if project.idea and getattr(project.idea, "creator", None):
+            parse_user_skills(project.idea.creator)
+    return projects
+
 # Proposal endpoints
 @app.post("/proposals", response_model=ProposalResponse)
 def create_proposal(
@@ -456,18 +733,25 @@ def create_proposal(
     )
     
     db.add(db_proposal)
+    db.flush()
+    events.emit(
+        db, "proposal.created",
+        project_id=db_proposal.project_id, actor_id=current_user.id,
+        proposal_id=db_proposal.id, proposed_price=db_proposal.proposed_price,
+    )
     db.commit()
     db.refresh(db_proposal)
     
     # Load executor relationship
     db.refresh(db_proposal, ["executor"])
+    parse_user_skills(db_proposal.executor)
     
     return db_proposal
 
 @app.get("/projects/{project_id}/proposals", response_model=List[ProposalResponse])
 def get_project_proposals(
     project_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: User = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get all proposals for a project."""
@@ -484,14 +768,41 @@ def get_project_proposals(
     # Load executor relationships
     for proposal in proposals:
         db.refresh(proposal, ["executor"])
+        parse_user_skills(proposal.executor)
     
     return proposals
 
-@app.put("/proposals/{proposal_id}", response_model=ProposalResponse)
-def update_proposal_status(
+@app.get("/projects/{project_id}/proposals/compare", response_model=List[ProposalComparison])
+def compare_project_proposals(
+    project_id: int,
+    sort: str = "score",
+    status: Optional[ProposalStatus] = None,
+    max_price_ratio: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    min_skill_score: Optional[float] = None,
+    max_timeline_days: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 50,
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_read_db)
+):
+    """Rank and filter a project's proposals by price against budget, rating, skill match and timeline."""
+    project = db.query(Project.employer_id).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project.employer_id != current_user.id and current_user.role.value != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view proposals")
+    if sort not in proposal_ranking.SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(proposal_ranking.SORTS)}")
+    return proposal_ranking.compare(
+        db, project_id, sort=sort, status=status, max_price_ratio=max_price_ratio, min_rating=min_rating,
+        min_skill_score=min_skill_score, max_timeline_days=max_timeline_days,
+        limit=max(1, min(limit, 200)), offset=max(0, skip),
+    )
+
 @app.get("/proposals/me", response_model=List[ProposalResponse])
 def get_my_proposals(
-    current_user: User = Depends(get_current_active_user),
+    current_user: User = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get all proposals created by the current executor user."""
@@ -501,49 +812,102 @@ def get_my_proposals(
     proposals = query.order_by(Proposal.created_at.desc()).all()
     for p in proposals:
         db.refresh(p, ["executor"])  # ensure executor relation is loaded
+        parse_user_skills(p.executor)
     return proposals
+
+@app.put("/proposals/{proposal_id}", response_model=ProposalResponse)
+def update_proposal_status(
     proposal_id: int,
     proposal_update: ProposalUpdate,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Update proposal status (accept/reject)."""
-    proposal = db.query(Proposal).filter(Proposal.id == proposal_id).first()
-    if not proposal:
+    accepting = proposal_update.status == ProposalStatus.ACCEPTED
+    row = acceptance.load_for_update(db, proposal_id, lock=accepting)
+    if not row:
         raise HTTPException(status_code=404, detail="Proposal not found")
-    
-    project = db.query(Project).filter(Project.id == proposal.project_id).first()
+    proposal, project = row
     
     # Only project employer can update proposal status
     if project.employer_id != current_user.id and current_user.role.value != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to update proposal")
+    etags.check_if_match(request, proposal.version)
     
     update_data = proposal_update.dict(exclude_unset=True)
+    if accepting:
+        # The acceptance workflow below sets the status together with the project
+        update_data.pop("status")
     
     for field, value in update_data.items():
         setattr(proposal, field, value)
-    
-    # If proposal is accepted, assign executor to project
-    if proposal_update.status == "accepted":
-        project.executor_id = proposal.executor_id
-        project.status = "in_progress"
+    if {"proposed_price", "proposed_timeline"} & update_data.keys():
+        proposal_ranking.score_proposal(db, proposal, project)
+    
+    # Accepting assigns the executor and rejects the other pending proposals atomically.
+    # The proposal's own edits are flushed first: that UPDATE checks its version,
+    # which the acceptance's Core UPDATE then bumps again.
+    if accepting:
+        db.flush()
+    if accepting and not acceptance.accept_proposal(db, proposal, project, actor_id=current_user.id):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Project already has an executor")
+    if proposal_update.status == ProposalStatus.REJECTED:
+        events.emit(
+            db, "proposal.rejected",
+            project_id=project.id, actor_id=current_user.id, proposal_id=proposal.id,
+            executor_id=proposal.executor_id, employer_id=project.employer_id,
+        )
     
     db.commit()
+    if accepting:
+        refresh_executor(db, proposal.executor_id)
+        feed.on_project_status_changed(db, project)
     db.refresh(proposal)
     db.refresh(proposal, ["executor"])
+    response.headers["ETag"] = etags.make_etag(proposal, proposal.executor)
+    parse_user_skills(proposal.executor)
     
     return proposal
 
 # File upload endpoints
+# Boundaries, part headers and the is_final_delivery field around the file itself.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+async def read_limited_form(request: Request, limit: int):
+    """Parse a multipart body, refusing it by Content-Length or as soon as more than `limit` bytes arrive."""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise HTTPException(status_code=413, detail=f"Upload body exceeds the {limit} bytes this project may still take")
+
+    async def limited():
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > limit:
+                raise HTTPException(status_code=413, detail=f"Upload body exceeds the {limit} bytes this project may still take")
+            yield chunk
+
+    try:
+        return await MultiPartParser(request.headers, limited()).parse()
+    except MultiPartException as exc:
+        raise HTTPException(status_code=400, detail=exc.message)
+
 @app.post("/projects/{project_id}/files", response_model=FileUploadResponse)
 async def upload_project_file(
     project_id: int,
-    file: UploadFile = File(...),
-    is_final_delivery: bool = Form(False),
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Upload a file for a project by employer or assigned executor."""
+    """Upload a file for a project by employer or assigned executor.
+
+    Multipart form with `file` and an optional `is_final_delivery`. The body is
+    parsed here rather than by FastAPI so an upload over the remaining quota is
+    refused before it is received.
+    """
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -552,26 +916,55 @@ async def upload_project_file(
     if current_user.id not in [project.employer_id, project.executor_id] and current_user.role.value != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to upload files for this project")
 
-    # Ensure project upload directory exists
-    project_dir = os.path.join(UPLOAD_ROOT, f"project_{project_id}")
-    os.makedirs(project_dir, exist_ok=True)
+    try:
+        storage.check_quota(db, project_id, current_user.id, 0)
+    except storage.QuotaExceeded as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    remaining = storage.remaining_quota(db, project_id, current_user.id)
+    limit = storage.MAX_UPLOAD_SIZE if remaining is None else min(remaining, storage.MAX_UPLOAD_SIZE)
+    # Don't hold a pooled connection while a slow client sends the body.
+    db.close()
+
+    form = await read_limited_form(request, limit + MULTIPART_OVERHEAD_BYTES)
+    try:
+        return await save_project_file(db, project_id, current_user, form, remaining)
+    finally:
+        await form.close()
+
+async def save_project_file(db: Session, project_id: int, current_user: User, form, remaining):
+    file = form.get("file")
+    if not isinstance(file, UploadFile):
+        raise HTTPException(status_code=422, detail="Form field 'file' is required")
+    is_final_delivery = str(form.get("is_final_delivery", "false")).lower() in ("true", "1", "yes", "on")
 
     # Sanitize filename minimally
     filename = os.path.basename(file.filename)
-    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
-    stored_name = f"{timestamp}_{filename}"
-    file_path = os.path.join(project_dir, stored_name)
-
-    # Save file to disk
-    with open(file_path, "wb") as out:
-        while True:
-            chunk = await file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
+    file_path, rel_url = storage.stored_path(project_id, filename)
+
+    # Save file to disk, stopping as soon as the body outgrows the quota left
+    written = 0
+    try:
+        with open(file_path, "wb") as out:
+            while True:
+                chunk = await file.read(1024 * 1024)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if remaining is not None and written > remaining:
+                    storage.check_quota(db, project_id, current_user.id, written)
+                out.write(chunk)
+    except storage.QuotaExceeded as exc:
+        os.remove(file_path)
+        raise HTTPException(status_code=413, detail=str(exc))
+
+    # Checked again: other uploads may have finished while this one was written
+    try:
+        storage.check_quota(db, project_id, current_user.id, os.path.getsize(file_path))
+    except storage.QuotaExceeded as exc:
+        os.remove(file_path)
+        raise HTTPException(status_code=413, detail=str(exc))
 
     # Prepare DB record
-    rel_url = f"/uploads/project_{project_id}/{stored_name}"
     db_file = FileUpload(
         project_id=project_id,
         uploaded_by=current_user.id,
@@ -579,6 +972,7 @@ async def upload_project_file(
         file_url=rel_url,
         file_type=file.content_type,
         is_final_delivery=is_final_delivery,
+        processing_status="pending" if media.media_kind(filename, file.content_type) else "skipped",
     )
     try:
         size = os.path.getsize(file_path)
@@ -587,15 +981,164 @@ async def upload_project_file(
         pass
 
     db.add(db_file)
+    db.flush()
+    events.emit(
+        db, "file.uploaded",
+        project_id=project_id, actor_id=current_user.id, file_id=db_file.id,
+        filename=db_file.filename, is_final_delivery=db_file.is_final_delivery, size=db_file.file_size,
+    )
     db.commit()
     db.refresh(db_file)
+    if db_file.processing_status == "pending":
+        media.schedule(db_file.id)
 
     return db_file
 
+# Resumable uploads for large files (see storage.py for the protocol)
+def upload_session_response(session):
+    return {
+        "id": session.id,
+        "project_id": session.project_id,
+        "filename": session.filename,
+        "size": session.size,
+        "offset": session.offset,
+        "chunk_size": storage.CHUNK_SIZE,
+        "expires_at": session.expires_at,
+        "completed_at": session.completed_at,
+        "file": session.file,
+    }
+
+def get_own_upload_session(session_id: str, current_user: User, db: Session):
+    session = db.query(UploadSession).filter(UploadSession.id == session_id).first()
+    if not session or session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session.completed_at is None and storage.is_expired(session):
+        raise HTTPException(status_code=410, detail="Upload session expired")
+    return session
+
+@app.post("/projects/{project_id}/uploads", response_model=UploadSessionResponse, status_code=201)
+def create_upload_session(
+    project_id: int,
+    upload: UploadSessionCreate,
+    response: Response,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Start a resumable upload; send the bytes with PUT /upload-sessions/{id}."""
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    if current_user.id not in [project.employer_id, project.executor_id] and current_user.role.value != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to upload files for this project")
+
+    if upload.size <= 0 or upload.size > storage.MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=f"Upload size must be between 1 and {storage.MAX_UPLOAD_SIZE} bytes")
+
+    try:
+        session = storage.create_session(
+            db, project_id, current_user.id, upload.filename, upload.size,
+            content_type=upload.content_type, sha256=upload.sha256, is_final_delivery=upload.is_final_delivery,
+        )
+    except storage.QuotaExceeded as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    response.headers["Location"] = f"/upload-sessions/{session.id}"
+    response.headers["Upload-Offset"] = "0"
+    return upload_session_response(session)
+
+@app.get("/upload-sessions/{session_id}", response_model=UploadSessionResponse)
+@app.head("/upload-sessions/{session_id}")
+def get_upload_session(
+    session_id: str,
+    response: Response,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Where to resume: the Upload-Offset header (and `offset`) is the number of bytes received."""
+    session = get_own_upload_session(session_id, current_user, db)
+    response.headers["Upload-Offset"] = str(session.offset)
+    return upload_session_response(session)
+
+def finish_upload_session(db: Session, session: UploadSession) -> None:
+    db_file = storage.complete_session(db, session)
+    if db_file is not None and db_file.processing_status == "pending":
+        media.schedule(db_file.id)
+    db.refresh(session)
+
+@app.put("/upload-sessions/{session_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    session_id: str,
+    offset: int,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Append the request body at `offset`; resending bytes already received is a no-op.
+
+    Async only to stream the body; every database call and file write runs
+    in the threadpool.
+    """
+    session = await run_in_threadpool(get_own_upload_session, session_id, current_user, db)
+    if session.completed_at is None:
+        try:
+            await storage.write_chunk(db, session, offset, request.stream())
+        except storage.UploadConflict as exc:
+            raise HTTPException(
+                status_code=409, detail=str(exc), headers={"Upload-Offset": str(exc.offset)}
+            )
+        except storage.UploadIntegrityError as exc:
+            raise HTTPException(status_code=413, detail=str(exc))
+
+        if session.offset == session.size:
+            try:
+                await run_in_threadpool(finish_upload_session, db, session)
+            except storage.UploadIntegrityError as exc:
+                raise HTTPException(status_code=422, detail=f"Upload discarded: {exc}")
+
+    response.headers["Upload-Offset"] = str(session.offset)
+    return upload_session_response(session)
+
+@app.delete("/upload-sessions/{session_id}", status_code=204)
+def abort_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Abandon an upload and free its staged bytes."""
+    session = get_own_upload_session(session_id, current_user, db)
+    if session.completed_at is not None:
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    storage.discard_session(db, session)
+
+@app.get("/projects/{project_id}/storage", response_model=StorageUsage)
+def get_project_storage(
+    project_id: int,
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Disk usage of a project against its quota."""
+    project = db.query(Project.employer_id, Project.executor_id).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    if current_user.id not in [project.employer_id, project.executor_id] and current_user.role.value != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view storage for this project")
+
+    return dict(storage.usage(db, project_id=project_id), quota_bytes=storage.PROJECT_QUOTA_BYTES or None)
+
+@app.get("/users/me/storage", response_model=StorageUsage)
+def get_my_storage(
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Disk usage of the caller's uploads against their quota."""
+    return dict(storage.usage(db, user_id=current_user.id), quota_bytes=storage.USER_QUOTA_BYTES or None)
+
 @app.get("/projects/{project_id}/files", response_model=List[FileUploadResponse])
 def list_project_files(
     project_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: User = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """List files for a project (visible to employer, assigned executor, or admin)."""
@@ -606,14 +1149,19 @@ def list_project_files(
     if current_user.id not in [project.employer_id, project.executor_id] and current_user.role.value != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to view files for this project")
 
-    files = db.query(FileUpload).filter(FileUpload.project_id == project_id).all()
+    files = (
+        db.query(FileUpload)
+        .options(selectinload(FileUpload.artifacts))
+        .filter(FileUpload.project_id == project_id)
+        .all()
+    )
     return files
 
 # Dashboard stats endpoint
 @app.get("/dashboard/stats")
 def get_dashboard_stats(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_read_db)
 ):
     """Return simple counts for dashboard depending on the user role."""
     # Ideas created by user
@@ -673,18 +1221,25 @@ def send_message(
     )
     
     db.add(db_message)
+    db.flush()
+    events.emit(
+        db, "message.sent",
+        project_id=db_message.project_id, actor_id=current_user.id, message_id=db_message.id,
+        receiver_id=db_message.receiver_id, preview=db_message.content[:200],
+    )
     db.commit()
     db.refresh(db_message)
     
     # Load sender relationship
     db.refresh(db_message, ["sender"])
+    parse_user_skills(db_message.sender)
     
     return db_message
 
 @app.get("/projects/{project_id}/messages", response_model=List[MessageResponse])
 def get_project_messages(
     project_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: User = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get all messages for a project."""
@@ -695,14 +1250,90 @@ def get_project_messages(
     if project.employer_id != current_user.id and project.executor_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view messages for this project")
     
-    messages = db.query(Message).filter(Message.project_id == project_id).all()
+    # project_id = constant lets PostgreSQL read only this project's partition.
+    messages = db.query(Message).filter(Message.project_id == project_id).order_by(Message.id).all()
     
     # Load sender relationships
     for message in messages:
         db.refresh(message, ["sender"])
+        parse_user_skills(message.sender)
     
     return messages
 
+@app.get("/projects/{project_id}/timeline", response_model=TimelinePage)
+def get_project_timeline(
+    project_id: int,
+    before: Optional[int] = None,
+    limit: int = 50,
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_read_db)
+):
+    """Project activity newest first; pass `next_before` back as `before` for older events."""
+    project = db.query(Project.employer_id, Project.executor_id).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    if current_user.id not in [project.employer_id, project.executor_id] and current_user.role.value != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view this project's timeline")
+    
+    items, next_before = timeline.read_timeline(db, project_id, before=before, limit=limit)
+    return {"items": items, "next_before": next_before}
+
+# Notification endpoints
+@app.get("/notifications", response_model=NotificationPage)
+def get_notifications(
+    before: Optional[int] = None,
+    limit: int = 50,
+    unread_only: bool = False,
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """The caller's notifications, newest first; pass `next_before` back as `before` for older ones."""
+    items, next_before = notifications.list_notifications(
+        db, current_user.id, before=before, limit=limit, unread_only=unread_only
+    )
+    return {"items": items, "next_before": next_before, "unread": notifications.unread_count(db, current_user.id)}
+
+@app.get("/notifications/unread-count", response_model=UnreadCount)
+def get_unread_notification_count(
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Unread badge count, read from the user's counter column."""
+    return {"unread": notifications.unread_count(db, current_user.id)}
+
+@app.post("/notifications/{notification_id}/read", response_model=UnreadCount)
+def mark_notification_read(
+    notification_id: int,
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Mark one notification read."""
+    notifications.mark_read(db, current_user.id, [notification_id])
+    return {"unread": notifications.unread_count(db, current_user.id)}
+
+@app.post("/notifications/read-all", response_model=UnreadCount)
+def mark_all_notifications_read(
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Mark every notification read."""
+    notifications.mark_read(db, current_user.id)
+    return {"unread": 0}
+
+@app.websocket("/ws/notifications")
+async def notifications_socket(websocket: WebSocket, token: str = ""):
+    """Real-time notification push; browsers can't set headers here, so the token is a query parameter."""
+    db = SessionLocal()
+    try:
+        principal = await run_in_threadpool(get_current_principal, token, db)
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+    finally:
+        db.close()
+    await notifications.serve_socket(websocket, principal.id)
+
 # Rating endpoints
 @app.post("/ratings", response_model=RatingResponse)
 def create_rating(
@@ -737,25 +1368,90 @@ def create_rating(
     )
     
     db.add(db_rating)
+    db.flush()
+    events.emit(
+        db, "rating.created",
+        project_id=db_rating.project_id, actor_id=current_user.id, rating_id=db_rating.id,
+        rated_user_id=db_rating.rated_user_id, rating=db_rating.rating,
+    )
     db.commit()
     db.refresh(db_rating)
+    refresh_executor(db, db_rating.rated_user_id)
     
     # Load rater relationship
     db.refresh(db_rating, ["rater"])
+    parse_user_skills(db_rating.rater)
     
     return db_rating
 
 @app.get("/users/{user_id}/ratings", response_model=List[RatingResponse])
-def get_user_ratings(user_id: int, db: Session = Depends(get_db)):
+def get_user_ratings(user_id: int, db: Session = Depends(get_read_db)):
     """Get all ratings for a user."""
     ratings = db.query(Rating).filter(Rating.rated_user_id == user_id).all()
     
     # Load rater relationships
     for rating in ratings:
         db.refresh(rating, ["rater"])
+        parse_user_skills(rating.rater)
     
     return ratings
 
+# SQL profiler (admin only; per-worker data)
+def require_admin(current_user: User = Depends(get_current_active_user)) -> User:
+    if current_user.role.value != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    return current_user
+
+@app.get("/admin/sql/slow-queries", response_model=List[SlowQueryStats])
+def get_slow_queries(
+    limit: int = 20,
+    order_by: str = "total_ms",
+    current_user: User = Depends(require_admin),
+):
+    """Slowest statements on this worker, grouped by normalized SQL."""
+    if order_by not in ("total_ms", "max_ms", "mean_ms", "count"):
+        raise HTTPException(status_code=400, detail="order_by must be total_ms, max_ms, mean_ms or count")
+    return sqlprofile.slow_queries.top(max(1, min(limit, 200)), order_by)
+
+@app.get("/admin/sql/profiles", response_model=List[RequestProfileSummary])
+def get_sql_profiles(current_user: User = Depends(require_admin)):
+    """Recently profiled requests on this worker, newest first."""
+    return [p.summary() for p in reversed(sqlprofile.recent_profiles)]
+
+@app.get("/admin/sql/profiles/{profile_id}", response_model=RequestProfileResponse)
+def get_sql_profile(profile_id: int, current_user: User = Depends(require_admin)):
+    """Every statement of one profiled request."""
+    profile = sqlprofile.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found or expired")
+    return profile.as_dict()
+
+# Admin analytics, served from the daily rollups (see analytics.py)
+@app.get("/admin/analytics/daily", response_model=List[DailyAnalytics])
+def get_daily_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_read_db),
+):
+    """Per-day platform metrics; defaults to the last 30 days."""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end or (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="Pick a range of at most one year with start <= end")
+    return analytics.daily(db, start, end)
+
+@app.get("/admin/analytics/summary", response_model=AnalyticsSummary)
+def get_analytics_summary(
+    days: int = 30,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_read_db),
+):
+    """Totals and weighted rates over the last `days` days."""
+    days = max(1, min(days, 3660))
+    end = datetime.utcnow().date()
+    return analytics.summary(db, end - timedelta(days=days - 1), end)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
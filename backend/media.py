@@ -0,0 +1,273 @@
+"""
+Background media processing for uploaded files.
+
+When an upload completes, `schedule(file_id)` queues it and returns at
+once. A dispatcher thread hands the file to a process pool, where images
+get a thumbnail, PDFs a rendered first page (plus thumbnail) and zip
+archives a listing of their entries. The results are stored as
+FileArtifact rows linked to the FileUpload and returned with the project's
+file list, so clients can preview a delivery without downloading it.
+
+Decoding runs in separate processes (spawned, not forked, so they inherit
+no database connections), which keeps CPU-heavy work off the API workers'
+event loop and GIL. Pillow renders images and pypdfium2 renders PDFs. Both
+are optional; without them those kinds are skipped.
+
+`python media.py --backfill` processes files uploaded before this existed.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import List, Optional, Set
+
+logger = logging.getLogger("masna.media")
+
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+MEDIA_TIMEOUT_SECONDS = int(os.getenv("MEDIA_TIMEOUT_SECONDS", "120"))
+THUMBNAIL_SIZE = (320, 320)
+PREVIEW_WIDTH = 1024
+MAX_ARCHIVE_ENTRIES = 500
+# Refuse to decode images larger than this (decompression bombs).
+MAX_IMAGE_PIXELS = int(os.getenv("MEDIA_MAX_IMAGE_PIXELS", str(80_000_000)))
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tiff"}
+
+
+def media_kind(filename: str, content_type: Optional[str]) -> Optional[str]:
+    """"image", "pdf", "zip" or None for files nothing is derived from."""
+    content_type = (content_type or "").lower()
+    extension = os.path.splitext(filename or "")[1].lower()
+    if content_type.startswith("image/") or extension in IMAGE_EXTENSIONS:
+        return "image"
+    if content_type == "application/pdf" or extension == ".pdf":
+        return "pdf"
+    if content_type in ("application/zip", "application/x-zip-compressed") or extension == ".zip":
+        return "zip"
+    return None
+
+
+# --- Runs in the worker processes: file system only, no database ---
+
+def _save_thumbnail(image, path: str) -> dict:
+    image = image.convert("RGB")
+    image.thumbnail(THUMBNAIL_SIZE)
+    image.save(path, "JPEG", quality=80, optimize=True)
+    return {"width": image.width, "height": image.height, "size": os.path.getsize(path)}
+
+
+def _image_artifacts(path: str, prefix: str) -> List[dict]:
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    with Image.open(path) as image:
+        image.seek(0)
+        meta = _save_thumbnail(image, f"{prefix}_thumb.jpg")
+    return [dict(meta, kind="thumbnail", path=f"{prefix}_thumb.jpg", content_type="image/jpeg")]
+
+
+def _pdf_artifacts(path: str, prefix: str) -> List[dict]:
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        pages = len(pdf)
+        page = pdf[0]
+        scale = PREVIEW_WIDTH / max(page.get_width(), 1)
+        image = page.render(scale=scale).to_pil()
+    finally:
+        pdf.close()
+    preview_path = f"{prefix}_preview.jpg"
+    image.convert("RGB").save(preview_path, "JPEG", quality=85, optimize=True)
+    preview = {
+        "kind": "preview", "path": preview_path, "content_type": "image/jpeg",
+        "width": image.width, "height": image.height, "size": os.path.getsize(preview_path),
+        "data": {"pages": pages},
+    }
+    thumb = dict(_save_thumbnail(image, f"{prefix}_thumb.jpg"), kind="thumbnail",
+                 path=f"{prefix}_thumb.jpg", content_type="image/jpeg")
+    return [preview, thumb]
+
+
+def _zip_artifacts(path: str, prefix: str) -> List[dict]:
+    entries = []
+    total = 0
+    count = 0
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            count += 1
+            total += info.file_size
+            if len(entries) < MAX_ARCHIVE_ENTRIES:
+                entries.append({"name": info.filename, "size": info.file_size, "compressed_size": info.compress_size})
+    return [{
+        "kind": "listing",
+        "content_type": "application/json",
+        "data": {"entries": entries, "entry_count": count, "total_size": total, "truncated": count > len(entries)},
+    }]
+
+
+def process_file(path: str, kind: str, derived_prefix: str) -> List[dict]:
+    """Derive artifacts for one file; paths in the result are on disk next to `derived_prefix`."""
+    os.makedirs(os.path.dirname(derived_prefix), exist_ok=True)
+    if kind == "image":
+        return _image_artifacts(path, derived_prefix)
+    if kind == "pdf":
+        return _pdf_artifacts(path, derived_prefix)
+    if kind == "zip":
+        return _zip_artifacts(path, derived_prefix)
+    return []
+
+
+# --- Runs in the API process ---
+
+class MediaProcessor:
+    def __init__(self, workers: int = MEDIA_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._dispatcher: Optional[ThreadPoolExecutor] = None
+        self._pending: Set[Future] = set()
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+                # One dispatcher per worker process: each waits on its file and then records the result.
+                self._dispatcher = ThreadPoolExecutor(self.workers, thread_name_prefix="media")
+
+    def schedule(self, file_id: int) -> Future:
+        self._start()
+        future = self._dispatcher.submit(self._process_and_record, file_id)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def drain(self, timeout: Optional[float] = None) -> None:
+        """Wait for everything scheduled so far (tests, shutdown)."""
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending, timeout=timeout)
+
+    def shutdown(self, wait_for_jobs: bool = False) -> None:
+        with self._lock:
+            pool, dispatcher = self._pool, self._dispatcher
+            self._pool = self._dispatcher = None
+        if dispatcher:
+            dispatcher.shutdown(wait=wait_for_jobs, cancel_futures=not wait_for_jobs)
+        if pool:
+            pool.shutdown(wait=wait_for_jobs, cancel_futures=not wait_for_jobs)
+
+    def _process_and_record(self, file_id: int) -> None:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            process_and_record(db, file_id, self._pool)
+        except Exception:
+            logger.exception("Processing file %s failed", file_id)
+        finally:
+            db.close()
+
+
+def process_and_record(db, file_id: int, pool: Optional[ProcessPoolExecutor] = None) -> str:
+    """Process one file (in `pool` if given) and store its artifacts; returns the new status."""
+    from database import FileArtifact, FileUpload
+    from storage import disk_path
+
+    db_file = db.query(FileUpload).filter(FileUpload.id == file_id).first()
+    if db_file is None:
+        return "missing"
+    kind = media_kind(db_file.filename, db_file.file_type)
+    if kind is None:
+        db_file.processing_status = "skipped"
+        db.commit()
+        return "skipped"
+
+    path = disk_path(db_file.file_url)
+    project_dir = os.path.dirname(path)
+    prefix = os.path.join(project_dir, "derived", str(db_file.id))
+    try:
+        if pool is not None:
+            artifacts = pool.submit(process_file, path, kind, prefix).result(timeout=MEDIA_TIMEOUT_SECONDS)
+        else:
+            artifacts = process_file(path, kind, prefix)
+    except ImportError as exc:
+        logger.info("Skipping %s preview for file %s: %s", kind, file_id, exc)
+        db_file.processing_status = "skipped"
+        db.commit()
+        return "skipped"
+    except Exception:
+        logger.warning("Could not process file %s", file_id, exc_info=True)
+        db_file.processing_status = "failed"
+        db.commit()
+        return "failed"
+
+    db.query(FileArtifact).filter(FileArtifact.file_id == file_id).delete()
+    base_url = db_file.file_url.rsplit("/", 1)[0]
+    for artifact in artifacts:
+        artifact_path = artifact.get("path")
+        db.add(FileArtifact(
+            file_id=file_id,
+            kind=artifact["kind"],
+            content_type=artifact.get("content_type"),
+            file_url=f"{base_url}/derived/{os.path.basename(artifact_path)}" if artifact_path else None,
+            width=artifact.get("width"),
+            height=artifact.get("height"),
+            size=artifact.get("size"),
+            data=json.dumps(artifact["data"], ensure_ascii=False) if artifact.get("data") else None,
+        ))
+    db_file.processing_status = "done"
+    db.commit()
+    return "done"
+
+
+processor = MediaProcessor()
+
+
+def schedule(file_id: int) -> None:
+    """Queue a committed upload for processing; never blocks the request."""
+    try:
+        processor.schedule(file_id)
+    except Exception:
+        logger.exception("Could not schedule processing of file %s", file_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Derive thumbnails, previews and listings for uploaded files")
+    parser.add_argument("--backfill", action="store_true", help="Process files that were never processed")
+    parser.add_argument("--retry-failed", action="store_true", help="With --backfill, also retry failed files")
+    args = parser.parse_args()
+
+    if not args.backfill:
+        parser.print_help()
+        return
+
+    from database import FileUpload, SessionLocal
+
+    db = SessionLocal()
+    try:
+        statuses = [None, "pending"] + (["failed"] if args.retry_failed else [])
+        query = db.query(FileUpload.id).filter(
+            FileUpload.processing_status.in_([s for s in statuses if s]) | FileUpload.processing_status.is_(None)
+        )
+        ids = [r[0] for r in query.order_by(FileUpload.id)]
+        with ProcessPoolExecutor(MEDIA_WORKERS, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for file_id in ids:
+                print(f"File {file_id}: {process_and_record(db, file_id, pool)}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Hash partitioning of the messages table by project.
+
+On PostgreSQL, `messages` becomes a declaratively partitioned table,
+PARTITION BY HASH (project_id), with MESSAGE_PARTITIONS partitions. Every
+query the API runs filters on project_id = constant, so the planner reads a
+single partition and its (project_id, id) index. Routing happens inside
+PostgreSQL, which keeps the Message model and all queries unchanged. The
+table's primary key becomes (id, project_id) because a partitioned table's
+keys must contain the partition key. Ids still come from the same sequence
+and stay unique.
+
+The migration moves existing rows online, in four steps:
+  1. prepare:  create messages_partitioned with its partitions, indexes
+               and foreign keys. Add a trigger that mirrors every insert,
+               update and delete on `messages` into it.
+  2. backfill: copy the existing rows over in id-ordered batches, each in
+               its own short transaction. Copied rows are locked FOR SHARE,
+               so a concurrent update waits and is then mirrored on top of
+               the copy. Copies never clobber newer versions
+               (ON CONFLICT DO NOTHING).
+  3. verify:   compare row counts in one snapshot.
+  4. swap:     briefly lock `messages` and drop the trigger. Rename the old
+               table to messages_unpartitioned and the new one to messages.
+The old table is kept until `--drop-old`.
+
+`python message_partitions.py --migrate` runs all four steps, and every
+step can be re-run safely. On other databases (SQLite in development) only
+the (project_id, id) index is ensured.
+"""
+import argparse
+import os
+import time
+
+MESSAGE_PARTITIONS = int(os.getenv("MESSAGE_PARTITIONS", "16"))
+BATCH_SIZE = 10_000
+
+NEW_TABLE = "messages_partitioned"
+OLD_TABLE = "messages_unpartitioned"
+
+
+def is_partitioned(conn) -> bool:
+    from sqlalchemy import text
+
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'messages' AND c.relnamespace = current_schema()::regnamespace"
+    )).first())
+
+
+def _exists(conn, name: str) -> bool:
+    from sqlalchemy import text
+
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def prepare(engine, partitions: int = MESSAGE_PARTITIONS) -> None:
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            return
+        if not _exists(conn, NEW_TABLE):
+            conn.execute(text(
+                f"CREATE TABLE {NEW_TABLE} (LIKE messages INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                "PARTITION BY HASH (project_id)"
+            ))
+            conn.execute(text(f"ALTER TABLE {NEW_TABLE} ADD PRIMARY KEY (id, project_id)"))
+            conn.execute(text(f"CREATE INDEX ix_messages_part_project_id_id ON {NEW_TABLE} (project_id, id)"))
+            conn.execute(text(f"ALTER TABLE {NEW_TABLE} ADD FOREIGN KEY (project_id) REFERENCES projects (id)"))
+            conn.execute(text(f"ALTER TABLE {NEW_TABLE} ADD FOREIGN KEY (sender_id) REFERENCES users (id)"))
+            conn.execute(text(f"ALTER TABLE {NEW_TABLE} ADD FOREIGN KEY (receiver_id) REFERENCES users (id)"))
+            for remainder in range(partitions):
+                conn.execute(text(
+                    f"CREATE TABLE messages_p{remainder} PARTITION OF {NEW_TABLE} "
+                    f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+                ))
+        # Mirror writes made while the backfill runs; the copy must never lose them.
+        conn.execute(text(f"""
+            CREATE OR REPLACE FUNCTION messages_mirror() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {NEW_TABLE} WHERE id = OLD.id AND project_id = OLD.project_id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {NEW_TABLE} SELECT NEW.* ON CONFLICT DO NOTHING;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """))
+        conn.execute(text("DROP TRIGGER IF EXISTS messages_mirror ON messages"))
+        conn.execute(text(
+            "CREATE TRIGGER messages_mirror AFTER INSERT OR UPDATE OR DELETE ON messages "
+            "FOR EACH ROW EXECUTE FUNCTION messages_mirror()"
+        ))
+
+
+def backfill(engine, batch_size: int = BATCH_SIZE, pause: float = 0.0, log=print) -> int:
+    """Copy rows that existed before the trigger; returns how many were inserted."""
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        high = conn.execute(text("SELECT coalesce(max(id), 0) FROM messages")).scalar()
+    copied = 0
+    last_id = 0
+    while last_id < high:
+        with engine.begin() as conn:
+            # FOR SHARE: an update racing this batch waits, then its trigger
+            # replaces the copied row instead of being overwritten by it.
+            result = conn.execute(text(f"""
+                WITH batch AS (
+                    SELECT * FROM messages WHERE id > :last_id ORDER BY id LIMIT :batch_size FOR SHARE
+                ), copied AS (
+                    INSERT INTO {NEW_TABLE} SELECT * FROM batch ON CONFLICT DO NOTHING RETURNING 1
+                )
+                SELECT (SELECT max(id) FROM batch), (SELECT count(*) FROM copied)
+            """), {"last_id": last_id, "batch_size": batch_size}).one()
+        if result[0] is None:
+            break
+        last_id = result[0]
+        copied += result[1]
+        log(f"Copied up to id {last_id} / {high} ({copied} rows)")
+        if pause:
+            time.sleep(pause)
+    return copied
+
+
+def verify(engine) -> bool:
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            old = conn.execute(text("SELECT count(*) FROM messages")).scalar()
+            new = conn.execute(text(f"SELECT count(*) FROM {NEW_TABLE}")).scalar()
+    print(f"messages: {old} rows, {NEW_TABLE}: {new} rows")
+    return old == new
+
+
+def swap(engine, lock_timeout: str = "5s") -> None:
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        # Give up rather than queue every chat write behind a long transaction.
+        conn.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+        conn.execute(text("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(text("DROP TRIGGER messages_mirror ON messages"))
+        conn.execute(text("DROP FUNCTION messages_mirror()"))
+        conn.execute(text(f"ALTER TABLE messages RENAME TO {OLD_TABLE}"))
+        conn.execute(text("ALTER INDEX IF EXISTS ix_messages_project_id_id RENAME TO ix_messages_unpart_project_id_id"))
+        conn.execute(text(f"ALTER TABLE {NEW_TABLE} RENAME TO messages"))
+        conn.execute(text("ALTER INDEX ix_messages_part_project_id_id RENAME TO ix_messages_project_id_id"))
+        conn.execute(text("ALTER SEQUENCE IF EXISTS messages_id_seq OWNED BY messages.id"))
+
+
+def drop_old(engine) -> None:
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {OLD_TABLE}"))
+
+
+def migrate(engine, partitions: int = MESSAGE_PARTITIONS, batch_size: int = BATCH_SIZE,
+            pause: float = 0.0, log=print) -> str:
+    """Partition `messages` online; returns "partitioned", "already partitioned" or "unsupported"."""
+    if engine.dialect.name != "postgresql":
+        from database import Message
+
+        for index in Message.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+        return "unsupported"
+    with engine.connect() as conn:
+        if is_partitioned(conn):
+            return "already partitioned"
+    prepare(engine, partitions)
+    backfill(engine, batch_size, pause, log)
+    if not verify(engine):
+        raise RuntimeError(f"Row counts differ; re-run the backfill before swapping ({NEW_TABLE} is kept)")
+    swap(engine)
+    return "partitioned"
+
+
+def status(engine) -> None:
+    from sqlalchemy import text
+
+    if engine.dialect.name != "postgresql":
+        print(f"{engine.dialect.name}: messages is not partitioned (PostgreSQL only)")
+        return
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            state = "migration in progress" if _exists(conn, NEW_TABLE) else "not partitioned"
+            print(f"messages: {state}")
+            return
+        rows = conn.execute(text(
+            "SELECT c.relname, c.reltuples::bigint FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'messages' ORDER BY c.relname"
+        )).all()
+    print(f"messages: {len(rows)} hash partitions by project_id")
+    for name, estimate in rows:
+        print(f"  {name:<16} ~{max(estimate, 0)} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition the messages table by hash of project_id (PostgreSQL)")
+    parser.add_argument("--database-url", default=None, help="Defaults to DATABASE_URL")
+    parser.add_argument("--migrate", action="store_true", help="Prepare, backfill, verify and swap")
+    parser.add_argument("--prepare", action="store_true", help="Only create the partitioned table and mirror trigger")
+    parser.add_argument("--backfill", action="store_true", help="Only copy existing rows")
+    parser.add_argument("--swap", action="store_true", help="Only verify and swap the tables")
+    parser.add_argument("--drop-old", action="store_true", help="Drop the unpartitioned table kept by the swap")
+    parser.add_argument("--status", action="store_true", help="Show the partitions and their estimated sizes")
+    parser.add_argument("--partitions", type=int, default=MESSAGE_PARTITIONS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    # Imported after DATABASE_URL is set; database.py reads it at import time.
+    from database import get_engine
+
+    engine = get_engine()
+    if args.migrate:
+        print(f"messages: {migrate(engine, args.partitions, args.batch_size, args.pause)}")
+    elif engine.dialect.name != "postgresql" and (args.prepare or args.backfill or args.swap or args.drop_old):
+        print("Partitioning needs PostgreSQL; nothing to do.")
+    elif args.prepare:
+        prepare(engine, args.partitions)
+    elif args.backfill:
+        backfill(engine, args.batch_size, args.pause)
+    elif args.swap:
+        if not verify(engine):
+            raise SystemExit("Row counts differ; run --backfill first.")
+        swap(engine)
+    elif args.drop_old:
+        drop_old(engine)
+    elif args.status:
+        status(engine)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Idempotent schema operations for the revisions in versions/.
+
+Before migrations existed, deployments got their schema from
+`Base.metadata.create_all`. That creates missing tables with their current
+columns, but never alters a table that already exists. So an existing
+database can be at any point in between: a revision's table may already be
+there, and a column may already be there or not. Every operation here first
+checks the live schema and skips work that is already done. That makes
+`alembic upgrade head` safe from any of those states.
+
+Offline (`alembic upgrade --sql`) there is no schema to check, so the script
+assumes the database is exactly at the starting revision: everything a
+revision adds is missing and everything it drops exists.
+"""
+import sqlalchemy as sa
+from alembic import context, op
+from sqlalchemy.dialects import postgresql
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def has_table(table: str, offline: bool = False) -> bool:
+    if context.is_offline_mode():
+        return offline
+    return _inspector().has_table(table)
+
+
+def has_column(table: str, column: str, offline: bool = False) -> bool:
+    if context.is_offline_mode():
+        return offline
+    return column in {c["name"] for c in _inspector().get_columns(table)}
+
+
+def has_index(table: str, name: str, offline: bool = False) -> bool:
+    if context.is_offline_mode():
+        return offline
+    return name in {i["name"] for i in _inspector().get_indexes(table)}
+
+
+def create_table(table: str, *columns, indexes=()) -> None:
+    """Create `table` unless it exists; `indexes` are (name, columns, unique) and are ensured either way."""
+    if not has_table(table):
+        op.create_table(table, *columns)
+    for name, index_columns, unique in indexes:
+        create_index(name, table, index_columns, unique=unique)
+
+
+def add_column(table: str, column: sa.Column) -> bool:
+    """Add `column` unless it exists; True if it was added."""
+    if has_column(table, column.name):
+        return False
+    op.add_column(table, column)
+    return True
+
+
+def drop_column(table: str, column: str) -> None:
+    if has_column(table, column, offline=True):
+        op.drop_column(table, column)
+
+
+def create_index(name: str, table: str, columns, unique: bool = False) -> None:
+    if not has_index(table, name):
+        op.create_index(name, table, list(columns), unique=unique)
+
+
+def drop_index(name: str, table: str) -> None:
+    if has_table(table, offline=True) and has_index(table, name, offline=True):
+        op.drop_index(name, table_name=table)
+
+
+def drop_table(table: str) -> None:
+    if has_table(table, offline=True):
+        op.drop_table(table)
+
+
+def existing_enum(name: str, *values: str) -> sa.Enum:
+    """A column type for an enum an earlier revision created; PostgreSQL must not create the type again."""
+    return sa.Enum(*values, name=name).with_variant(
+        postgresql.ENUM(*values, name=name, create_type=False), "postgresql"
+    )
@@ -0,0 +1,129 @@
+"""Baseline: the schema create_tables.py created before migrations
+
+Revision ID: baseline
+Revises:
+Create Date: 2026-10-19
+
+Databases created by `create_tables.py` before this directory existed are
+at least at this revision. Each table is created only if it is missing.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from migrations.helpers import create_table, drop_table
+
+# revision identifiers, used by Alembic.
+revision: str = "baseline"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CREATED_AT = dict(server_default=sa.func.now())
+
+
+def upgrade() -> None:
+    create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("full_name", sa.String(), nullable=False),
+        sa.Column("role", sa.Enum("IDEA_CREATOR", "EXECUTOR", "EMPLOYER", "ADMIN", name="userrole"), nullable=False),
+        sa.Column("avatar_url", sa.String()),
+        sa.Column("bio", sa.Text()),
+        sa.Column("skills", sa.Text()),
+        sa.Column("portfolio_url", sa.String()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("is_verified", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), **CREATED_AT),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        indexes=[("ix_users_id", ["id"], False), ("ix_users_email", ["email"], True)],
+    )
+    create_table(
+        "ideas",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("tags", sa.Text()),
+        sa.Column("requirements", sa.Text()),
+        sa.Column("status", sa.Enum("UNDER_REVIEW", "IN_PROJECT", "REJECTED", name="ideastatus")),
+        sa.Column("creator_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("executor_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime(timezone=True), **CREATED_AT),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        indexes=[("ix_ideas_id", ["id"], False)],
+    )
+    create_table(
+        "projects",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("budget", sa.Float()),
+        sa.Column("deadline", sa.DateTime(timezone=True)),
+        sa.Column("requirements", sa.Text()),
+        sa.Column("status", sa.Enum("NEW", "IN_PROGRESS", "COMPLETED", "CANCELLED", name="projectstatus")),
+        sa.Column("employer_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("executor_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("idea_id", sa.Integer(), sa.ForeignKey("ideas.id")),
+        sa.Column("created_at", sa.DateTime(timezone=True), **CREATED_AT),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        indexes=[("ix_projects_id", ["id"], False)],
+    )
+    create_table(
+        "proposals",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("executor_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("proposed_price", sa.Float()),
+        sa.Column("proposed_timeline", sa.String()),
+        sa.Column("cover_letter", sa.Text()),
+        sa.Column("status", sa.Enum("PENDING", "ACCEPTED", "REJECTED", name="proposalstatus")),
+        sa.Column("created_at", sa.DateTime(timezone=True), **CREATED_AT),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        indexes=[("ix_proposals_id", ["id"], False)],
+    )
+    create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("sender_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("receiver_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("is_read", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), **CREATED_AT),
+        indexes=[("ix_messages_id", ["id"], False)],
+    )
+    create_table(
+        "ratings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("rater_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("rated_user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("rating", sa.Integer(), nullable=False),
+        sa.Column("comment", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), **CREATED_AT),
+        indexes=[("ix_ratings_id", ["id"], False)],
+    )
+    create_table(
+        "file_uploads",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("uploaded_by", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("file_url", sa.String(), nullable=False),
+        sa.Column("file_type", sa.String()),
+        sa.Column("file_size", sa.Integer()),
+        sa.Column("is_final_delivery", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), **CREATED_AT),
+        indexes=[("ix_file_uploads_id", ["id"], False)],
+    )
+
+
+def downgrade() -> None:
+    for table in ("file_uploads", "ratings", "messages", "proposals", "projects", "ideas", "users"):
+        drop_table(table)
+    if op.get_context().dialect.name == "postgresql":
+        for enum in ("proposalstatus", "projectstatus", "ideastatus", "userrole"):
+            op.execute(f"DROP TYPE IF EXISTS {enum}")
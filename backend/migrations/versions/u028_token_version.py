@@ -0,0 +1,25 @@
+"""users.token_version for revoking issued tokens
+
+Revision ID: u028_token_version
+Revises: baseline
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import add_column, drop_column
+
+# revision identifiers, used by Alembic.
+revision: str = "u028_token_version"
+down_revision: Union[str, None] = "baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    add_column("users", sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    drop_column("users", "token_version")
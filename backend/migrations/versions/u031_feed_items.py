@@ -0,0 +1,39 @@
+"""feed_items for the precomputed project feed
+
+Revision ID: u031_feed_items
+Revises: u028_token_version
+Create Date: 2026-10-19
+
+Fill it with `python feed.py --rebuild`.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import create_table, drop_table
+
+# revision identifiers, used by Alembic.
+revision: str = "u031_feed_items"
+down_revision: Union[str, None] = "u028_token_version"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_table(
+        "feed_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint("user_id", "project_id", name="uq_feed_items_user_project"),
+        indexes=[
+            ("ix_feed_items_user_score", ["user_id", "score"], False),
+            ("ix_feed_items_project_id", ["project_id"], False),
+        ],
+    )
+
+
+def downgrade() -> None:
+    drop_table("feed_items")
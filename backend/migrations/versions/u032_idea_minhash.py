@@ -0,0 +1,35 @@
+"""ideas.minhash and idea_lsh_bands for similar-idea lookup
+
+Revision ID: u032_idea_minhash
+Revises: u031_feed_items
+Create Date: 2026-10-19
+
+Fill them with `python similarity.py --backfill`.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import add_column, create_table, drop_column, drop_table
+
+# revision identifiers, used by Alembic.
+revision: str = "u032_idea_minhash"
+down_revision: Union[str, None] = "u031_feed_items"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    add_column("ideas", sa.Column("minhash", sa.LargeBinary()))
+    create_table(
+        "idea_lsh_bands",
+        sa.Column("idea_id", sa.Integer(), sa.ForeignKey("ideas.id"), primary_key=True),
+        sa.Column("band", sa.Integer(), primary_key=True),
+        sa.Column("bucket", sa.BigInteger(), nullable=False),
+        indexes=[("ix_idea_lsh_bands_band_bucket", ["band", "bucket"], False)],
+    )
+
+
+def downgrade() -> None:
+    drop_table("idea_lsh_bands")
+    drop_column("ideas", "minhash")
@@ -0,0 +1,34 @@
+"""project_events for the project timeline
+
+Revision ID: u037_project_events
+Revises: u032_idea_minhash
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import create_table, drop_table
+
+# revision identifiers, used by Alembic.
+revision: str = "u037_project_events"
+down_revision: Union[str, None] = "u032_idea_minhash"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_table(
+        "project_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("actor_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("kind", sa.String(64), nullable=False),
+        sa.Column("data", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        indexes=[("ix_project_events_project_id_id", ["project_id", "id"], False)],
+    )
+
+
+def downgrade() -> None:
+    drop_table("project_events")
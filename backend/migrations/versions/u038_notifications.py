@@ -0,0 +1,51 @@
+"""notifications and users.unread_notifications
+
+Revision ID: u038_notifications
+Revises: u037_project_events
+Create Date: 2026-10-19
+
+The counter is recomputed from unread rows, so it is right however far the
+table got before this revision ran.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+from migrations.helpers import add_column, create_table, drop_column, drop_table
+
+# revision identifiers, used by Alembic.
+revision: str = "u038_notifications"
+down_revision: Union[str, None] = "u037_project_events"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_table(
+        "notifications",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("kind", sa.String(64), nullable=False),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id")),
+        sa.Column("actor_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("data", sa.Text()),
+        sa.Column("is_read", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("emailed_at", sa.DateTime(timezone=True)),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        indexes=[
+            ("ix_notifications_user_id_id", ["user_id", "id"], False),
+            ("ix_notifications_pending_digest", ["emailed_at", "created_at"], False),
+        ],
+    )
+    if add_column("users", sa.Column("unread_notifications", sa.Integer(), nullable=False, server_default="0")):
+        op.execute(
+            "UPDATE users SET unread_notifications = ("
+            "SELECT COUNT(*) FROM notifications WHERE notifications.user_id = users.id AND NOT notifications.is_read)"
+        )
+
+
+def downgrade() -> None:
+    drop_column("users", "unread_notifications")
+    drop_table("notifications")
@@ -0,0 +1,44 @@
+"""upload_sessions for resumable uploads
+
+Revision ID: u039_upload_sessions
+Revises: u038_notifications
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import create_table, drop_table
+
+# revision identifiers, used by Alembic.
+revision: str = "u039_upload_sessions"
+down_revision: Union[str, None] = "u038_notifications"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_table(
+        "upload_sessions",
+        sa.Column("id", sa.String(32), primary_key=True),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("content_type", sa.String()),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("offset", sa.BigInteger(), nullable=False),
+        sa.Column("sha256", sa.String(64)),
+        sa.Column("is_final_delivery", sa.Boolean()),
+        sa.Column("file_id", sa.Integer(), sa.ForeignKey("file_uploads.id")),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("completed_at", sa.DateTime(timezone=True)),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        indexes=[
+            ("ix_upload_sessions_project_id", ["project_id"], False),
+            ("ix_upload_sessions_expires_at", ["expires_at"], False),
+        ],
+    )
+
+
+def downgrade() -> None:
+    drop_table("upload_sessions")
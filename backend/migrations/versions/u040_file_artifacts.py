@@ -0,0 +1,43 @@
+"""file_uploads.processing_status and file_artifacts
+
+Revision ID: u040_file_artifacts
+Revises: u039_upload_sessions
+Create Date: 2026-10-19
+
+Files uploaded before this revision keep a NULL status; process them with
+`python media.py --backfill`.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import add_column, create_table, drop_column, drop_table
+
+# revision identifiers, used by Alembic.
+revision: str = "u040_file_artifacts"
+down_revision: Union[str, None] = "u039_upload_sessions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    add_column("file_uploads", sa.Column("processing_status", sa.String(16)))
+    create_table(
+        "file_artifacts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("file_id", sa.Integer(), sa.ForeignKey("file_uploads.id"), nullable=False),
+        sa.Column("kind", sa.String(32), nullable=False),
+        sa.Column("content_type", sa.String()),
+        sa.Column("file_url", sa.String()),
+        sa.Column("width", sa.Integer()),
+        sa.Column("height", sa.Integer()),
+        sa.Column("size", sa.Integer()),
+        sa.Column("data", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        indexes=[("ix_file_artifacts_file_id", ["file_id"], False)],
+    )
+
+
+def downgrade() -> None:
+    drop_table("file_artifacts")
+    drop_column("file_uploads", "processing_status")
@@ -0,0 +1,39 @@
+"""users.storage_bytes and projects.storage_bytes for upload quotas
+
+Revision ID: u041_storage_bytes
+Revises: u040_file_artifacts
+Create Date: 2026-10-19
+
+New counters are filled from file_uploads here, the same sums as
+`python storage.py --recount`.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from migrations.helpers import add_column, drop_column
+
+# revision identifiers, used by Alembic.
+revision: str = "u041_storage_bytes"
+down_revision: Union[str, None] = "u040_file_artifacts"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if add_column("users", sa.Column("storage_bytes", sa.BigInteger(), nullable=False, server_default="0")):
+        op.execute(
+            "UPDATE users SET storage_bytes = ("
+            "SELECT COALESCE(SUM(file_size), 0) FROM file_uploads WHERE file_uploads.uploaded_by = users.id)"
+        )
+    if add_column("projects", sa.Column("storage_bytes", sa.BigInteger(), nullable=False, server_default="0")):
+        op.execute(
+            "UPDATE projects SET storage_bytes = ("
+            "SELECT COALESCE(SUM(file_size), 0) FROM file_uploads WHERE file_uploads.project_id = projects.id)"
+        )
+
+
+def downgrade() -> None:
+    drop_column("projects", "storage_bytes")
+    drop_column("users", "storage_bytes")
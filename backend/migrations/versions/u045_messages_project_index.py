@@ -0,0 +1,25 @@
+"""Index on messages (project_id, id) for paging a project's messages
+
+Revision ID: u045_messages_project_index
+Revises: u041_storage_bytes
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import create_index, drop_index
+
+# revision identifiers, used by Alembic.
+revision: str = "u045_messages_project_index"
+down_revision: Union[str, None] = "u041_storage_bytes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_index("ix_messages_project_id_id", "messages", ["project_id", "id"])
+
+
+def downgrade() -> None:
+    drop_index("ix_messages_project_id_id", "messages")
@@ -0,0 +1,50 @@
+"""daily_stats and daily_project_status for admin analytics
+
+Revision ID: u046_daily_rollups
+Revises: u045_messages_project_index
+Create Date: 2026-10-19
+
+Fill them with `python analytics.py --rollup --full --once`.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import create_table, drop_table, existing_enum
+
+# revision identifiers, used by Alembic.
+revision: str = "u046_daily_rollups"
+down_revision: Union[str, None] = "u045_messages_project_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_table(
+        "daily_stats",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("new_ideas", sa.Integer(), nullable=False),
+        sa.Column("new_projects", sa.Integer(), nullable=False),
+        sa.Column("new_proposals", sa.Integer(), nullable=False),
+        sa.Column("accepted_proposals", sa.Integer(), nullable=False),
+        sa.Column("rejected_proposals", sa.Integer(), nullable=False),
+        sa.Column("projects_with_proposals", sa.Integer(), nullable=False),
+        sa.Column("median_proposed_price", sa.Float()),
+        sa.Column("median_budget", sa.Float()),
+        sa.Column("median_price_to_budget", sa.Float()),
+        sa.Column("new_ratings", sa.Integer(), nullable=False),
+        sa.Column("rating_sum", sa.Integer(), nullable=False),
+        sa.Column("computed_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    create_table(
+        "daily_project_status",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("status", existing_enum("projectstatus", "NEW", "IN_PROGRESS", "COMPLETED", "CANCELLED"),
+                  primary_key=True),
+        sa.Column("projects", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    drop_table("daily_project_status")
+    drop_table("daily_stats")
@@ -0,0 +1,28 @@
+"""Indexes on projects.updated_at and proposals.updated_at for the rollup job
+
+Revision ID: u046_rollup_change_indexes
+Revises: u050_row_versions
+Create Date: 2026-10-19
+
+analytics.py finds the proposals and projects changed since its last round
+with a range scan on these.
+"""
+from typing import Sequence, Union
+
+from migrations.helpers import create_index, drop_index
+
+# revision identifiers, used by Alembic.
+revision: str = "u046_rollup_change_indexes"
+down_revision: Union[str, None] = "u050_row_versions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_index("ix_projects_updated_at", "projects", ["updated_at"])
+    create_index("ix_proposals_updated_at", "proposals", ["updated_at"])
+
+
+def downgrade() -> None:
+    drop_index("ix_proposals_updated_at", "proposals")
+    drop_index("ix_projects_updated_at", "projects")
@@ -0,0 +1,41 @@
+"""Precomputed ranking columns on proposals
+
+Revision ID: u047_proposal_scores
+Revises: u046_daily_rollups
+Create Date: 2026-10-19
+
+Fill them with `python proposal_ranking.py --backfill`.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import add_column, create_index, drop_column, drop_index
+
+# revision identifiers, used by Alembic.
+revision: str = "u047_proposal_scores"
+down_revision: Union[str, None] = "u046_daily_rollups"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SCORE_COLUMNS = [
+    ("price_ratio", sa.Float),
+    ("timeline_days", sa.Integer),
+    ("executor_rating", sa.Float),
+    ("price_score", sa.Float),
+    ("skill_score", sa.Float),
+    ("timeline_score", sa.Float),
+    ("score", sa.Float),
+]
+
+
+def upgrade() -> None:
+    for name, type_ in SCORE_COLUMNS:
+        add_column("proposals", sa.Column(name, type_()))
+    create_index("ix_proposals_project_id_score", "proposals", ["project_id", "score"])
+
+
+def downgrade() -> None:
+    drop_index("ix_proposals_project_id_score", "proposals")
+    for name, _ in reversed(SCORE_COLUMNS):
+        drop_column("proposals", name)
@@ -0,0 +1,39 @@
+"""idempotency_keys for replaying retried writes
+
+Revision ID: u049_idempotency_keys
+Revises: u047_proposal_scores
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import create_table, drop_table
+
+# revision identifiers, used by Alembic.
+revision: str = "u049_idempotency_keys"
+down_revision: Union[str, None] = "u047_proposal_scores"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_table(
+        "idempotency_keys",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("owner", sa.String(64), nullable=False),
+        sa.Column("key", sa.String(255), nullable=False),
+        sa.Column("fingerprint", sa.String(64), nullable=False),
+        sa.Column("status_code", sa.Integer()),
+        sa.Column("headers", sa.Text()),
+        sa.Column("body", sa.LargeBinary()),
+        sa.Column("locked_until", sa.DateTime(timezone=True)),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint("owner", "key", name="uq_idempotency_keys_owner_key"),
+        indexes=[("ix_idempotency_keys_expires_at", ["expires_at"], False)],
+    )
+
+
+def downgrade() -> None:
+    drop_table("idempotency_keys")
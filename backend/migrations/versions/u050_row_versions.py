@@ -0,0 +1,32 @@
+"""Row versions on users, ideas, projects and proposals
+
+Revision ID: u050_row_versions
+Revises: u049_idempotency_keys
+Create Date: 2026-10-19
+
+Existing rows get version 1 from the server default; the ORM increments it
+from there (see etags.py).
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import add_column, drop_column
+
+# revision identifiers, used by Alembic.
+revision: str = "u050_row_versions"
+down_revision: Union[str, None] = "u049_idempotency_keys"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("users", "ideas", "projects", "proposals")
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        add_column(table, sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        drop_column(table, "version")
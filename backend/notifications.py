@@ -0,0 +1,477 @@
+"""
+Notifications: in-app inbox, real-time push and e-mail digests.
+
+Domain events (see events.py) are turned into Notification rows for the
+people they concern, in the same transaction as the change: a new proposal
+notifies the employer, an accepted or rejected proposal the executor, a
+message its receiver and a final delivery the other party of the project.
+Each user's unread count lives in a counter column updated alongside, so
+the badge the frontend polls is a primary-key read.
+
+Once the transaction commits, every notification is pushed to the user's
+open WebSocket connections. Connections live in one worker process; with
+REDIS_URL set, pushes are fanned out over Redis pub/sub so they reach a
+connection on any worker. Redis is published to from a background thread,
+never from the committing request. If Redis fails, the thread stops trying
+for a backoff period (PUSH_BACKOFF_SECONDS, doubling up to
+PUSH_MAX_BACKOFF_SECONDS) and delivers to this worker's connections only.
+
+E-mail is never sent inline. `python notifications.py --digest` runs a
+worker that waits until a user's oldest pending notification is
+DIGEST_DELAY_SECONDS old and then mails everything still unread in one
+message, so a burst of chat messages becomes a single e-mail. Mail goes
+through SMTP when SMTP_HOST is set (MailHog in the dev compose file) and is
+only logged otherwise.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from queue import Full, Queue
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, event as sa_event, update
+from sqlalchemy.orm import Session
+
+import events
+from database import Notification, Project, User
+
+logger = logging.getLogger("masna.notifications")
+
+DIGEST_DELAY_SECONDS = int(os.getenv("NOTIFICATION_DIGEST_DELAY_SECONDS", "600"))
+DIGEST_INTERVAL_SECONDS = int(os.getenv("NOTIFICATION_DIGEST_INTERVAL_SECONDS", "60"))
+PUSH_CHANNEL = "masna:notifications"
+MAX_PAGE_SIZE = 100
+# Pushes queued for a slow socket beyond this are dropped; the inbox still has them.
+SOCKET_QUEUE_SIZE = 100
+# Pushes waiting for the Redis publisher thread; beyond this they are dropped the same way.
+PUSH_QUEUE_SIZE = int(os.getenv("NOTIFICATION_PUSH_QUEUE_SIZE", "10000"))
+PUSH_BACKOFF_SECONDS = float(os.getenv("NOTIFICATION_PUSH_BACKOFF_SECONDS", "1"))
+PUSH_MAX_BACKOFF_SECONDS = float(os.getenv("NOTIFICATION_PUSH_MAX_BACKOFF_SECONDS", "60"))
+
+SUBJECTS = {
+    "proposal.created": "New proposal on your project",
+    "proposal.accepted": "Your proposal was accepted",
+    "proposal.rejected": "Your proposal was not selected",
+    "message.sent": "New message",
+    "file.uploaded": "Final delivery uploaded",
+}
+
+
+def recipients(db: Session, name: str, data: dict) -> List[int]:
+    """Users an event should notify, never including the user who caused it."""
+    if name == "proposal.created":
+        users = [data.get("employer_id") or db.query(Project.employer_id).filter(Project.id == data["project_id"]).scalar()]
+    elif name in ("proposal.accepted", "proposal.rejected"):
+        users = [data.get("executor_id")]
+    elif name == "message.sent":
+        users = [data.get("receiver_id")]
+    elif name == "file.uploaded" and data.get("is_final_delivery"):
+        row = db.query(Project.employer_id, Project.executor_id).filter(Project.id == data["project_id"]).first()
+        users = list(row) if row else []
+    else:
+        return []
+    actor_id = data.get("actor_id")
+    return sorted({u for u in users if u is not None and u != actor_id})
+
+
+@events.subscribe("*")
+def notify(db: Session, name: str, data: dict) -> None:
+    user_ids = recipients(db, name, data)
+    if not user_ids:
+        return
+    details = {k: v for k, v in data.items() if k not in ("project_id", "actor_id")}
+    created = []
+    for user_id in user_ids:
+        notification = Notification(
+            user_id=user_id,
+            kind=name,
+            project_id=data.get("project_id"),
+            actor_id=data.get("actor_id"),
+            data=json.dumps(details, ensure_ascii=False, default=str),
+        )
+        db.add(notification)
+        created.append(notification)
+    db.execute(
+        update(User).where(User.id.in_(user_ids)).values(unread_notifications=User.unread_notifications + 1),
+        execution_options={"synchronize_session": False},
+    )
+    db.flush()
+    pending = db.info.setdefault("pending_pushes", [])
+    for notification in created:
+        pending.append((notification.user_id, {
+            "id": notification.id,
+            "kind": name,
+            "project_id": notification.project_id,
+            "actor_id": notification.actor_id,
+            "data": details,
+        }))
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _push_committed(session):
+    for user_id, payload in session.info.pop("pending_pushes", []):
+        hub.publish(user_id, payload)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("pending_pushes", None)
+
+
+class PushHub:
+    """Delivers payloads to the WebSocket connections of a user.
+
+    `publish` may be called from any thread (sync endpoints run in a thread
+    pool) and never blocks: each connection's queue is fed on the event loop
+    that owns it, and Redis is published to from the hub's own thread.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self.redis_url = redis_url
+        self._connections: Dict[int, Dict[asyncio.Queue, asyncio.AbstractEventLoop]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        self._outbox: "Queue[Tuple[int, dict]]" = Queue(maxsize=PUSH_QUEUE_SIZE)
+        self._publisher: Optional[threading.Thread] = None
+        # Circuit breaker: while open (until _retry_at), pushes skip Redis.
+        self._retry_at = 0.0
+        self._backoff = PUSH_BACKOFF_SECONDS
+
+    def connect(self, user_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SOCKET_QUEUE_SIZE)
+        with self._lock:
+            self._connections[user_id][queue] = asyncio.get_running_loop()
+        if self.redis_url and self._listener is None:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return queue
+
+    def disconnect(self, user_id: int, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._connections[user_id].pop(queue, None)
+            if not self._connections[user_id]:
+                del self._connections[user_id]
+
+    def connected(self, user_id: int) -> int:
+        with self._lock:
+            return len(self._connections.get(user_id, ()))
+
+    def publish(self, user_id: int, payload: dict) -> None:
+        if not self.redis_url:
+            self.deliver(user_id, payload)
+            return
+        with self._lock:
+            if self._publisher is None or not self._publisher.is_alive():
+                self._publisher = threading.Thread(target=self._run_publisher, name="push-publisher", daemon=True)
+                self._publisher.start()
+        try:
+            self._outbox.put_nowait((user_id, payload))
+        except Full:
+            pass
+
+    def wait_published(self) -> None:
+        """Block until every queued push has been handed to Redis or delivered locally."""
+        self._outbox.join()
+
+    def _run_publisher(self) -> None:
+        while True:
+            user_id, payload = self._outbox.get()
+            try:
+                if not self._publish_redis(user_id, payload):
+                    self.deliver(user_id, payload)
+            finally:
+                self._outbox.task_done()
+
+    def _publish_redis(self, user_id: int, payload: dict) -> bool:
+        if time.monotonic() < self._retry_at:
+            return False
+        try:
+            if self._redis is None:
+                import redis
+                self._redis = redis.Redis.from_url(self.redis_url, socket_connect_timeout=0.2, socket_timeout=0.2)
+            self._redis.publish(PUSH_CHANNEL, json.dumps({"user_id": user_id, "payload": payload}, default=str))
+        except Exception as exc:
+            if self._backoff == PUSH_BACKOFF_SECONDS:
+                logger.warning("Redis publish failed (%s); delivering to this worker only until it recovers", exc)
+            self._retry_at = time.monotonic() + self._backoff
+            self._backoff = min(self._backoff * 2, PUSH_MAX_BACKOFF_SECONDS)
+            return False
+        if self._backoff != PUSH_BACKOFF_SECONDS:
+            logger.info("Redis publish recovered")
+            self._backoff = PUSH_BACKOFF_SECONDS
+        return True
+
+    def deliver(self, user_id: int, payload: dict) -> None:
+        with self._lock:
+            targets = list(self._connections.get(user_id, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, payload)
+            except RuntimeError:
+                # The loop already closed; its connection is going away.
+                pass
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, payload: dict) -> None:
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            pass
+
+    async def _listen(self) -> None:
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.redis_url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(PUSH_CHANNEL)
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                item = json.loads(message["data"])
+                self.deliver(int(item["user_id"]), item["payload"])
+        finally:
+            self._listener = None
+            await pubsub.close()
+            await client.close()
+
+
+hub = PushHub(os.getenv("REDIS_URL"))
+
+
+async def serve_socket(websocket, user_id: int) -> None:
+    """Accept a WebSocket and forward the user's pushes to it until the client goes away."""
+    from starlette.websockets import WebSocketDisconnect
+
+    # Registered before accepting, so nothing committed after the handshake is missed.
+    queue = hub.connect(user_id)
+    try:
+        await websocket.accept()
+    except Exception:
+        hub.disconnect(user_id, queue)
+        raise
+    # The client sends nothing we need, but reading is how a disconnect is noticed.
+    receiving = asyncio.ensure_future(websocket.receive_text())
+    try:
+        while True:
+            getting = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({receiving, getting}, return_when=asyncio.FIRST_COMPLETED)
+            if receiving in done:
+                getting.cancel()
+                receiving.result()
+                receiving = asyncio.ensure_future(websocket.receive_text())
+                continue
+            await websocket.send_json(getting.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiving.cancel()
+        hub.disconnect(user_id, queue)
+
+
+def list_notifications(db: Session, user_id: int, before: Optional[int] = None, limit: int = 50,
+                       unread_only: bool = False) -> Tuple[List[dict], Optional[int]]:
+    """One page of a user's notifications, newest first, and the cursor of the next page."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(Notification).filter(Notification.user_id == user_id)
+    if before is not None:
+        query = query.filter(Notification.id < before)
+    if unread_only:
+        query = query.filter(Notification.is_read.is_(False))
+    rows = query.order_by(Notification.id.desc()).limit(limit + 1).all()
+    items = [
+        {
+            "id": n.id,
+            "kind": n.kind,
+            "project_id": n.project_id,
+            "actor_id": n.actor_id,
+            "data": json.loads(n.data) if n.data else {},
+            "is_read": n.is_read,
+            "created_at": n.created_at,
+        }
+        for n in rows[:limit]
+    ]
+    next_before = items[-1]["id"] if len(rows) > limit else None
+    return items, next_before
+
+
+def unread_count(db: Session, user_id: int) -> int:
+    return db.query(User.unread_notifications).filter(User.id == user_id).scalar() or 0
+
+
+def mark_read(db: Session, user_id: int, notification_ids: Optional[List[int]] = None) -> int:
+    """Mark some (or all) of a user's notifications read and adjust the counter; commits."""
+    stmt = update(Notification).where(Notification.user_id == user_id, Notification.is_read.is_(False))
+    if notification_ids is not None:
+        stmt = stmt.where(Notification.id.in_(notification_ids))
+    changed = db.execute(stmt.values(is_read=True), execution_options={"synchronize_session": False}).rowcount
+    if changed:
+        if notification_ids is None:
+            counter = 0
+        else:
+            # Clamped at zero so a counter that drifted never goes negative.
+            counter = case((User.unread_notifications > changed, User.unread_notifications - changed), else_=0)
+        db.execute(
+            update(User).where(User.id == user_id).values(unread_notifications=counter),
+            execution_options={"synchronize_session": False},
+        )
+    db.commit()
+    return changed
+
+
+class MemoryMailer:
+    """Keeps sent mail in `outbox` and logs it; the default without SMTP_HOST."""
+
+    def __init__(self):
+        self.outbox: List[EmailMessage] = []
+
+    def send(self, message: EmailMessage) -> None:
+        self.outbox.append(message)
+        logger.info("Mail to %s: %s", message["To"], message["Subject"])
+
+
+class SMTPMailer:
+    def __init__(self, host: str, port: int = 25, username: Optional[str] = None,
+                 password: Optional[str] = None, use_tls: bool = False, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def send(self, message: EmailMessage) -> None:
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(message)
+
+
+def get_mailer():
+    host = os.getenv("SMTP_HOST")
+    if not host:
+        return MemoryMailer()
+    return SMTPMailer(
+        host,
+        int(os.getenv("SMTP_PORT", "25")),
+        username=os.getenv("SMTP_USERNAME") or None,
+        password=os.getenv("SMTP_PASSWORD") or None,
+        use_tls=os.getenv("SMTP_STARTTLS", "false").lower() == "true",
+    )
+
+
+def describe(notification: Notification) -> str:
+    data = json.loads(notification.data) if notification.data else {}
+    line = SUBJECTS.get(notification.kind, notification.kind)
+    if notification.kind == "message.sent" and data.get("preview"):
+        line += f": {data['preview']}"
+    elif notification.kind == "file.uploaded" and data.get("filename"):
+        line += f": {data['filename']}"
+    if notification.project_id:
+        line += f" (project #{notification.project_id})"
+    return line
+
+
+def digest_message(user: User, pending: List[Notification]) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = os.getenv("MAIL_FROM", "Masna <no-reply@masna.local>")
+    message["To"] = user.email
+    if len(pending) == 1:
+        message["Subject"] = SUBJECTS.get(pending[0].kind, "New notification")
+    else:
+        message["Subject"] = f"{len(pending)} new notifications"
+    lines = [f"Hello {user.full_name or user.email},", ""]
+    lines += [f"- {describe(n)}" for n in pending]
+    message.set_content("\n".join(lines) + "\n")
+    return message
+
+
+def send_digests(db: Session, mailer, now: Optional[datetime] = None) -> int:
+    """Mail every user whose oldest pending notification waited DIGEST_DELAY_SECONDS; returns mails sent."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=DIGEST_DELAY_SECONDS)
+    due = [
+        r[0]
+        for r in db.query(Notification.user_id)
+        .filter(
+            Notification.emailed_at.is_(None),
+            Notification.is_read.is_(False),
+            Notification.created_at <= cutoff,
+        )
+        .distinct()
+    ]
+    sent = 0
+    for user_id in due:
+        user = db.query(User).filter(User.id == user_id).first()
+        pending = (
+            db.query(Notification)
+            .filter(
+                Notification.user_id == user_id,
+                Notification.emailed_at.is_(None),
+                Notification.is_read.is_(False),
+            )
+            .order_by(Notification.id)
+            .all()
+        )
+        if user is None or not pending:
+            continue
+        if user.is_active:
+            try:
+                mailer.send(digest_message(user, pending))
+            except Exception:
+                logger.exception("Digest for user %s failed; retrying next round", user_id)
+                db.rollback()
+                continue
+            sent += 1
+        db.execute(
+            update(Notification)
+            .where(Notification.id.in_([n.id for n in pending]))
+            .values(emailed_at=now),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notification digest worker")
+    parser.add_argument("--digest", action="store_true", help="Send coalesced e-mail digests")
+    parser.add_argument("--once", action="store_true", help="Run one round and exit instead of looping")
+    parser.add_argument("--interval", type=int, default=DIGEST_INTERVAL_SECONDS, help="Seconds between rounds")
+    args = parser.parse_args()
+
+    if not args.digest:
+        parser.print_help()
+        return
+
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    mailer = get_mailer()
+    while True:
+        session = SessionLocal()
+        try:
+            sent = send_digests(session, mailer)
+            if sent:
+                logger.info("Sent %d digests", sent)
+        except Exception:
+            logger.exception("Digest round failed")
+        finally:
+            session.close()
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
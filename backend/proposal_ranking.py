@@ -0,0 +1,261 @@
+"""
+Precomputed proposal scores for the employer's comparison view.
+
+Each proposal stores its ranking inputs and scores. All scores are in
+[0, 1], and 0.5 means "unknown".
+  - price_score: how the price compares with the project budget. Full
+    marks at or under budget, falling to 0 at twice the budget.
+  - executor_rating: the executor's Bayesian rating average, with the
+    same prior as recommendations.py.
+  - skill_score: the share of the executor's skills (up to SKILL_TARGET)
+    that the project's title, description or requirements mention.
+  - timeline_score: the proposed timeline against the project's window,
+    from its creation to its deadline. The window never changes, so a
+    score stored earlier compares fairly with one stored later. Without
+    a deadline, shorter is better.
+`score` is their weighted sum, indexed with project_id, so a project's
+proposals come out ranked by one index range scan.
+
+Scores are written in the same transaction as the change they depend on:
+  - a new proposal ("proposal.created")
+  - a new rating for its executor ("rating.created")
+  - an edit of its price or timeline (`score_proposal`)
+  - a change to the executor's skills (`rescore_executor`)
+`python proposal_ranking.py --backfill` scores proposals made before this
+existed.
+
+The scores are derived data, so they are written with a Core UPDATE that
+leaves the row `version` alone (see etags.py). Rescoring after a rating or
+a skills edit therefore never turns the employer's If-Match stale.
+"""
+import argparse
+import json
+import re
+from typing import List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+import events
+from database import Project, Proposal, ProposalStatus, Rating, User
+from recommendations import RATING_PRIOR_COUNT, RATING_PRIOR_MEAN, tokenize
+from storage import naive_utc
+
+WEIGHTS = {"price": 0.35, "rating": 0.25, "skills": 0.25, "timeline": 0.15}
+SKILL_TARGET = 3
+NEUTRAL = 0.5
+
+SORTS = {
+    "score": lambda: [Proposal.score.is_(None), Proposal.score.desc()],
+    "price": lambda: [Proposal.price_ratio.is_(None), Proposal.price_ratio],
+    "rating": lambda: [Proposal.executor_rating.is_(None), Proposal.executor_rating.desc()],
+    "skills": lambda: [Proposal.skill_score.is_(None), Proposal.skill_score.desc()],
+    "timeline": lambda: [Proposal.timeline_days.is_(None), Proposal.timeline_days],
+}
+
+PERSIAN_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+TIMELINE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(day|روز|week|wk|هفته|month|mo|ماه|year|سال)?", re.IGNORECASE)
+UNIT_DAYS = {"day": 1, "روز": 1, "week": 7, "wk": 7, "هفته": 7, "month": 30, "mo": 30, "ماه": 30, "year": 365, "سال": 365}
+
+
+def parse_timeline_days(text: Optional[str]) -> Optional[int]:
+    """Days in a free-text timeline such as "3 weeks", "10 days" or "۲ ماه"; None if there is no number."""
+    if not text:
+        return None
+    match = TIMELINE_RE.search(text.translate(PERSIAN_DIGITS).lower())
+    if not match:
+        return None
+    unit = match.group(2) or "day"
+    return max(1, round(float(match.group(1)) * UNIT_DAYS[unit]))
+
+
+def price_score(price_ratio: Optional[float]) -> float:
+    if price_ratio is None:
+        return NEUTRAL
+    return max(0.0, min(1.0, 2.0 - price_ratio))
+
+
+def bayesian_rating(total: float, count: int) -> float:
+    return (RATING_PRIOR_MEAN * RATING_PRIOR_COUNT + total) / (RATING_PRIOR_COUNT + count)
+
+
+def skill_score(skills: Optional[str], project: Project) -> float:
+    try:
+        skills = json.loads(skills) if skills else []
+    except (json.JSONDecodeError, TypeError):
+        skills = []
+    if not skills:
+        return 0.0
+    project_terms = set(tokenize(" ".join(filter(None, [project.title, project.description, project.requirements]))))
+    matched = 0
+    for skill in skills:
+        terms = tokenize(skill)
+        if terms and all(t in project_terms for t in terms):
+            matched += 1
+    return min(1.0, matched / min(len(skills), SKILL_TARGET))
+
+
+def timeline_score(days: Optional[int], project: Project) -> float:
+    if days is None:
+        return NEUTRAL
+    if project.deadline is not None and project.created_at is not None:
+        available = (naive_utc(project.deadline) - naive_utc(project.created_at)).total_seconds() / 86400
+        if available <= 0:
+            return NEUTRAL
+        return min(1.0, available / days)
+    return 30.0 / (30.0 + days)
+
+
+def compute_scores(proposal: Proposal, project: Project, skills: Optional[str],
+                   rating_total: float, rating_count: int) -> dict:
+    """A proposal's ranking columns from its project, executor skills and rating aggregate."""
+    if proposal.proposed_price is not None and project.budget:
+        price_ratio = proposal.proposed_price / project.budget
+    else:
+        price_ratio = None
+    timeline_days = parse_timeline_days(proposal.proposed_timeline)
+    scores = {
+        "price_ratio": price_ratio,
+        "timeline_days": timeline_days,
+        "executor_rating": bayesian_rating(rating_total, rating_count),
+        "price_score": price_score(price_ratio),
+        "skill_score": skill_score(skills, project),
+        "timeline_score": timeline_score(timeline_days, project),
+    }
+    scores["score"] = (
+        WEIGHTS["price"] * scores["price_score"]
+        + WEIGHTS["rating"] * scores["executor_rating"] / 5.0
+        + WEIGHTS["skills"] * scores["skill_score"]
+        + WEIGHTS["timeline"] * scores["timeline_score"]
+    )
+    return scores
+
+
+def apply_scores(db: Session, proposal: Proposal, project: Project, skills: Optional[str],
+                 rating_total: float, rating_count: int) -> None:
+    """Write a proposal's ranking columns without bumping its version."""
+    scores = compute_scores(proposal, project, skills, rating_total, rating_count)
+    db.execute(
+        update(Proposal).where(Proposal.id == proposal.id).values(**scores),
+        execution_options={"synchronize_session": False},
+    )
+    # Keep the loaded object current without marking it dirty
+    for key, value in scores.items():
+        set_committed_value(proposal, key, value)
+
+
+def _rating_aggregate(db: Session, user_id: int):
+    from sqlalchemy import func
+
+    total, count = db.query(func.coalesce(func.sum(Rating.rating), 0), func.count(Rating.id)).filter(
+        Rating.rated_user_id == user_id).one()
+    return float(total), count
+
+
+def score_proposal(db: Session, proposal: Proposal, project: Optional[Project] = None) -> None:
+    project = project or db.get(Project, proposal.project_id)
+    skills = db.query(User.skills).filter(User.id == proposal.executor_id).scalar()
+    apply_scores(db, proposal, project, skills, *_rating_aggregate(db, proposal.executor_id))
+
+
+def rescore_executor(db: Session, user_id: int) -> int:
+    """Recompute the scores of an executor's pending proposals; returns how many changed."""
+    rows = (
+        db.query(Proposal, Project)
+        .join(Project, Project.id == Proposal.project_id)
+        .filter(Proposal.executor_id == user_id, Proposal.status == ProposalStatus.PENDING)
+        .all()
+    )
+    if not rows:
+        return 0
+    skills = db.query(User.skills).filter(User.id == user_id).scalar()
+    total, count = _rating_aggregate(db, user_id)
+    for proposal, project in rows:
+        apply_scores(db, proposal, project, skills, total, count)
+    return len(rows)
+
+
+@events.subscribe("proposal.created")
+def on_proposal_created(db: Session, name: str, data: dict) -> None:
+    proposal = db.get(Proposal, data["proposal_id"])
+    if proposal is not None:
+        score_proposal(db, proposal)
+
+
+@events.subscribe("rating.created")
+def on_rating_created(db: Session, name: str, data: dict) -> None:
+    rescore_executor(db, data["rated_user_id"])
+
+
+def compare(db: Session, project_id: int, sort: str = "score", status: Optional[ProposalStatus] = None,
+            max_price_ratio: Optional[float] = None, min_rating: Optional[float] = None,
+            min_skill_score: Optional[float] = None, max_timeline_days: Optional[int] = None,
+            limit: int = 50, offset: int = 0) -> List[dict]:
+    """Compact, ranked comparison rows for a project's proposals, in one query."""
+    query = (
+        db.query(
+            Proposal.id, Proposal.executor_id, User.full_name, User.avatar_url, Proposal.status,
+            Proposal.proposed_price, Proposal.price_ratio, Proposal.proposed_timeline, Proposal.timeline_days,
+            Proposal.executor_rating, Proposal.price_score, Proposal.skill_score, Proposal.timeline_score,
+            Proposal.score, Proposal.created_at,
+        )
+        .join(User, User.id == Proposal.executor_id)
+        .filter(Proposal.project_id == project_id)
+    )
+    if status is not None:
+        query = query.filter(Proposal.status == status)
+    if max_price_ratio is not None:
+        query = query.filter(Proposal.price_ratio <= max_price_ratio)
+    if min_rating is not None:
+        query = query.filter(Proposal.executor_rating >= min_rating)
+    if min_skill_score is not None:
+        query = query.filter(Proposal.skill_score >= min_skill_score)
+    if max_timeline_days is not None:
+        query = query.filter(Proposal.timeline_days <= max_timeline_days)
+    rows = query.order_by(*SORTS[sort](), Proposal.id).offset(offset).limit(limit).all()
+    return [row._asdict() for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain precomputed proposal scores")
+    parser.add_argument("--backfill", action="store_true", help="Score proposals that have no score yet")
+    parser.add_argument("--all", action="store_true", help="With --backfill, rescore every proposal")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if not args.backfill:
+        parser.print_help()
+        return
+
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        query = db.query(Proposal.executor_id).distinct()
+        if not args.all:
+            query = query.filter(Proposal.score.is_(None))
+        executor_ids = [r[0] for r in query]
+        done = 0
+        for i, user_id in enumerate(executor_ids, 1):
+            rows = (
+                db.query(Proposal, Project).join(Project, Project.id == Proposal.project_id)
+                .filter(Proposal.executor_id == user_id)
+            )
+            if not args.all:
+                rows = rows.filter(Proposal.score.is_(None))
+            skills = db.query(User.skills).filter(User.id == user_id).scalar()
+            total, count = _rating_aggregate(db, user_id)
+            for proposal, project in rows.all():
+                apply_scores(db, proposal, project, skills, total, count)
+                done += 1
+            if i % args.batch_size == 0:
+                db.commit()
+        db.commit()
+        print(f"Scored {done} proposals of {len(executor_ids)} executors")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Query plan regression guard for the hot read endpoints.
+
+Seeds a small deterministic dataset (see datagen.py), calls each endpoint
+once through the in-process app and records every SQL statement it issues.
+Each statement is then explained against the same database: `EXPLAIN QUERY
+PLAN` on SQLite, `EXPLAIN (FORMAT JSON)` on PostgreSQL. Nothing is
+executed a second time.
+
+The query counts and plans are compared with a checked-in snapshot
+(query_plans.json, one section per database dialect). A check fails when an
+endpoint issues more queries than before or gains a full scan of one of the
+LARGE_TABLES. Other plan changes are printed but do not fail.
+After an intentional change, refresh the snapshot with --update.
+
+Examples:
+    python query_plans.py --database-url sqlite:///./plans.db --check query_plans.json
+    python query_plans.py --database-url sqlite:///./plans.db --update query_plans.json
+    python query_plans.py --database-url postgresql://localhost/masna_plans --check query_plans.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Tables that are big in production; a full scan of one of these on a
+# request path is a regression even if the seeded copy is small.
+LARGE_TABLES = {
+    "users", "ideas", "projects", "proposals", "messages", "ratings",
+    "file_uploads", "file_artifacts", "project_events", "notifications", "feed_items",
+}
+
+SEED_SCALE = {
+    "users": 200, "ideas": 400, "projects": 600, "proposals": 2000,
+    "messages": 2000, "ratings": 200, "files": 300,
+}
+
+
+class Statement:
+    def __init__(self, sql: str, parameters):
+        self.sql = sql
+        self.parameters = parameters
+
+
+@contextmanager
+def capture_sql():
+    """Collect every statement executed on any engine while the block runs."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    statements: List[Statement] = []
+    lock = threading.Lock()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        with lock:
+            statements.append(Statement(statement, None if executemany else parameters))
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+
+
+def _sqlite_plan(cursor, statement: Statement) -> List[str]:
+    cursor.execute("EXPLAIN QUERY PLAN " + statement.sql, statement.parameters or ())
+    rows = cursor.fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def _postgres_plan(cursor, statement: Statement) -> List[str]:
+    cursor.execute("EXPLAIN (FORMAT JSON) " + statement.sql, statement.parameters or None)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    lines = []
+
+    def walk(node, level):
+        line = node["Node Type"]
+        if node.get("Index Name"):
+            line += f" using {node['Index Name']}"
+        if node.get("Relation Name"):
+            line += f" on {node['Relation Name']}"
+        lines.append("  " * level + line)
+        for child in node.get("Plans", []):
+            walk(child, level + 1)
+
+    walk(plan[0]["Plan"], 0)
+    return lines
+
+
+def explain(engine, statement: Statement) -> Optional[List[str]]:
+    """The plan of one captured statement as indented lines, or None if it is not explainable."""
+    verb = statement.sql.lstrip().split(None, 1)[0].upper()
+    if verb not in ("SELECT", "WITH", "UPDATE", "DELETE") or statement.parameters is None:
+        return None
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if engine.dialect.name == "sqlite":
+            return _sqlite_plan(cursor, statement)
+        if engine.dialect.name == "postgresql":
+            return _postgres_plan(cursor, statement)
+        return None
+    finally:
+        raw.rollback()
+        raw.close()
+
+
+SQLITE_SCAN = re.compile(r"^\s*SCAN (?:TABLE )?(\w+)(?: AS \w+)?\s*$")
+POSTGRES_SCAN = re.compile(r"^\s*Seq Scan on (\w+)")
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Tables read in full (no index) anywhere in a plan."""
+    tables = []
+    for line in plan:
+        match = SQLITE_SCAN.match(line) or POSTGRES_SCAN.match(line)
+        if match:
+            tables.append(match.group(1))
+    return tables
+
+
+def profile_endpoint(client, engine, call: dict) -> dict:
+    with capture_sql() as statements:
+        response = client.request(**call)
+    # N+1 patterns repeat one statement many times; explain each distinct one once.
+    plans: Dict[str, dict] = {}
+    for statement in statements:
+        sql = " ".join(statement.sql.split())
+        if sql in plans:
+            plans[sql]["count"] += 1
+            continue
+        plan = explain(engine, statement)
+        if plan is not None:
+            plans[sql] = {"sql": sql, "plan": plan, "count": 1}
+    plans = list(plans.values())
+    scans = sorted({t for p in plans for t in full_scans(p["plan"])})
+    return {"status": response.status_code, "queries": len(statements), "full_scans": scans, "plans": plans}
+
+
+def compare(results: Dict[str, dict], snapshot: Dict[str, dict], large_tables=LARGE_TABLES):
+    """Split differences from the snapshot into (failures, notes)."""
+    failures, notes = [], []
+    for name, current in results.items():
+        base = snapshot.get(name)
+        if base is None:
+            notes.append(f"{name}: not in snapshot")
+            continue
+        if current["queries"] > base["queries"]:
+            failures.append(f"{name}: {base['queries']} -> {current['queries']} queries")
+        elif current["queries"] < base["queries"]:
+            notes.append(f"{name}: {base['queries']} -> {current['queries']} queries")
+        new_scans = set(current["full_scans"]) - set(base["full_scans"])
+        for table in sorted(new_scans & set(large_tables)):
+            failures.append(f"{name}: new full scan of {table}")
+        if [p["plan"] for p in current["plans"]] != [p["plan"] for p in base["plans"]]:
+            notes.append(f"{name}: plan changed")
+    return failures, notes
+
+
+def build_calls(data, tokens: Dict[int, str], seed: int) -> Dict[str, dict]:
+    """One deterministic request per hot read endpoint."""
+    from benchmark import build_scenarios
+
+    rng = random.Random(seed)
+    calls = {}
+    for scenario in build_scenarios(data, tokens):
+        call = scenario.build(rng)
+        if call["method"] == "GET":
+            calls[scenario.name] = call
+
+    owned = sorted(pid for pid in data.project_ids if data.project_members[pid][0] in tokens)
+    if owned:
+        pid = owned[0]
+        headers = {"Authorization": f"Bearer {tokens[data.project_members[pid][0]]}"}
+        calls["GET /projects/{id}/proposals/compare"] = {
+            "method": "GET", "url": f"/projects/{pid}/proposals/compare", "headers": headers}
+        calls["GET /projects/{id}/bundle"] = {"method": "GET", "url": f"/projects/{pid}/bundle", "headers": headers}
+        calls["GET /projects/{id}/files"] = {"method": "GET", "url": f"/projects/{pid}/files", "headers": headers}
+        calls["GET /projects/{id}/timeline"] = {"method": "GET", "url": f"/projects/{pid}/timeline", "headers": headers}
+        calls["GET /projects/{id}/storage"] = {"method": "GET", "url": f"/projects/{pid}/storage", "headers": headers}
+        calls["GET /notifications"] = {"method": "GET", "url": "/notifications", "headers": headers}
+        calls["GET /notifications/unread-count"] = {
+            "method": "GET", "url": "/notifications/unread-count", "headers": headers}
+    executors = sorted(uid for uid in tokens if data.roles[uid] == "executor")
+    if executors:
+        calls["GET /proposals/me"] = {
+            "method": "GET", "url": "/proposals/me", "headers": {"Authorization": f"Bearer {tokens[executors[0]]}"}}
+    return calls
+
+
+def print_report(results: Dict[str, dict]) -> None:
+    for name, r in results.items():
+        scans = ", ".join(r["full_scans"]) or "-"
+        print(f"{name:<36} {r['status']:>4} {r['queries']:>3} queries  full scans: {scans}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check endpoint query plans and counts against a snapshot")
+    parser.add_argument("--database-url", default=None,
+                        help="Disposable database to seed and explain against; required unless --no-seed")
+    parser.add_argument("--no-seed", action="store_true", help="Use the data already in the database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--check", default=None, help="Compare with this snapshot and exit non-zero on regression")
+    parser.add_argument("--update", default=None, help="Write this dialect's section of the snapshot")
+    parser.add_argument("--verbose", action="store_true", help="Print every statement and its plan")
+    args = parser.parse_args()
+    if not args.no_seed and not args.database_url:
+        # Seeding drops every table, so it never falls back to the app's DATABASE_URL.
+        parser.error("seeding drops all tables: pass --database-url for a disposable database, or --no-seed")
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    # Imported after DATABASE_URL is set; database.py reads it at import time.
+    import database
+    from auth import create_access_token
+    from benchmark import load_dataset
+    from datagen import generate
+
+    engine = database.get_engine()
+    if not args.no_seed:
+        database.Base.metadata.drop_all(bind=engine)
+        database.Base.metadata.create_all(bind=engine)
+        generate(engine, SEED_SCALE, seed=args.seed, log=lambda line: None)
+
+    session = database.SessionLocal()
+    try:
+        data = load_dataset(session)
+    finally:
+        session.close()
+    if not data.user_ids:
+        print("Database is empty; run without --no-seed.")
+        sys.exit(1)
+
+    from fastapi.testclient import TestClient
+    from main import app
+
+    rng = random.Random(args.seed)
+    sample = set(rng.sample(sorted(data.user_ids), min(len(data.user_ids), 50)))
+    sample |= {members[0] for members in data.project_members.values()}
+    tokens = {uid: create_access_token({"sub": data.emails[uid]}) for uid in sorted(sample)}
+
+    client = TestClient(app, raise_server_exceptions=False)
+    results = {name: profile_endpoint(client, engine, call) for name, call in build_calls(data, tokens, args.seed).items()}
+    print_report(results)
+    if args.verbose:
+        for name, r in results.items():
+            print(f"\n== {name}")
+            for p in r["plans"]:
+                print(p["sql"])
+                print("\n".join("    " + line for line in p["plan"]))
+
+    dialect = engine.dialect.name
+    if args.update:
+        snapshot = {}
+        if os.path.exists(args.update):
+            with open(args.update) as f:
+                snapshot = json.load(f)
+        snapshot[dialect] = results
+        with open(args.update, "w") as f:
+            json.dump(snapshot, f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write("\n")
+        print(f"Saved {dialect} snapshot to {args.update}")
+
+    if args.check:
+        with open(args.check) as f:
+            snapshot = json.load(f).get(dialect)
+        if snapshot is None:
+            print(f"No {dialect} section in {args.check}; run with --update first.")
+            sys.exit(1)
+        failures, notes = compare(results, snapshot)
+        for line in notes:
+            print(f"note: {line}")
+        if failures:
+            print("Query plan regressions:")
+            for line in failures:
+                print(f" - {line}")
+            sys.exit(1)
+        print("No query plan regressions.")
+
+
+if __name__ == "__main__":
+    main()
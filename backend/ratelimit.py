@@ -0,0 +1,239 @@
+"""
+Rate limiting and admission control.
+
+RateLimitMiddleware applies token-bucket limits per route, keyed by the
+caller's user id (from the bearer token) or client IP, and sends the
+RateLimit-Limit/RateLimit-Remaining/RateLimit-Reset headers plus Retry-After
+on 429. Buckets live in-process or in Redis so every worker shares them.
+
+Expensive routes additionally get a concurrency cap: when all slots are busy
+the request is rejected with 503 right away instead of queueing behind the
+others.
+
+Rules come from RATE_LIMIT_RULES (a JSON list of RateLimitRule fields) or the
+defaults below; set RATE_LIMIT_ENABLED=false to switch everything off.
+"""
+import json
+import math
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+
+class RateLimitRule:
+    """A token bucket of `burst` requests refilled at `per_minute` requests per minute."""
+
+    def __init__(self, name: str, path: str, per_minute: float, burst: int,
+                 methods: Optional[List[str]] = None, key: str = "user",
+                 query_param: Optional[str] = None):
+        self.name = name
+        self.path = re.compile(path)
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.methods = {m.upper() for m in methods} if methods else None
+        self.key = key  # "user" (falls back to IP when anonymous) or "ip"
+        self.query_param = query_param  # only limit requests carrying this parameter
+
+    def matches(self, method: str, path: str, query: Dict[str, str]) -> bool:
+        if self.methods and method not in self.methods:
+            return False
+        if self.query_param and not query.get(self.query_param):
+            return False
+        return bool(self.path.match(path))
+
+
+class ConcurrencyLimit:
+    """At most `max_in_flight` concurrent requests on the matching routes."""
+
+    def __init__(self, name: str, path: str, max_in_flight: int,
+                 methods: Optional[List[str]] = None, query_param: Optional[str] = None):
+        self.name = name
+        self.path = re.compile(path)
+        self.max_in_flight = max_in_flight
+        self.methods = {m.upper() for m in methods} if methods else None
+        self.query_param = query_param
+        self.in_flight = 0
+
+    matches = RateLimitRule.matches
+
+
+DEFAULT_RULES = [
+    # bcrypt makes every login attempt expensive; also blunts password guessing.
+    RateLimitRule("login", r"^/auth/login$", per_minute=20, burst=10, methods=["POST"], key="ip"),
+    RateLimitRule("register", r"^/auth/register$", per_minute=10, burst=5, methods=["POST"], key="ip"),
+    RateLimitRule("search", r"^/(ideas|projects)$", per_minute=60, burst=20, methods=["GET"], query_param="search"),
+    RateLimitRule("upload", r"^/projects/\d+/files$", per_minute=30, burst=10, methods=["POST"]),
+    RateLimitRule("default", r"^/", per_minute=600, burst=120),
+]
+
+DEFAULT_CONCURRENCY_LIMITS = [
+    ConcurrencyLimit("login", r"^/auth/(login|register)$", max_in_flight=8, methods=["POST"]),
+    ConcurrencyLimit("search", r"^/(ideas|projects)$", max_in_flight=16, methods=["GET"], query_param="search"),
+    ConcurrencyLimit("upload", r"^/projects/\d+/files$", max_in_flight=8, methods=["POST"]),
+]
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict; only correct for a single worker process."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - last) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        if len(self._buckets) >= self.max_keys and key not in self._buckets:
+            self._buckets.clear()
+        self._buckets[key] = (tokens, now)
+        return allowed, tokens
+
+
+class RedisBucketStore:
+    """Token buckets in Redis, updated atomically by a Lua script."""
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or burst
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, redis_url: str):
+        import redis.asyncio as redis
+        self._redis = redis.Redis.from_url(redis_url, socket_connect_timeout=0.2, socket_timeout=0.2)
+        self._script = self._redis.register_script(self.SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        allowed, tokens = await self._script(keys=[f"ratelimit:{key}"], args=[rate, burst])
+        return bool(allowed), float(tokens)
+
+
+def load_rules() -> List[RateLimitRule]:
+    raw = os.getenv("RATE_LIMIT_RULES")
+    if not raw:
+        return DEFAULT_RULES
+    return [RateLimitRule(**rule) for rule in json.loads(raw)]
+
+
+def create_store():
+    if os.getenv("RATE_LIMIT_STORAGE", "memory") == "redis" and os.getenv("REDIS_URL"):
+        return RedisBucketStore(os.getenv("REDIS_URL"))
+    return MemoryBucketStore()
+
+
+def client_ip(scope) -> str:
+    if os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true":
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def caller_key(scope) -> Optional[str]:
+    """User id from the bearer token, without touching the database."""
+    from auth import verify_token
+
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                data = verify_token(token, ValueError())
+            except ValueError:
+                return None
+            return f"user:{data.user_id or data.email}"
+    return None
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, rules: Optional[List[RateLimitRule]] = None,
+                 concurrency_limits: Optional[List[ConcurrencyLimit]] = None, store=None,
+                 enabled: Optional[bool] = None):
+        self.app = app
+        self.rules = load_rules() if rules is None else rules
+        self.concurrency_limits = DEFAULT_CONCURRENCY_LIMITS if concurrency_limits is None else concurrency_limits
+        self.store = store or create_store()
+        if enabled is None:
+            enabled = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        query = dict(
+            part.split("=", 1) if "=" in part else (part, "")
+            for part in scope.get("query_string", b"").decode("latin-1").split("&") if part
+        )
+
+        headers = []
+        rule = next((r for r in self.rules if r.matches(method, path, query)), None)
+        if rule is not None:
+            who = caller_key(scope) if rule.key == "user" else None
+            key = f"{rule.name}:{who or 'ip:' + client_ip(scope)}"
+            try:
+                allowed, tokens = await self.store.take(key, rule.rate, rule.burst)
+            except Exception:
+                # A broken limiter store must not take the API down with it.
+                allowed, tokens = True, float(rule.burst)
+            headers = [
+                (b"ratelimit-limit", str(rule.burst).encode()),
+                (b"ratelimit-remaining", str(int(tokens)).encode()),
+                (b"ratelimit-reset", str(math.ceil((rule.burst - tokens) / rule.rate)).encode()),
+            ]
+            if not allowed:
+                retry_after = str(math.ceil((1 - tokens) / rule.rate))
+                response = JSONResponse(
+                    {"detail": "Too many requests"},
+                    status_code=429,
+                    headers={k.decode(): v.decode() for k, v in headers} | {"Retry-After": retry_after},
+                )
+                await response(scope, receive, send)
+                return
+
+        limit = next((c for c in self.concurrency_limits if c.matches(method, path, query)), None)
+        if limit is not None and limit.in_flight >= limit.max_in_flight:
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and headers:
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        if limit is not None:
+            limit.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            if limit is not None:
+                limit.in_flight -= 1
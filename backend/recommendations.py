@@ -0,0 +1,250 @@
+"""
+Executor recommendations for projects.
+
+Every active executor is indexed as a TF-IDF document built from their
+skills, bio and the projects they have been accepted on. Terms are hashed
+into a fixed number of features, so the index is a dense NumPy matrix of
+(log-scaled) term frequencies plus a document-frequency vector. Ranking a
+project only touches the matrix columns of the project's own terms, which
+keeps a query over thousands of executors in the millisecond range.
+
+NumPy is only imported when the first index is built, so importing this
+module (and the app) stays cheap. The index is built lazily on first use, updated incrementally when an
+executor's profile, accepted work or ratings change, and rebuilt from the
+database every RECOMMENDER_REBUILD_SECONDS to pick up changes made by other
+worker processes.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import User, Project, Proposal, Rating, UserRole, ProposalStatus
+
+FEATURES = int(os.getenv("RECOMMENDER_FEATURES", "4096"))
+REBUILD_SECONDS = int(os.getenv("RECOMMENDER_REBUILD_SECONDS", "600"))
+
+# Skills are the most deliberate signal an executor gives, so they count extra.
+SKILL_WEIGHT = 3
+# Bayesian rating prior: executors with few ratings are pulled towards this mean.
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_COUNT = 5
+
+np = None
+
+
+def _numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Arabic code points commonly typed in place of their Persian equivalents.
+PERSIAN_NORMALIZATION = str.maketrans({"ي": "ی", "ك": "ک", "‌": " "})
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    text = text.translate(PERSIAN_NORMALIZATION).lower()
+    return [t for t in TOKEN_RE.findall(text) if len(t) > 1]
+
+
+def feature_counts(tokens: Iterable[str]) -> Dict[int, float]:
+    counts: Dict[int, float] = {}
+    for token in tokens:
+        feature = zlib.crc32(token.encode("utf-8")) % FEATURES
+        counts[feature] = counts.get(feature, 0.0) + 1.0
+    return counts
+
+
+def rating_factor(average: Optional[float], count: int) -> float:
+    """Map a rating aggregate to a multiplier in [0.5, 1.0]."""
+    total = (average or 0.0) * count
+    bayesian = (RATING_PRIOR_MEAN * RATING_PRIOR_COUNT + total) / (RATING_PRIOR_COUNT + count)
+    return 0.5 + 0.5 * bayesian / 5.0
+
+
+class ExecutorIndex:
+    def __init__(self, features: int = FEATURES):
+        _numpy()
+        self.features = features
+        self._tf = np.zeros((0, features), dtype=np.float32)
+        self._df = np.zeros(features, dtype=np.int64)
+        self._factor = np.zeros(0, dtype=np.float32)
+        self._ratings: List[Tuple[Optional[float], int]] = []
+        self._ids: List[int] = []
+        self._rows: Dict[int, int] = {}
+        self._norms: Optional["np.ndarray"] = None
+        self._lock = threading.RLock()
+        self.built_at: Optional[float] = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _grow(self, needed: int) -> None:
+        capacity = self._tf.shape[0]
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 64)
+        tf = np.zeros((capacity, self.features), dtype=np.float32)
+        tf[: self._tf.shape[0]] = self._tf
+        factor = np.zeros(capacity, dtype=np.float32)
+        factor[: self._factor.shape[0]] = self._factor
+        self._tf, self._factor = tf, factor
+
+    def upsert(self, user_id: int, text: str, rating_average: Optional[float], rating_count: int) -> None:
+        counts = feature_counts(tokenize(text))
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                row = len(self._ids)
+                self._grow(row + 1)
+                self._ids.append(user_id)
+                self._ratings.append((None, 0))
+                self._rows[user_id] = row
+            else:
+                self._df -= (self._tf[row] > 0)
+                self._tf[row] = 0
+            for feature, count in counts.items():
+                self._tf[row, feature] = 1.0 + math.log(count)
+            self._df += (self._tf[row] > 0)
+            self._factor[row] = rating_factor(rating_average, rating_count)
+            self._ratings[row] = (rating_average, rating_count)
+            self._norms = None
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                return
+            self._df -= (self._tf[row] > 0)
+            self._tf[row] = 0
+            self._factor[row] = 0
+            self._norms = None
+
+    def _idf(self) -> "np.ndarray":
+        return (np.log((1.0 + len(self._ids)) / (1.0 + self._df)) + 1.0).astype(np.float32)
+
+    def rank(self, text: str, limit: int = 10) -> List[dict]:
+        """Executors best matching `text`, highest score first."""
+        counts = feature_counts(tokenize(text))
+        if not counts:
+            return []
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return []
+            idf = self._idf()
+            if self._norms is None:
+                # Recomputed only after the index changed, not per query.
+                self._norms = np.sqrt(((self._tf[:n] * idf) ** 2).sum(axis=1))
+            columns = np.fromiter(counts.keys(), dtype=np.int64)
+            query = np.array([1.0 + math.log(c) for c in counts.values()], dtype=np.float32) * idf[columns]
+            dots = self._tf[:n, columns] @ (query * idf[columns])
+            denominator = self._norms * np.linalg.norm(query)
+            similarity = np.divide(dots, denominator, out=np.zeros(n, dtype=np.float32), where=denominator > 0)
+            scores = similarity * self._factor[:n]
+
+            candidates = np.flatnonzero(scores > 0)
+            if candidates.size > limit:
+                candidates = candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+            order = candidates[np.argsort(-scores[candidates])]
+            return [
+                {
+                    "executor_id": self._ids[row],
+                    "score": float(scores[row]),
+                    "similarity": float(similarity[row]),
+                    "rating_average": self._ratings[row][0],
+                    "rating_count": self._ratings[row][1],
+                }
+                for row in order
+            ]
+
+
+def _skills_text(skills: Optional[str]) -> str:
+    if not skills:
+        return ""
+    try:
+        parsed = json.loads(skills)
+    except (json.JSONDecodeError, TypeError):
+        return skills
+    if isinstance(parsed, list):
+        return " ".join(str(s) for s in parsed)
+    return str(parsed)
+
+
+def executor_documents(db: Session, user_ids: Optional[List[int]] = None) -> Iterable[tuple]:
+    """(user_id, document text, rating average, rating count) for active executors."""
+    users = db.query(User.id, User.skills, User.bio).filter(
+        User.role == UserRole.EXECUTOR, User.is_active.is_(True)
+    )
+    work = db.query(Proposal.executor_id, Project.title, Project.requirements).join(
+        Project, Project.id == Proposal.project_id
+    ).filter(Proposal.status == ProposalStatus.ACCEPTED)
+    ratings = db.query(Rating.rated_user_id, func.avg(Rating.rating), func.count(Rating.id)).group_by(Rating.rated_user_id)
+    if user_ids is not None:
+        users = users.filter(User.id.in_(user_ids))
+        work = work.filter(Proposal.executor_id.in_(user_ids))
+        ratings = ratings.filter(Rating.rated_user_id.in_(user_ids))
+
+    past_work: Dict[int, List[str]] = {}
+    for executor_id, title, requirements in work:
+        past_work.setdefault(executor_id, []).extend(filter(None, (title, requirements)))
+    aggregates = {uid: (float(avg), count) for uid, avg, count in ratings}
+
+    for user_id, skills, bio in users:
+        text = " ".join(
+            [_skills_text(skills)] * SKILL_WEIGHT + [bio or ""] + past_work.get(user_id, [])
+        )
+        average, count = aggregates.get(user_id, (None, 0))
+        yield user_id, text, average, count
+
+
+executor_index: Optional[ExecutorIndex] = None
+_build_lock = threading.Lock()
+
+
+def ensure_index(db: Session) -> ExecutorIndex:
+    """Build the shared index on first use and rebuild it once it is stale."""
+    global executor_index
+    index = executor_index
+    if index is not None and time.monotonic() - index.built_at < REBUILD_SECONDS:
+        return index
+    with _build_lock:
+        if executor_index is not index:
+            return executor_index
+        fresh = ExecutorIndex()
+        for user_id, text, average, count in executor_documents(db):
+            fresh.upsert(user_id, text, average, count)
+        fresh.built_at = time.monotonic()
+        executor_index = fresh
+        return fresh
+
+
+def refresh_executor(db: Session, user_id: int) -> None:
+    """Re-index one executor after their profile, accepted work or ratings changed."""
+    index = executor_index
+    if index is None:
+        return
+    documents = list(executor_documents(db, [user_id]))
+    if not documents:
+        index.remove(user_id)
+        return
+    _, text, average, count = documents[0]
+    index.upsert(user_id, text, average, count)
+
+
+def recommend_executors(db: Session, project: Project, limit: int = 10) -> List[dict]:
+    text = " ".join(filter(None, (project.title, project.description, project.requirements)))
+    return ensure_index(db).rank(text, limit=limit)
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
+import json
 from enum import Enum
 
 class UserRole(str, Enum):
@@ -51,6 +52,7 @@ class UserResponse(UserBase):
     is_verified: bool
     created_at: datetime
     updated_at: Optional[datetime] = None
+    version: Optional[int] = None  # Row version; the first number of the ETag, for If-Match
     
     class Config:
         from_attributes = True
@@ -79,11 +81,15 @@ class IdeaResponse(IdeaBase):
     executor_id: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
+    version: Optional[int] = None
     creator: Optional[UserResponse] = None
     
     class Config:
         from_attributes = True
 
+class SimilarIdeaResponse(IdeaResponse):
+    similarity: float
+
 # Project schemas
 class ProjectBase(BaseModel):
     title: str
@@ -112,6 +118,7 @@ class ProjectResponse(ProjectBase):
     idea_id: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
+    version: Optional[int] = None
     employer: Optional[UserResponse] = None
     executor: Optional[UserResponse] = None
     idea: Optional[IdeaResponse] = None
@@ -141,11 +148,37 @@ class ProposalResponse(ProposalBase):
     status: ProposalStatus
     created_at: datetime
     updated_at: Optional[datetime] = None
+    version: Optional[int] = None
     executor: Optional[UserResponse] = None
     
     class Config:
         from_attributes = True
 
+class ProposalComparison(BaseModel):
+    """One compact row of the employer's proposal comparison; scores are in [0, 1]."""
+    id: int
+    executor_id: int
+    full_name: str
+    avatar_url: Optional[str] = None
+    status: ProposalStatus
+    proposed_price: Optional[float] = None
+    price_ratio: Optional[float] = None
+    proposed_timeline: Optional[str] = None
+    timeline_days: Optional[int] = None
+    executor_rating: Optional[float] = None
+    price_score: Optional[float] = None
+    skill_score: Optional[float] = None
+    timeline_score: Optional[float] = None
+    score: Optional[float] = None
+    created_at: datetime
+
+class ExecutorRecommendation(BaseModel):
+    executor: UserResponse
+    score: float
+    similarity: float
+    rating_average: Optional[float] = None
+    rating_count: int = 0
+
 # Message schemas
 class MessageBase(BaseModel):
     content: str
@@ -197,23 +230,179 @@ class FileUploadBase(BaseModel):
 class FileUploadCreate(FileUploadBase):
     project_id: int
 
+class FileArtifactResponse(BaseModel):
+    kind: str
+    content_type: Optional[str] = None
+    file_url: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    size: Optional[int] = None
+    data: Optional[dict] = None
+    
+    @field_validator("data", mode="before")
+    @classmethod
+    def parse_data(cls, value):
+        return json.loads(value) if isinstance(value, str) else value
+    
+    class Config:
+        from_attributes = True
+
 class FileUploadResponse(FileUploadBase):
     id: int
     project_id: int
     uploaded_by: int
     created_at: datetime
     uploader: Optional[UserResponse] = None
+    processing_status: Optional[str] = None
+    artifacts: List[FileArtifactResponse] = []
     
     class Config:
         from_attributes = True
 
+class ProjectBundle(BaseModel):
+    """Everything the project page shows, in one response; sections the caller may not see are None."""
+    project: ProjectResponse
+    proposals: Optional[List[ProposalResponse]] = None
+    files: Optional[List[FileUploadResponse]] = None
+    messages: Optional[List[MessageResponse]] = None
+    ratings: List[RatingResponse] = []
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    content_type: Optional[str] = None
+    sha256: Optional[str] = None
+    is_final_delivery: bool = False
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    project_id: int
+    filename: str
+    size: int
+    offset: int
+    chunk_size: int
+    expires_at: datetime
+    completed_at: Optional[datetime] = None
+    file: Optional[FileUploadResponse] = None
+    
+    class Config:
+        from_attributes = True
+
+class StorageUsage(BaseModel):
+    used_bytes: int
+    reserved_bytes: int
+    quota_bytes: Optional[int] = None
+
+# Timeline schemas
+class ProjectEventResponse(BaseModel):
+    id: int
+    project_id: int
+    kind: str
+    actor_id: Optional[int] = None
+    actor_name: Optional[str] = None
+    data: dict = {}
+    created_at: datetime
+
+class TimelinePage(BaseModel):
+    items: List[ProjectEventResponse]
+    # Pass as `before` to fetch the next (older) page; None on the last page.
+    next_before: Optional[int] = None
+
+# Notification schemas
+class NotificationResponse(BaseModel):
+    id: int
+    kind: str
+    project_id: Optional[int] = None
+    actor_id: Optional[int] = None
+    data: dict = {}
+    is_read: bool
+    created_at: datetime
+
+class NotificationPage(BaseModel):
+    items: List[NotificationResponse]
+    next_before: Optional[int] = None
+    unread: int
+
+class UnreadCount(BaseModel):
+    unread: int
+
+# Analytics schemas
+class DailyAnalytics(BaseModel):
+    day: date
+    new_ideas: int
+    new_projects: int
+    new_proposals: int
+    accepted_proposals: int
+    rejected_proposals: int
+    acceptance_rate: Optional[float] = None
+    proposals_per_project: Optional[float] = None
+    median_proposed_price: Optional[float] = None
+    median_budget: Optional[float] = None
+    median_price_to_budget: Optional[float] = None
+    new_ratings: int
+    average_rating: Optional[float] = None
+    projects_by_status: dict = {}
+
+class AnalyticsSummary(BaseModel):
+    start: date
+    end: date
+    new_ideas: int
+    new_projects: int
+    new_proposals: int
+    acceptance_rate: Optional[float] = None
+    proposals_per_project: Optional[float] = None
+    new_ratings: int
+    average_rating: Optional[float] = None
+    projects_by_status: dict = {}
+    # When the rollup job last wrote these days; None if it never ran.
+    computed_at: Optional[datetime] = None
+
+# SQL profiler schemas
+class SlowQueryStats(BaseModel):
+    statement: str
+    count: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    # endpoint name / "main.py:<line> <function>" -> occurrences
+    endpoints: dict = {}
+    callers: dict = {}
+    last_seen: float
+
+class SQLStatementProfile(BaseModel):
+    sql: str
+    duration_ms: float
+    parameters: str
+    caller: Optional[str] = None
+
+class RequestProfileSummary(BaseModel):
+    id: int
+    method: str
+    path: str
+    endpoint: Optional[str] = None
+    status: Optional[int] = None
+    started_at: float
+    duration_ms: float
+    query_count: int
+    sql_time_ms: float
+
+class RequestProfileResponse(RequestProfileSummary):
+    statements: List[SQLStatementProfile]
+
 # Auth schemas
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    user_id: Optional[int] = None
+    role: Optional[UserRole] = None
+    version: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class LoginRequest(BaseModel):
     email: EmailStr
@@ -0,0 +1,168 @@
+"""
+Near-duplicate detection for ideas with MinHash and LSH banding.
+
+Each idea's title and description are reduced to a set of word shingles and
+summarized by a MinHash signature of NUM_PERM values, stored on the idea.
+The signature is split into BANDS bands; every band is hashed into a bucket
+and stored in idea_lsh_bands, indexed by (band, bucket). Ideas sharing any
+bucket are candidates, so a lookup reads a handful of index entries instead
+of comparing against every idea. Candidates are then scored by the fraction
+of equal signature values, an estimate of their Jaccard similarity.
+
+With 16 bands of 4 rows, pairs at Jaccard 0.5 collide in some band about
+65% of the time and pairs at 0.8 more than 99.9% of the time.
+
+`python similarity.py --backfill` signs and indexes existing ideas in batches.
+"""
+import argparse
+import hashlib
+import random
+import struct
+import zlib
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, delete, insert, or_
+from sqlalchemy.orm import Session
+
+from database import Idea, IdeaLshBand
+from recommendations import tokenize
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 2
+DEFAULT_THRESHOLD = 0.5
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(20240601)
+# Fixed seed: signatures must stay comparable across processes and releases.
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingles(text: str) -> set:
+    tokens = tokenize(text)
+    if len(tokens) < SHINGLE_SIZE:
+        return set(tokens)
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def signature(text: str) -> Optional[Tuple[int, ...]]:
+    """MinHash signature of `text`, or None when it has no words."""
+    hashed = [zlib.crc32(s.encode("utf-8")) for s in shingles(text)]
+    if not hashed:
+        return None
+    return tuple(
+        min(((a * x + b) % _PRIME) & _MAX_HASH for x in hashed)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def pack(sig: Tuple[int, ...]) -> bytes:
+    return struct.pack(f"<{NUM_PERM}I", *sig)
+
+
+def unpack(data: bytes) -> Tuple[int, ...]:
+    return struct.unpack(f"<{NUM_PERM}I", data)
+
+
+def pack_band(sig: Tuple[int, ...], band: int) -> bytes:
+    return struct.pack(f"<{ROWS}I", *sig[band * ROWS:(band + 1) * ROWS])
+
+
+def band_buckets(sig: Tuple[int, ...]) -> List[int]:
+    buckets = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(pack_band(sig, band), digest_size=8).digest()
+        # Shift into the signed 64-bit range of a BIGINT column.
+        buckets.append(int.from_bytes(digest, "big") >> 1)
+    return buckets
+
+
+def estimate_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def idea_text(idea: Idea) -> str:
+    return f"{idea.title or ''} {idea.description or ''}"
+
+
+def index_idea(db: Session, idea: Idea) -> Optional[Tuple[int, ...]]:
+    """(Re)compute an idea's signature and LSH buckets; the caller commits."""
+    sig = signature(idea_text(idea))
+    idea.minhash = pack(sig) if sig else None
+    db.execute(delete(IdeaLshBand).where(IdeaLshBand.idea_id == idea.id))
+    if sig:
+        db.execute(insert(IdeaLshBand), [
+            {"idea_id": idea.id, "band": band, "bucket": bucket}
+            for band, bucket in enumerate(band_buckets(sig))
+        ])
+    return sig
+
+
+def find_similar(db: Session, sig: Tuple[int, ...], exclude_id: Optional[int] = None,
+                 threshold: float = DEFAULT_THRESHOLD, limit: int = 10) -> List[Tuple[int, float]]:
+    """(idea_id, estimated similarity) of indexed ideas near `sig`, most similar first."""
+    conditions = [
+        and_(IdeaLshBand.band == band, IdeaLshBand.bucket == bucket)
+        for band, bucket in enumerate(band_buckets(sig))
+    ]
+    query = db.query(IdeaLshBand.idea_id).filter(or_(*conditions)).distinct()
+    if exclude_id is not None:
+        query = query.filter(IdeaLshBand.idea_id != exclude_id)
+    candidates = [r[0] for r in query.all()]
+    if not candidates:
+        return []
+
+    scored = []
+    for idea_id, data in db.query(Idea.id, Idea.minhash).filter(Idea.id.in_(candidates)):
+        if data:
+            similarity = estimate_similarity(sig, unpack(data))
+            if similarity >= threshold:
+                scored.append((idea_id, similarity))
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:limit]
+
+
+def backfill(db: Session, batch_size: int = 1000, reindex: bool = False) -> int:
+    """Sign and index ideas in id order; only unsigned ones unless `reindex`."""
+    done = 0
+    last_id = 0
+    while True:
+        query = db.query(Idea).filter(Idea.id > last_id)
+        if not reindex:
+            query = query.filter(Idea.minhash.is_(None))
+        ideas = query.order_by(Idea.id).limit(batch_size).all()
+        if not ideas:
+            return done
+        for idea in ideas:
+            index_idea(db, idea)
+        db.commit()
+        done += len(ideas)
+        last_id = ideas[-1].id
+        print(f"Indexed {done} ideas (last id {last_id})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain MinHash/LSH signatures of ideas")
+    parser.add_argument("--backfill", action="store_true", help="Sign and index ideas that have no signature yet")
+    parser.add_argument("--reindex", action="store_true", help="With --backfill, recompute every idea")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if not args.backfill:
+        parser.print_help()
+        return
+
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        total = backfill(session, batch_size=args.batch_size, reindex=args.reindex)
+        print(f"Backfill complete: {total} ideas indexed")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
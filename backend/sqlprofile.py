@@ -0,0 +1,354 @@
+"""
+Per-request SQL profiling and a slow-query log.
+
+`install()` hooks every SQLAlchemy engine and times each statement.
+SQLProfilerMiddleware keeps the current request in a context variable, so
+each statement can be attributed to the endpoint that issued it. That works
+in the threadpool too, which copies the context.
+
+Profiling is opt-in per request. It is switched on by an
+`X-SQL-Profile: <SQL_PROFILE_KEY>` header or, for a random share of
+requests, by SQL_PROFILE_SAMPLE_RATE. A profiled request records every
+statement with:
+  - its duration
+  - the shape of its bind parameters (types only, never values)
+  - the main.py line that issued it
+The response then carries X-SQL-Queries, X-SQL-Time-Ms and X-SQL-Profile-Id
+headers. The last SQL_PROFILE_KEEP profiles are kept for /admin/sql/profiles.
+
+Independently of profiling, a statement slower than SLOW_QUERY_MS is added
+to the slow-query log. The log aggregates statements by their normalized
+text, with literals and IN lists collapsed. /admin/sql/slow-queries lists
+the top offenders. Both stores are per worker process.
+
+`python sqlprofile.py --overhead` measures the cost per statement of the
+hooks, both idle and while profiling.
+"""
+import argparse
+import itertools
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("masna.sql")
+
+SQL_PROFILE_KEY = os.getenv("SQL_PROFILE_KEY", "")
+SQL_PROFILE_SAMPLE_RATE = float(os.getenv("SQL_PROFILE_SAMPLE_RATE", "0"))
+SQL_PROFILE_KEEP = int(os.getenv("SQL_PROFILE_KEEP", "50"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_MAX_ENTRIES = 1000
+
+MAIN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+class RequestProfile:
+    """Statements issued while serving one profiled request."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, method: str, path: str):
+        self.id = next(self._ids)
+        self.method = method
+        self.path = path
+        self.endpoint: Optional[str] = None
+        self.status: Optional[int] = None
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.statements: List[dict] = []
+        self._lock = threading.Lock()
+
+    @property
+    def sql_time_ms(self) -> float:
+        return sum(s["duration_ms"] for s in self.statements)
+
+    def add(self, statement: dict) -> None:
+        with self._lock:
+            self.statements.append(statement)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "endpoint": self.endpoint,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "query_count": len(self.statements),
+            "sql_time_ms": round(self.sql_time_ms, 3),
+        }
+
+    def as_dict(self) -> dict:
+        return dict(self.summary(), statements=list(self.statements))
+
+
+class RequestContext:
+    def __init__(self, scope, profile: Optional[RequestProfile]):
+        self.scope = scope
+        self.profile = profile
+
+    @property
+    def endpoint(self) -> Optional[str]:
+        endpoint = self.scope.get("endpoint")
+        return getattr(endpoint, "__name__", None)
+
+
+current_request: ContextVar[Optional[RequestContext]] = ContextVar("sql_request", default=None)
+
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|:\w+|\$\d+")
+
+
+def normalize(sql: str) -> str:
+    """Statement text with literals, placeholders and IN lists collapsed, for grouping."""
+    sql = " ".join(sql.split())
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _LITERAL.sub("?", sql)
+    return _IN_LIST.sub("(?...)", sql)
+
+
+def _type_name(value) -> str:
+    return "null" if value is None else type(value).__name__
+
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Types of the bind parameters, e.g. "(int, str)" or "{email: str}"; never the values."""
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} x {parameter_shape(rows[0]) if rows else '()'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {_type_name(v)}" for k, v in parameters.items()) + "}"
+    return "(" + ", ".join(_type_name(v) for v in parameters or ()) + ")"
+
+
+def caller() -> Optional[str]:
+    """The innermost main.py line on the current stack, e.g. "main.py:677 get_my_proposals"."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_filename == MAIN_FILE:
+            return f"main.py:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class SlowQueryLog:
+    """Slow statements aggregated by normalized text."""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, max_entries: int = SLOW_QUERY_MAX_ENTRIES):
+        self.threshold_ms = threshold_ms
+        self.max_entries = max_entries
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, duration_ms: float, endpoint: Optional[str], source: Optional[str]) -> None:
+        key = normalize(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    # Forget the cheapest statement to make room.
+                    del self._entries[min(self._entries, key=lambda k: self._entries[k]["total_ms"])]
+                entry = self._entries[key] = {
+                    "statement": key, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "endpoints": {}, "callers": {}, "last_seen": 0.0,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_seen"] = time.time()
+            if endpoint:
+                entry["endpoints"][endpoint] = entry["endpoints"].get(endpoint, 0) + 1
+            if source:
+                entry["callers"][source] = entry["callers"].get(source, 0) + 1
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> List[dict]:
+        with self._lock:
+            entries = [dict(e, endpoints=dict(e["endpoints"]), callers=dict(e["callers"])) for e in self._entries.values()]
+        for e in entries:
+            e["mean_ms"] = e["total_ms"] / e["count"]
+        entries.sort(key=lambda e: e[order_by], reverse=True)
+        return entries[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_queries = SlowQueryLog()
+recent_profiles: deque = deque(maxlen=SQL_PROFILE_KEEP)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sql_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["sql_started"].pop()
+    duration_ms = (time.perf_counter() - started) * 1000
+    request = current_request.get()
+    profile = request.profile if request else None
+    slow = duration_ms >= slow_queries.threshold_ms
+    if profile is None and not slow:
+        return
+    source = caller()
+    if slow:
+        slow_queries.record(statement, duration_ms, request.endpoint if request else None, source)
+    if profile is not None:
+        profile.add({
+            "sql": statement,
+            "duration_ms": round(duration_ms, 3),
+            "parameters": parameter_shape(parameters, executemany),
+            "caller": source,
+        })
+
+
+def _handle_error(exception_context):
+    stack = exception_context.connection.info.get("sql_started") if exception_context.connection else None
+    if stack:
+        stack.pop()
+
+
+_installed = False
+
+
+def install() -> None:
+    """Time statements on every engine (idempotent)."""
+    global _installed
+    if _installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _installed = True
+
+
+def uninstall() -> None:
+    global _installed
+    if not _installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    event.remove(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.remove(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.remove(Engine, "handle_error", _handle_error)
+    _installed = False
+
+
+def get_profile(profile_id: int) -> Optional[RequestProfile]:
+    for profile in list(recent_profiles):
+        if profile.id == profile_id:
+            return profile
+    return None
+
+
+class SQLProfilerMiddleware:
+    def __init__(self, app, key: Optional[str] = None, sample_rate: Optional[float] = None):
+        self.app = app
+        # None: follow the module settings.
+        self.key = key
+        self.sample_rate = sample_rate
+
+    def wants_profile(self, scope) -> bool:
+        key = SQL_PROFILE_KEY if self.key is None else self.key
+        if key:
+            for name, value in scope.get("headers", []):
+                if name == b"x-sql-profile":
+                    return value.decode("latin-1") == key
+        sample_rate = SQL_PROFILE_SAMPLE_RATE if self.sample_rate is None else self.sample_rate
+        return sample_rate > 0 and random.random() < sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"]) if self.wants_profile(scope) else None
+        context = RequestContext(scope, profile)
+        token = current_request.set(context)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if profile is not None and message["type"] == "http.response.start":
+                profile.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-sql-profile-id", str(profile.id).encode()),
+                    (b"x-sql-queries", str(len(profile.statements)).encode()),
+                    (b"x-sql-time-ms", f"{profile.sql_time_ms:.3f}".encode()),
+                ]
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            if profile is not None:
+                profile.duration_ms = (time.perf_counter() - started) * 1000
+                profile.endpoint = context.endpoint
+                recent_profiles.append(profile)
+                logger.info("%s %s: %d queries, %.1fms in SQL (profile %d)", profile.method, profile.path,
+                            len(profile.statements), profile.sql_time_ms, profile.id)
+
+
+def measure_overhead(statements: int = 20000) -> Dict[str, float]:
+    """Microseconds per statement on an in-memory SQLite engine: bare, hooked, hooked and profiling."""
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine("sqlite://")
+    query = text("SELECT :x")
+
+    def run() -> float:
+        with engine.connect() as conn:
+            conn.execute(query, {"x": 0})
+            started = time.perf_counter()
+            for i in range(statements):
+                conn.execute(query, {"x": i})
+            return (time.perf_counter() - started) / statements * 1e6
+
+    was_installed = _installed
+    uninstall()
+    results = {"bare_us": run()}
+    install()
+    results["hooked_us"] = run()
+    token = current_request.set(RequestContext({}, RequestProfile("GET", "/overhead")))
+    try:
+        results["profiling_us"] = run()
+    finally:
+        current_request.reset(token)
+    if not was_installed:
+        uninstall()
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQL profiler utilities")
+    parser.add_argument("--overhead", action="store_true", help="Measure the profiler's cost per statement")
+    parser.add_argument("--statements", type=int, default=20000)
+    args = parser.parse_args()
+
+    if not args.overhead:
+        parser.print_help()
+        return
+    results = measure_overhead(args.statements)
+    bare = results["bare_us"]
+    for name, value in results.items():
+        print(f"{name:<14}{value:>8.2f} us/statement  (+{value - bare:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Cold-start benchmark: import time of the app and time to the first response.
+
+Each measurement runs in a fresh interpreter. Import time comes from
+`python -X importtime -c "import main"`; time to first request is the wall
+clock from launching the interpreter until GET /health/live has answered
+through an in-process TestClient, which is what a freshly scaled-out worker
+pays before it can serve. The slowest modules (by self time) are listed so a
+new eager import is easy to spot.
+
+Examples:
+    python startup_bench.py
+    python startup_bench.py --save-baseline startup_baseline.json
+    python startup_bench.py --baseline startup_baseline.json --threshold 0.3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+FIRST_REQUEST = (
+    "from fastapi.testclient import TestClient\n"
+    "import main\n"
+    "response = TestClient(main.app).get('/health/live')\n"
+    "assert response.status_code == 200, response.status_code\n"
+)
+
+
+def bench_env(workdir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'startup.db')}")
+    env.setdefault("SECRET_KEY", "startup-bench")
+    env.setdefault("UPLOAD_DIR", os.path.join(workdir, "uploads"))
+    env.setdefault("RATE_LIMIT_ENABLED", "false")
+    return env
+
+
+def parse_importtime(stderr: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """(cumulative ms of `main`, [(module, self ms)]) from -X importtime output."""
+    total = 0.0
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append((name.strip(), int(self_us) / 1000))
+        if name.strip() == "main":
+            total = int(cumulative_us) / 1000
+    return total, modules
+
+
+def measure_import(env: Dict[str, str]) -> Tuple[float, List[Tuple[str, float]]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def measure_first_request(env: Dict[str, str]) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", FIRST_REQUEST], env=env, capture_output=True, check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def run(runs: int) -> Tuple[Dict[str, float], List[Tuple[str, float]]]:
+    with tempfile.TemporaryDirectory() as workdir:
+        env = bench_env(workdir)
+        imports, firsts, slowest = [], [], []
+        for _ in range(runs):
+            total, modules = measure_import(env)
+            imports.append(total)
+            firsts.append(measure_first_request(env))
+            slowest = modules
+    results = {
+        "import_ms": round(statistics.median(imports), 1),
+        "first_request_ms": round(statistics.median(firsts), 1),
+    }
+    return results, sorted(slowest, key=lambda m: -m[1])
+
+
+def compare_to_baseline(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """Return a description of every metric that regressed past `threshold`."""
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is not None and base and current > base * (1 + threshold):
+            regressions.append(f"{name}: {current:.1f}ms vs baseline {base:.1f}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend import time and time to first request")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement; the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--save-baseline", default=None, help="Write results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Compare results with this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.3, help="Allowed relative regression (0.3 = 30%%)")
+    args = parser.parse_args()
+
+    # Run from the backend directory so `import main` resolves regardless of the caller's cwd.
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    results, slowest = run(args.runs)
+
+    print(f"import main:        {results['import_ms']:8.1f} ms")
+    print(f"first request:      {results['first_request_ms']:8.1f} ms")
+    print("\nSlowest modules (self time, last run):")
+    for name, self_ms in slowest[:args.top]:
+        print(f"  {self_ms:8.1f} ms  {name}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
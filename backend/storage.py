@@ -0,0 +1,540 @@
+"""
+File storage for project uploads, including resumable upload sessions.
+
+Small files still arrive in one multipart request. Large deliverables use
+an upload session instead:
+
+    POST   /projects/{id}/uploads          declare filename, size and optionally sha256
+    HEAD   /upload-sessions/{sid}          Upload-Offset: bytes the server already has
+    PUT    /upload-sessions/{sid}?offset=N raw bytes starting at N
+    DELETE /upload-sessions/{sid}          abandon
+
+Chunks are written into a staging file outside the public uploads
+directory. A PUT is idempotent: bytes the server already has are skipped,
+so a client that lost the response simply resends from its last known
+offset. A PUT that starts past the current offset is refused with 409 and
+the offset to resume from. Once the last byte arrives the staged file is
+checked against the declared size and SHA-256, moved into the project's
+upload directory and recorded as an ordinary FileUpload row.
+
+Sessions expire UPLOAD_SESSION_TTL_SECONDS after their last chunk;
+`python storage.py --expire-sessions` removes them and their staged bytes.
+
+Disk usage is tracked in `storage_bytes` counters on projects and users,
+adjusted in the same transaction that records or deletes a file, so quota
+checks (PROJECT_QUOTA_BYTES, USER_QUOTA_BYTES; 0 disables) are two
+primary-key reads. Bytes reserved by unfinished upload sessions count
+against the quota too.
+
+`python storage.py --gc` reconciles disk and database: files with no row
+(older than a grace period, so in-flight uploads are left alone) and rows
+whose file is gone are removed, and `--purge-cancelled-days N` reclaims the
+files of projects cancelled more than N days ago. The walk streams
+directory entries with os.scandir and checks them against the database in
+batches, so memory stays flat however many files there are.
+"""
+import argparse
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, update
+from sqlalchemy.orm import Session
+
+import events
+import media
+from database import FileArtifact, FileUpload, Project, ProjectStatus, UploadSession, User
+
+UPLOAD_ROOT = os.getenv("UPLOAD_DIR", "uploads")
+# Not under UPLOAD_ROOT, which is served publicly as static files.
+STAGING_ROOT = os.getenv("UPLOAD_STAGING_DIR", "upload_staging")
+SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(5 * 1024 ** 3)))
+# Advertised to clients; larger chunks are accepted but lose more on a dropped connection.
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+PROJECT_QUOTA_BYTES = int(os.getenv("PROJECT_QUOTA_BYTES", str(20 * 1024 ** 3)))
+USER_QUOTA_BYTES = int(os.getenv("USER_QUOTA_BYTES", str(50 * 1024 ** 3)))
+# Files younger than this may belong to an upload that has not committed yet.
+GC_GRACE_SECONDS = int(os.getenv("STORAGE_GC_GRACE_SECONDS", "3600"))
+
+
+class UploadConflict(Exception):
+    """A chunk does not start at or before the session's current offset."""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Expected offset {offset}")
+        self.offset = offset
+
+
+class UploadIntegrityError(Exception):
+    """The reassembled file does not match the declared size or checksum."""
+
+
+class QuotaExceeded(Exception):
+    """Storing the file would take a project or user past its quota."""
+
+
+def utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def naive_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes, PostgreSQL aware ones.
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def stored_path(project_id: int, filename: str) -> Tuple[str, str]:
+    """(path on disk, public URL) for a new file in a project's upload directory."""
+    project_dir = os.path.join(UPLOAD_ROOT, f"project_{project_id}")
+    os.makedirs(project_dir, exist_ok=True)
+    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+    stored_name = f"{timestamp}_{filename}"
+    return os.path.join(project_dir, stored_name), f"/uploads/project_{project_id}/{stored_name}"
+
+
+def adjust_usage(db: Session, project_id: int, user_id: int, delta: int) -> None:
+    """Add `delta` bytes to a project's and a user's usage counters; the caller commits."""
+    if not delta:
+        return
+    db.execute(
+        update(Project).where(Project.id == project_id).values(storage_bytes=Project.storage_bytes + delta),
+        execution_options={"synchronize_session": False},
+    )
+    db.execute(
+        update(User).where(User.id == user_id).values(storage_bytes=User.storage_bytes + delta),
+        execution_options={"synchronize_session": False},
+    )
+
+
+@events.subscribe("file.uploaded")
+def account_upload(db: Session, name: str, data: dict) -> None:
+    adjust_usage(db, data["project_id"], data["actor_id"], data.get("size") or 0)
+
+
+def usage(db: Session, project_id: Optional[int] = None, user_id: Optional[int] = None) -> Dict[str, int]:
+    """Used bytes and bytes reserved by open upload sessions, for a project or a user."""
+    if project_id is not None:
+        used = db.query(Project.storage_bytes).filter(Project.id == project_id).scalar()
+        sessions = db.query(UploadSession).filter(UploadSession.project_id == project_id)
+    else:
+        used = db.query(User.storage_bytes).filter(User.id == user_id).scalar()
+        sessions = db.query(UploadSession).filter(UploadSession.user_id == user_id)
+    reserved = sessions.filter(
+        UploadSession.completed_at.is_(None), UploadSession.expires_at > utcnow()
+    ).with_entities(func.coalesce(func.sum(UploadSession.size), 0)).scalar()
+    return {"used_bytes": used or 0, "reserved_bytes": int(reserved or 0)}
+
+
+def check_quota(db: Session, project_id: int, user_id: int, incoming: int,
+                exclude_session: Optional[UploadSession] = None) -> None:
+    """Raise QuotaExceeded if `incoming` more bytes would exceed a project or user quota."""
+    own = exclude_session.size if exclude_session is not None else 0
+    for label, quota, current in (
+        ("Project", PROJECT_QUOTA_BYTES, usage(db, project_id=project_id)),
+        ("User", USER_QUOTA_BYTES, usage(db, user_id=user_id)),
+    ):
+        if quota and current["used_bytes"] + current["reserved_bytes"] - own + incoming > quota:
+            raise QuotaExceeded(f"{label} storage quota of {quota} bytes exceeded")
+
+
+def remaining_quota(db: Session, project_id: int, user_id: int) -> Optional[int]:
+    """Bytes a new file may still take under the project and user quotas; None if neither is set."""
+    remaining = None
+    for quota, current in (
+        (PROJECT_QUOTA_BYTES, usage(db, project_id=project_id) if PROJECT_QUOTA_BYTES else None),
+        (USER_QUOTA_BYTES, usage(db, user_id=user_id) if USER_QUOTA_BYTES else None),
+    ):
+        if quota:
+            left = quota - current["used_bytes"] - current["reserved_bytes"]
+            remaining = left if remaining is None else min(remaining, left)
+    return remaining
+
+
+def staging_path(session_id: str) -> str:
+    return os.path.join(STAGING_ROOT, session_id)
+
+
+def create_session(db: Session, project_id: int, user_id: int, filename: str, size: int,
+                   content_type: Optional[str] = None, sha256: Optional[str] = None,
+                   is_final_delivery: bool = False) -> UploadSession:
+    """Open an upload session, reserving `size` bytes of quota; commits."""
+    check_quota(db, project_id, user_id, size)
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        project_id=project_id,
+        user_id=user_id,
+        filename=os.path.basename(filename),
+        content_type=content_type,
+        size=size,
+        offset=0,
+        sha256=sha256.lower() if sha256 else None,
+        is_final_delivery=is_final_delivery,
+        expires_at=utcnow() + timedelta(seconds=SESSION_TTL_SECONDS),
+    )
+    os.makedirs(STAGING_ROOT, exist_ok=True)
+    # Pre-create the staging file so chunk writes can always open it in place.
+    open(staging_path(session.id), "wb").close()
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def is_expired(session: UploadSession) -> bool:
+    return naive_utc(session.expires_at) <= utcnow()
+
+
+async def write_chunk(db: Session, session: UploadSession, offset: int, body: AsyncIterator[bytes]) -> int:
+    """Write a chunk that starts at `offset`; returns the session's new offset.
+
+    Bytes before the current offset were already received and are skipped,
+    so retrying a chunk is harmless. Commits the new offset. Only the body is
+    awaited here; file writes and the database run in the threadpool.
+    """
+    current = session.offset
+    if offset > current:
+        raise UploadConflict(current)
+    skip = current - offset
+    remaining = session.size - current
+    written = 0
+    out = await run_in_threadpool(open, staging_path(session.id), "r+b")
+    try:
+        await run_in_threadpool(out.seek, current)
+        async for piece in body:
+            if skip:
+                if len(piece) <= skip:
+                    skip -= len(piece)
+                    continue
+                piece = piece[skip:]
+                skip = 0
+            if written + len(piece) > remaining:
+                raise UploadIntegrityError("Chunk extends past the declared upload size")
+            await run_in_threadpool(out.write, piece)
+            written += len(piece)
+    finally:
+        await run_in_threadpool(out.close)
+    if not written:
+        return current
+    return await run_in_threadpool(_advance_offset, db, session, current, written)
+
+
+def _advance_offset(db: Session, session: UploadSession, current: int, written: int) -> int:
+    # Compare-and-set: a concurrent retry of the same chunk must not advance twice.
+    advanced = db.execute(
+        update(UploadSession)
+        .where(UploadSession.id == session.id, UploadSession.offset == current)
+        .values(offset=current + written, expires_at=utcnow() + timedelta(seconds=SESSION_TTL_SECONDS)),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    db.commit()
+    db.refresh(session)
+    if not advanced:
+        return session.offset
+    return current + written
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_staged(session: UploadSession) -> None:
+    """Raise UploadIntegrityError unless the staged file matches what was declared."""
+    path = staging_path(session.id)
+    if os.path.getsize(path) != session.size:
+        raise UploadIntegrityError(f"Expected {session.size} bytes, have {os.path.getsize(path)}")
+    if session.sha256 and file_sha256(path) != session.sha256:
+        raise UploadIntegrityError("SHA-256 mismatch")
+
+
+def complete_session(db: Session, session: UploadSession) -> Optional[FileUpload]:
+    """Verify a fully received file, move it into place and record it; commits.
+
+    The last chunk can arrive twice at once (a retry racing the original).
+    Completion is claimed with a conditional UPDATE, which holds the row
+    until commit, so exactly one request verifies and records the file. The
+    others get None. On a failed check the session is discarded and
+    UploadIntegrityError raised.
+    """
+    now = utcnow()
+    claimed = db.execute(
+        update(UploadSession)
+        .where(UploadSession.id == session.id, UploadSession.completed_at.is_(None))
+        .values(completed_at=now),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    if claimed != 1:
+        db.rollback()
+        return None
+    try:
+        verify_staged(session)
+    except UploadIntegrityError:
+        db.rollback()
+        discard_session(db, session)
+        raise
+
+    path, url = stored_path(session.project_id, session.filename)
+    os.replace(staging_path(session.id), path)
+    db_file = FileUpload(
+        project_id=session.project_id,
+        uploaded_by=session.user_id,
+        filename=session.filename,
+        file_url=url,
+        file_type=session.content_type,
+        file_size=session.size,
+        is_final_delivery=session.is_final_delivery,
+        processing_status="pending" if media.media_kind(session.filename, session.content_type) else "skipped",
+    )
+    db.add(db_file)
+    db.flush()
+    session.file_id = db_file.id
+    session.completed_at = now
+    events.emit(
+        db, "file.uploaded",
+        project_id=session.project_id, actor_id=session.user_id, file_id=db_file.id,
+        filename=db_file.filename, is_final_delivery=db_file.is_final_delivery, size=db_file.file_size,
+    )
+    db.commit()
+    db.refresh(db_file)
+    return db_file
+
+
+def discard_session(db: Session, session: UploadSession) -> None:
+    """Delete a session and its staged bytes; commits."""
+    try:
+        os.remove(staging_path(session.id))
+    except FileNotFoundError:
+        pass
+    db.delete(session)
+    db.commit()
+
+
+def expire_sessions(db: Session, now: Optional[datetime] = None, batch_size: int = 500) -> int:
+    """Remove sessions past their expiry (abandoned or long completed)."""
+    now = now or utcnow()
+    removed = 0
+    while True:
+        expired = (
+            db.query(UploadSession)
+            .filter(UploadSession.expires_at <= now)
+            .order_by(UploadSession.expires_at)
+            .limit(batch_size)
+            .all()
+        )
+        if not expired:
+            return removed
+        for session in expired:
+            try:
+                os.remove(staging_path(session.id))
+            except FileNotFoundError:
+                pass
+            db.delete(session)
+        db.commit()
+        removed += len(expired)
+
+
+def walk_files(root: str) -> Iterator[os.DirEntry]:
+    """Every regular file under `root`, streamed; only pending directories are held in memory."""
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def file_url_for(path: str) -> str:
+    return "/uploads/" + os.path.relpath(path, UPLOAD_ROOT).replace(os.sep, "/")
+
+
+def disk_path(file_url: str) -> str:
+    return os.path.join(UPLOAD_ROOT, *file_url.split("/uploads/", 1)[1].split("/"))
+
+
+def _remove(path: str) -> int:
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+def _collect_orphan_files(db: Session, batch: List[Tuple[str, int]], dry_run: bool) -> Tuple[int, int]:
+    urls = [file_url_for(path) for path, _ in batch]
+    known = {r[0] for r in db.query(FileUpload.file_url).filter(FileUpload.file_url.in_(urls))}
+    known.update(r[0] for r in db.query(FileArtifact.file_url).filter(FileArtifact.file_url.in_(urls)))
+    count = reclaimed = 0
+    for (path, size), url in zip(batch, urls):
+        if url in known:
+            continue
+        count += 1
+        reclaimed += size if dry_run else _remove(path)
+    return count, reclaimed
+
+
+def gc_orphan_files(db: Session, dry_run: bool = False, batch_size: int = 1000,
+                    grace_seconds: int = GC_GRACE_SECONDS) -> Tuple[int, int]:
+    """Delete files on disk that no FileUpload or FileArtifact row points to; (files, bytes)."""
+    cutoff = time.time() - grace_seconds
+    count = reclaimed = 0
+    batch: List[Tuple[str, int]] = []
+    for entry in walk_files(UPLOAD_ROOT):
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime > cutoff:
+            continue
+        batch.append((entry.path, stat.st_size))
+        if len(batch) >= batch_size:
+            c, r = _collect_orphan_files(db, batch, dry_run)
+            count, reclaimed, batch = count + c, reclaimed + r, []
+    if batch:
+        c, r = _collect_orphan_files(db, batch, dry_run)
+        count, reclaimed = count + c, reclaimed + r
+    return count, reclaimed
+
+
+def delete_files(db: Session, files: List[FileUpload], remove_from_disk: bool = True, commit: bool = True) -> int:
+    """Delete FileUpload rows (and their artifacts), release their usage; returns bytes freed. Commits unless told not to."""
+    if not files:
+        return 0
+    ids = [f.id for f in files]
+    freed = 0
+    artifacts = db.query(FileArtifact.file_url).filter(FileArtifact.file_id.in_(ids), FileArtifact.file_url.isnot(None))
+    if remove_from_disk:
+        for (url,) in artifacts:
+            _remove(disk_path(url))
+    for f in files:
+        if remove_from_disk:
+            freed += _remove(disk_path(f.file_url))
+        adjust_usage(db, f.project_id, f.uploaded_by, -(f.file_size or 0))
+    db.execute(delete(FileArtifact).where(FileArtifact.file_id.in_(ids)), execution_options={"synchronize_session": False})
+    # Completed resumable uploads keep pointing at their file until they expire.
+    db.execute(delete(UploadSession).where(UploadSession.file_id.in_(ids)), execution_options={"synchronize_session": False})
+    db.execute(delete(FileUpload).where(FileUpload.id.in_(ids)), execution_options={"synchronize_session": False})
+    if commit:
+        db.commit()
+    return freed
+
+
+def gc_orphan_rows(db: Session, dry_run: bool = False, batch_size: int = 1000) -> int:
+    """Delete FileUpload rows whose file is missing on disk; returns how many."""
+    removed = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(FileUpload)
+            .filter(FileUpload.id > last_id)
+            .order_by(FileUpload.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return removed
+        last_id = rows[-1].id
+        missing = [f for f in rows if not os.path.exists(disk_path(f.file_url))]
+        removed += len(missing)
+        if missing and not dry_run:
+            delete_files(db, missing, remove_from_disk=False)
+
+
+def purge_cancelled(db: Session, older_than_days: int, dry_run: bool = False, batch_size: int = 500) -> Tuple[int, int]:
+    """Delete the files of projects cancelled more than `older_than_days` ago; (files, bytes)."""
+    cutoff = utcnow() - timedelta(days=older_than_days)
+    projects = db.query(Project.id).filter(
+        Project.status == ProjectStatus.CANCELLED,
+        func.coalesce(Project.updated_at, Project.created_at) < cutoff,
+    )
+    if dry_run:
+        count, total = (
+            db.query(func.count(FileUpload.id), func.coalesce(func.sum(FileUpload.file_size), 0))
+            .filter(FileUpload.project_id.in_(projects.scalar_subquery()))
+            .one()
+        )
+        return count, int(total)
+    count = freed = 0
+    for (project_id,) in projects.all():
+        while True:
+            files = (
+                db.query(FileUpload)
+                .filter(FileUpload.project_id == project_id)
+                .order_by(FileUpload.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not files:
+                break
+            count += len(files)
+            freed += delete_files(db, files)
+    return count, freed
+
+
+def recount_usage(db: Session) -> None:
+    """Recompute every usage counter from file_uploads, repairing any drift; commits."""
+    project_total = (
+        db.query(func.coalesce(func.sum(FileUpload.file_size), 0))
+        .filter(FileUpload.project_id == Project.id)
+        .scalar_subquery()
+    )
+    user_total = (
+        db.query(func.coalesce(func.sum(FileUpload.file_size), 0))
+        .filter(FileUpload.uploaded_by == User.id)
+        .scalar_subquery()
+    )
+    db.execute(update(Project).values(storage_bytes=project_total), execution_options={"synchronize_session": False})
+    db.execute(update(User).values(storage_bytes=user_total), execution_options={"synchronize_session": False})
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain project file storage")
+    parser.add_argument("--expire-sessions", action="store_true", help="Remove expired upload sessions")
+    parser.add_argument("--gc", action="store_true", help="Remove orphaned files and orphaned file rows")
+    parser.add_argument("--purge-cancelled-days", type=int, default=None,
+                        help="Also delete files of projects cancelled more than this many days ago")
+    parser.add_argument("--recount", action="store_true", help="Recompute usage counters from file_uploads")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be removed")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--grace-seconds", type=int, default=GC_GRACE_SECONDS)
+    args = parser.parse_args()
+
+    if not (args.expire_sessions or args.gc or args.recount or args.purge_cancelled_days is not None):
+        parser.print_help()
+        return
+
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        if args.expire_sessions:
+            print(f"Removed {expire_sessions(session)} expired upload sessions")
+        if args.purge_cancelled_days is not None:
+            files, freed = purge_cancelled(session, args.purge_cancelled_days, dry_run=args.dry_run)
+            print(f"Cancelled projects: {files} files, {freed} bytes")
+        if args.gc:
+            files, freed = gc_orphan_files(session, args.dry_run, args.batch_size, args.grace_seconds)
+            print(f"Orphaned files: {files}, {freed} bytes")
+            print(f"Orphaned rows: {gc_orphan_rows(session, args.dry_run, args.batch_size)}")
+        if args.recount and not args.dry_run:
+            recount_usage(session)
+            print("Usage counters recomputed")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import os
 import shutil
 import tempfile
+from datetime import datetime, timedelta
+
+import pytest
 from fastapi.testclient import TestClient
 
 
@@ -10,6 +13,8 @@ os.environ["SECRET_KEY"] = "test-secret"
 os.environ["ALGORITHM"] = "HS256"
 os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"] = "60"
 os.environ["UPLOAD_DIR"] = "test_uploads"
+os.environ["UPLOAD_STAGING_DIR"] = "test_upload_staging"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
 
 import database  # noqa: E402
 from main import app  # noqa: E402
@@ -22,8 +27,9 @@ def setup_module(module):
     # Fresh DB and uploads directory
     if os.path.exists("test.db"):
         os.remove("test.db")
-    if os.path.exists("test_uploads"):
-        shutil.rmtree("test_uploads")
+    for directory in ("test_uploads", "test_upload_staging"):
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
     database.Base.metadata.create_all(bind=database.engine)
 
 
@@ -148,3 +154,928 @@ def test_project_and_proposal_flow_and_files_and_stats():
     assert r.status_code == 200
     stats_exec = r.json()
     assert stats_exec["proposals_count"] >= 1
+
+
+def test_recommended_executors_ranks_matching_skills():
+    register_user("exec2@example.com", "pass123", "Executor Two", "executor")
+    exec_token = login("exec2@example.com", "pass123")
+    r = client.put(
+        "/users/me",
+        json={"skills": ["fastapi", "postgresql"], "bio": "Backend developer"},
+        headers=auth_headers(exec_token),
+    )
+    assert r.status_code == 200, r.text
+
+    emp_token = login("emp@example.com", "pass123")
+    r = client.post(
+        "/projects",
+        json={"title": "API backend", "description": "Build a FastAPI service", "requirements": "fastapi postgresql"},
+        headers=auth_headers(emp_token),
+    )
+    assert r.status_code == 200, r.text
+    project_id = r.json()["id"]
+
+    r = client.get(f"/projects/{project_id}/recommended-executors", headers=auth_headers(emp_token))
+    assert r.status_code == 200, r.text
+    ranked = r.json()
+    assert ranked[0]["executor"]["email"] == "exec2@example.com"
+    assert ranked[0]["score"] > 0
+
+    r = client.get(f"/projects/{project_id}/recommended-executors", headers=auth_headers(exec_token))
+    assert r.status_code == 403
+
+
+def test_project_feed_ranks_matching_open_projects():
+    exec_token = login("exec2@example.com", "pass123")
+    emp_token = login("emp@example.com", "pass123")
+    r = client.post(
+        "/projects",
+        json={"title": "Unrelated", "description": "Logo design only", "requirements": "illustrator"},
+        headers=auth_headers(emp_token),
+    )
+    assert r.status_code == 200, r.text
+    r = client.post(
+        "/projects",
+        json={"title": "Data API", "description": "FastAPI on PostgreSQL", "budget": 5000.0},
+        headers=auth_headers(emp_token),
+    )
+    assert r.status_code == 200, r.text
+    newest = r.json()["id"]
+
+    r = client.get("/feed/projects", headers=auth_headers(exec_token))
+    assert r.status_code == 200, r.text
+    titles = [p["title"] for p in r.json()]
+    assert r.json()[0]["id"] == newest
+    assert "Unrelated" not in titles
+
+    r = client.get("/feed/projects", headers=auth_headers(emp_token))
+    assert r.status_code == 403
+
+
+def test_similar_ideas_detected_on_submission():
+    register_user("creator@example.com", "pass123", "Creator One", "idea_creator")
+    token = login("creator@example.com", "pass123")
+    base = {
+        "title": "Online marketplace for handmade carpets",
+        "description": "A platform where weavers sell handmade Persian carpets directly to buyers worldwide",
+    }
+    r = client.post("/ideas", json=base, headers=auth_headers(token))
+    assert r.status_code == 200, r.text
+    original_id = r.json()["id"]
+    assert "X-Similar-Ideas" not in r.headers
+
+    near_copy = dict(base, description=base["description"] + " with secure payment")
+    r = client.post("/ideas", json=near_copy, headers=auth_headers(token))
+    assert r.status_code == 200, r.text
+    assert r.headers["X-Similar-Ideas"].split(",")[0] == str(original_id)
+
+    r = client.get(f"/ideas/{original_id}/similar")
+    assert r.status_code == 200, r.text
+    similar = r.json()
+    assert similar[0]["similarity"] >= 0.5
+
+
+def test_similar_ideas_skips_ideas_deleted_after_lookup(monkeypatch):
+    import similarity
+
+    ids = [idea["id"] for idea in client.get("/ideas").json()]
+    found = similarity.find_similar
+    monkeypatch.setattr(
+        similarity, "find_similar", lambda *a, **kw: [(max(ids) + 1000, 0.9)] + found(*a, **kw)
+    )
+    r = client.get(f"/ideas/{ids[-1]}/similar")
+    assert r.status_code == 200, r.text
+    assert all(item["id"] in ids for item in r.json())
+
+
+def test_readiness_reflects_lifespan_and_draining():
+    import lifecycle
+
+    with TestClient(app) as live_client:
+        r = live_client.get("/health/ready")
+        assert r.status_code == 200, r.text
+        assert r.json()["database"]["ok"] is True
+
+        lifecycle.state.draining = True
+        try:
+            assert live_client.get("/health/ready").status_code == 503
+        finally:
+            lifecycle.state.draining = False
+    assert lifecycle.state.ready is False
+
+
+def test_sigterm_drains_before_stopping():
+    import asyncio
+    import lifecycle
+
+    # The lifespan shutdown in earlier tests leaves the flag set.
+    lifecycle.state.draining = False
+    loop = asyncio.new_event_loop()
+    stopped = []
+    try:
+        # A safety stop, so a regression fails the test instead of hanging the run.
+        loop.call_later(5, loop.stop)
+        lifecycle.begin_draining(loop, lambda: (stopped.append(lifecycle.state.draining), loop.stop()), delay=0.05)
+        assert lifecycle.state.draining is True
+        assert stopped == []
+        lifecycle.begin_draining(loop, lambda: stopped.append("again"), delay=0)
+        loop.run_forever()
+        assert stopped == [True]
+    finally:
+        loop.close()
+        lifecycle.state.draining = False
+
+
+def test_parallel_acceptance_has_exactly_one_winner():
+    import threading
+
+    emp_token = login("emp@example.com", "pass123")
+    r = client.post(
+        "/projects",
+        json={"title": "Contested", "description": "Several executors bid on this"},
+        headers=auth_headers(emp_token),
+    )
+    assert r.status_code == 200, r.text
+    project_id = r.json()["id"]
+
+    proposal_ids = []
+    for i in range(4):
+        email = f"bidder{i}@example.com"
+        register_user(email, "pass123", f"Bidder {i}", "executor")
+        r = client.post(
+            "/proposals",
+            json={"project_id": project_id, "proposed_price": 100.0 + i, "cover_letter": "Pick me"},
+            headers=auth_headers(login(email, "pass123")),
+        )
+        assert r.status_code == 200, r.text
+        proposal_ids.append(r.json()["id"])
+
+    barrier = threading.Barrier(len(proposal_ids))
+    codes = {}
+
+    def accept(proposal_id):
+        barrier.wait()
+        r = client.put(f"/proposals/{proposal_id}", json={"status": "accepted"}, headers=auth_headers(emp_token))
+        codes[proposal_id] = r.status_code
+
+    threads = [threading.Thread(target=accept, args=(pid,)) for pid in proposal_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    winners = [pid for pid, code in codes.items() if code == 200]
+    assert len(winners) == 1, codes
+    assert sorted(codes.values()) == [200, 409, 409, 409]
+
+    r = client.get(f"/projects/{project_id}/proposals", headers=auth_headers(emp_token))
+    statuses = {p["id"]: p["status"] for p in r.json()}
+    assert statuses.pop(winners[0]) == "accepted"
+    assert set(statuses.values()) == {"rejected"}
+    project = client.get(f"/projects/{project_id}").json()
+    assert project["status"] == "in_progress"
+    assert project["executor_id"] is not None
+
+
+def test_project_timeline_pages_newest_first():
+    emp_token = login("emp@example.com", "pass123")
+    exec_token = login("exec2@example.com", "pass123")
+    r = client.post("/projects", json={"title": "Timeline", "description": "History"}, headers=auth_headers(emp_token))
+    assert r.status_code == 200, r.text
+    project_id = r.json()["id"]
+    r = client.post("/proposals", json={"project_id": project_id, "proposed_price": 50.0}, headers=auth_headers(exec_token))
+    assert r.status_code == 200, r.text
+    proposal = r.json()
+    r = client.put(f"/proposals/{proposal['id']}", json={"status": "accepted"}, headers=auth_headers(emp_token))
+    assert r.status_code == 200, r.text
+    r = client.post(
+        "/messages",
+        json={"project_id": project_id, "receiver_id": proposal["executor_id"], "content": "Welcome aboard"},
+        headers=auth_headers(emp_token),
+    )
+    assert r.status_code == 200, r.text
+
+    r = client.get(f"/projects/{project_id}/timeline?limit=2", headers=auth_headers(exec_token))
+    assert r.status_code == 200, r.text
+    page = r.json()
+    assert [e["kind"] for e in page["items"]] == ["message.sent", "proposal.accepted"]
+    assert page["items"][0]["data"]["preview"] == "Welcome aboard"
+    assert page["items"][0]["actor_name"] == "Employer One"
+
+    r = client.get(
+        f"/projects/{project_id}/timeline?limit=2&before={page['next_before']}", headers=auth_headers(exec_token)
+    )
+    page = r.json()
+    assert [e["kind"] for e in page["items"]] == ["proposal.created", "project.created"]
+    assert page["next_before"] is None
+
+    outsider = login("bidder0@example.com", "pass123")
+    assert client.get(f"/projects/{project_id}/timeline", headers=auth_headers(outsider)).status_code == 403
+
+
+def test_notifications_counter_push_and_digest():
+    import notifications
+
+    emp_token = login("emp@example.com", "pass123")
+    exec_token = login("exec2@example.com", "pass123")
+    before = client.get("/notifications/unread-count", headers=auth_headers(exec_token)).json()["unread"]
+
+    r = client.post("/projects", json={"title": "Notify", "description": "Ping"}, headers=auth_headers(emp_token))
+    project_id = r.json()["id"]
+    r = client.post("/proposals", json={"project_id": project_id}, headers=auth_headers(exec_token))
+    proposal = r.json()
+
+    with client.websocket_connect(f"/ws/notifications?token={exec_token}") as ws:
+        r = client.put(f"/proposals/{proposal['id']}", json={"status": "accepted"}, headers=auth_headers(emp_token))
+        assert r.status_code == 200, r.text
+        for i in range(3):
+            r = client.post(
+                "/messages",
+                json={"project_id": project_id, "receiver_id": proposal["executor_id"], "content": f"Update {i}"},
+                headers=auth_headers(emp_token),
+            )
+            assert r.status_code == 200, r.text
+        pushed = [ws.receive_json() for _ in range(4)]
+    assert [p["kind"] for p in pushed] == ["proposal.accepted"] + ["message.sent"] * 3
+    assert pushed[-1]["data"]["preview"] == "Update 2"
+
+    r = client.get("/notifications/unread-count", headers=auth_headers(exec_token))
+    assert r.json()["unread"] == before + 4
+    page = client.get("/notifications?limit=2", headers=auth_headers(exec_token)).json()
+    assert [n["kind"] for n in page["items"]] == ["message.sent", "message.sent"]
+    r = client.post(f"/notifications/{page['items'][0]['id']}/read", headers=auth_headers(exec_token))
+    assert r.json()["unread"] == before + 3
+
+    # The employer was notified of the proposal, never of their own actions
+    emp_page = client.get("/notifications", headers=auth_headers(emp_token)).json()
+    assert "message.sent" not in {n["kind"] for n in emp_page["items"]}
+    assert "proposal.created" in {n["kind"] for n in emp_page["items"]}
+
+    # One digest per user coalesces everything still unread; nothing is sent twice
+    mailer = notifications.MemoryMailer()
+    db = database.SessionLocal()
+    try:
+        later = datetime.utcnow() + timedelta(hours=1)
+        notifications.send_digests(db, mailer, now=later)
+        to_exec = [m for m in mailer.outbox if m["To"] == "exec2@example.com"]
+        assert len(to_exec) == 1
+        body = to_exec[0].get_content()
+        assert "Update 1" in body and "Update 2" not in body
+        assert notifications.send_digests(db, mailer, now=later) == 0
+    finally:
+        db.close()
+
+    r = client.post("/notifications/read-all", headers=auth_headers(exec_token))
+    assert client.get("/notifications/unread-count", headers=auth_headers(exec_token)).json()["unread"] == 0
+
+    with pytest.raises(Exception):
+        with client.websocket_connect("/ws/notifications?token=bogus"):
+            pass
+
+
+def test_push_hub_falls_back_to_local_delivery_while_redis_is_down(caplog):
+    import logging
+    import time
+    import notifications
+
+    hub = notifications.PushHub("redis://127.0.0.1:1/0")
+    delivered = []
+    hub.deliver = lambda user_id, payload: delivered.append(user_id)
+    with caplog.at_level(logging.WARNING, logger="masna.notifications"):
+        for user_id in range(5):
+            hub.publish(user_id, {"kind": "message.sent"})
+        hub.wait_published()
+    assert delivered == [0, 1, 2, 3, 4]
+    # One warning when the breaker opens, not one per push; Redis is left alone until the backoff passes
+    assert [r.getMessage().startswith("Redis publish failed") for r in caplog.records] == [True]
+    assert hub._retry_at > time.monotonic()
+
+
+def test_resumable_upload_survives_retries_and_verifies_checksum():
+    import hashlib
+    import storage
+
+    emp_token = login("emp@example.com", "pass123")
+    r = client.post("/projects", json={"title": "Big delivery", "description": "Large files"}, headers=auth_headers(emp_token))
+    project_id = r.json()["id"]
+    content = os.urandom(300_000)
+
+    r = client.post(
+        f"/projects/{project_id}/uploads",
+        json={"filename": "video.bin", "size": len(content), "sha256": hashlib.sha256(content).hexdigest()},
+        headers=auth_headers(emp_token),
+    )
+    assert r.status_code == 201, r.text
+    session_url = r.headers["Location"]
+
+    r = client.put(f"{session_url}?offset=0", content=content[:100_000], headers=auth_headers(emp_token))
+    assert r.json()["offset"] == 100_000
+    # The response was "lost": resending an overlapping chunk only appends the new bytes
+    r = client.put(f"{session_url}?offset=50000", content=content[50_000:200_000], headers=auth_headers(emp_token))
+    assert r.headers["Upload-Offset"] == "200000"
+    # Skipping ahead is refused with the offset to resume from
+    r = client.put(f"{session_url}?offset=250000", content=content[250_000:], headers=auth_headers(emp_token))
+    assert r.status_code == 409
+    assert r.headers["Upload-Offset"] == "200000"
+
+    r = client.head(session_url, headers=auth_headers(emp_token))
+    resume_at = int(r.headers["Upload-Offset"])
+    r = client.put(f"{session_url}?offset={resume_at}", content=content[resume_at:], headers=auth_headers(emp_token))
+    assert r.status_code == 200, r.text
+    finished = r.json()
+    assert finished["completed_at"] is not None
+    assert finished["file"]["file_size"] == len(content)
+
+    files = client.get(f"/projects/{project_id}/files", headers=auth_headers(emp_token)).json()
+    assert [f["filename"] for f in files] == ["video.bin"]
+    stored = os.path.join("test_uploads", files[0]["file_url"].split("/uploads/", 1)[1])
+    with open(stored, "rb") as f:
+        assert f.read() == content
+
+    # A racing duplicate of the last chunk finds completion already claimed and records nothing
+    db = database.SessionLocal()
+    try:
+        assert storage.complete_session(db, db.get(database.UploadSession, finished["id"])) is None
+    finally:
+        db.close()
+    assert len(client.get(f"/projects/{project_id}/files", headers=auth_headers(emp_token)).json()) == 1
+
+    # A corrupted upload is rejected and discarded
+    r = client.post(
+        f"/projects/{project_id}/uploads",
+        json={"filename": "broken.bin", "size": 10, "sha256": "0" * 64},
+        headers=auth_headers(emp_token),
+    )
+    broken_url = r.headers["Location"]
+    r = client.put(f"{broken_url}?offset=0", content=b"x" * 10, headers=auth_headers(emp_token))
+    assert r.status_code == 422
+    assert client.head(broken_url, headers=auth_headers(emp_token)).status_code == 404
+
+    # Abandoned sessions expire with their staged bytes
+    r = client.post(
+        f"/projects/{project_id}/uploads", json={"filename": "stale.bin", "size": 10}, headers=auth_headers(emp_token)
+    )
+    stale_id = r.json()["id"]
+    db = database.SessionLocal()
+    try:
+        assert storage.expire_sessions(db, now=datetime.utcnow() + timedelta(days=2)) >= 1
+    finally:
+        db.close()
+    assert not os.path.exists(storage.staging_path(stale_id))
+
+
+def test_uploads_get_thumbnails_previews_and_listings():
+    import io
+    import zipfile
+    import media
+    from PIL import Image
+
+    emp_token = login("emp@example.com", "pass123")
+    r = client.post("/projects", json={"title": "Media", "description": "Previews"}, headers=auth_headers(emp_token))
+    project_id = r.json()["id"]
+
+    image = io.BytesIO()
+    Image.new("RGB", (1200, 800), (200, 30, 30)).save(image, "PNG")
+    pdf = io.BytesIO()
+    Image.new("RGB", (600, 800), (255, 255, 255)).save(pdf, "PDF")
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("src/main.py", "print('hi')\n")
+        zf.writestr("README.md", "# Delivery\n")
+    uploads = [
+        ("design.png", image.getvalue(), "image/png"),
+        ("spec.pdf", pdf.getvalue(), "application/pdf"),
+        ("source.zip", archive.getvalue(), "application/zip"),
+        ("notes.txt", b"plain", "text/plain"),
+    ]
+    for name, content, content_type in uploads:
+        r = client.post(
+            f"/projects/{project_id}/files",
+            files={"file": (name, content, content_type)},
+            headers=auth_headers(emp_token),
+        )
+        assert r.status_code == 200, r.text
+
+    media.processor.drain(timeout=60)
+    files = {f["filename"]: f for f in client.get(f"/projects/{project_id}/files", headers=auth_headers(emp_token)).json()}
+
+    assert files["notes.txt"]["processing_status"] == "skipped"
+    thumb = files["design.png"]["artifacts"][0]
+    assert files["design.png"]["processing_status"] == "done"
+    assert thumb["kind"] == "thumbnail" and max(thumb["width"], thumb["height"]) == 320
+    assert client.get(thumb["file_url"]).status_code == 200
+    assert {a["kind"] for a in files["spec.pdf"]["artifacts"]} == {"preview", "thumbnail"}
+    listing = files["source.zip"]["artifacts"][0]
+    assert listing["kind"] == "listing"
+    assert sorted(e["name"] for e in listing["data"]["entries"]) == ["README.md", "src/main.py"]
+
+
+def post_streamed_upload(path, token, declare_length, chunk=b"x" * 64 * 1024, count=48):
+    """POST a multipart file straight to the ASGI app; (status, body messages read, body messages sent)."""
+    import asyncio
+
+    boundary = "quota-test"
+    parts = [
+        (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="big.bin"\r\n'
+         "Content-Type: application/octet-stream\r\n\r\n").encode()
+    ] + [chunk] * count + [f"\r\n--{boundary}--\r\n".encode()]
+    read, messages = [], []
+
+    async def receive():
+        if len(read) < len(parts):
+            read.append(parts[len(read)])
+            return {"type": "http.request", "body": read[-1], "more_body": len(read) < len(parts)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    headers = [
+        (b"content-type", f"multipart/form-data; boundary={boundary}".encode()),
+        (b"authorization", f"Bearer {token}".encode()),
+    ]
+    if declare_length:
+        headers.append((b"content-length", str(sum(map(len, parts))).encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": headers,
+        "server": ("testserver", 80), "client": ("testclient", 50000),
+    }
+    asyncio.run(app(scope, receive, send))
+    status = next(m["status"] for m in messages if m["type"] == "http.response.start")
+    return status, len(read), len(parts)
+
+
+def test_storage_counters_quota_and_gc(monkeypatch):
+    import storage
+
+    exec_token = login("exec2@example.com", "pass123")
+    emp_token = login("emp@example.com", "pass123")
+    r = client.post("/projects", json={"title": "Quota", "description": "Disk"}, headers=auth_headers(emp_token))
+    project_id = r.json()["id"]
+    before = client.get("/users/me/storage", headers=auth_headers(emp_token)).json()["used_bytes"]
+
+    for name in ("a.txt", "b.txt"):
+        r = client.post(
+            f"/projects/{project_id}/files", files={"file": (name, b"x" * 1000, "text/plain")}, headers=auth_headers(emp_token)
+        )
+        assert r.status_code == 200, r.text
+    usage = client.get(f"/projects/{project_id}/storage", headers=auth_headers(emp_token)).json()
+    assert usage["used_bytes"] == 2000
+    assert client.get("/users/me/storage", headers=auth_headers(emp_token)).json()["used_bytes"] == before + 2000
+    assert client.get(f"/projects/{project_id}/storage", headers=auth_headers(exec_token)).status_code == 403
+
+    monkeypatch.setattr(storage, "PROJECT_QUOTA_BYTES", 2500)
+    r = client.post(
+        f"/projects/{project_id}/files", files={"file": ("c.txt", b"x" * 1000, "text/plain")}, headers=auth_headers(emp_token)
+    )
+    assert r.status_code == 413
+    # An oversized body is refused from its Content-Length, or as soon as an undeclared one outgrows the quota
+    status, read, total = post_streamed_upload(f"/projects/{project_id}/files", emp_token, declare_length=True)
+    assert (status, read) == (413, 0)
+    status, read, total = post_streamed_upload(f"/projects/{project_id}/files", emp_token, declare_length=False)
+    assert status == 413
+    assert read < total
+    r = client.post(f"/projects/{project_id}/uploads", json={"filename": "d.bin", "size": 1000}, headers=auth_headers(emp_token))
+    assert r.status_code == 413
+    assert len(os.listdir(os.path.join("test_uploads", f"project_{project_id}"))) == 2
+
+    # One file vanished from disk, and a stray file has no row
+    files = client.get(f"/projects/{project_id}/files", headers=auth_headers(emp_token)).json()
+    os.remove(storage.disk_path(files[0]["file_url"]))
+    stray = os.path.join("test_uploads", f"project_{project_id}", "stray.tmp")
+    with open(stray, "wb") as f:
+        f.write(b"y" * 300)
+
+    db = database.SessionLocal()
+    try:
+        assert storage.gc_orphan_files(db, dry_run=True, grace_seconds=0) == (1, 300)
+        assert os.path.exists(stray)
+        assert storage.gc_orphan_files(db, batch_size=2, grace_seconds=0) == (1, 300)
+        assert storage.gc_orphan_rows(db) == 1
+    finally:
+        db.close()
+    assert not os.path.exists(stray)
+    remaining = client.get(f"/projects/{project_id}/files", headers=auth_headers(emp_token)).json()
+    assert [f["id"] for f in remaining] == [files[1]["id"]]
+    assert client.get(f"/projects/{project_id}/storage", headers=auth_headers(emp_token)).json()["used_bytes"] == 1000
+
+
+def test_gc_of_a_resumable_upload_respects_foreign_keys():
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    import storage
+
+    emp_token = login("emp@example.com", "pass123")
+    project_id = client.post(
+        "/projects", json={"title": "GC", "description": "Resumed"}, headers=auth_headers(emp_token)
+    ).json()["id"]
+    r = client.post(f"/projects/{project_id}/uploads", json={"filename": "gone.bin", "size": 10}, headers=auth_headers(emp_token))
+    r = client.put(f"{r.headers['Location']}?offset=0", content=b"z" * 10, headers=auth_headers(emp_token))
+    assert r.status_code == 200, r.text
+    os.remove(storage.disk_path(r.json()["file"]["file_url"]))
+
+    # SQLite only enforces the upload_sessions.file_id reference when asked to, as PostgreSQL always does.
+    engine = create_engine("sqlite:///./test.db")
+    event.listen(engine, "connect", lambda conn, record: conn.execute("PRAGMA foreign_keys=ON"))
+    db = sessionmaker(bind=engine)()
+    try:
+        assert storage.gc_orphan_rows(db) >= 1
+        assert db.query(database.UploadSession).filter(database.UploadSession.project_id == project_id).count() == 0
+    finally:
+        db.close()
+        engine.dispose()
+    assert client.get(f"/projects/{project_id}/files", headers=auth_headers(emp_token)).json() == []
+
+
+def test_sql_profiler_attributes_statements_and_logs_slow_queries(monkeypatch):
+    import sqlprofile
+
+    register_user("admin@example.com", "pass123", "Admin", "admin")
+    admin_token = login("admin@example.com", "pass123")
+    emp_token = login("emp@example.com", "pass123")
+    monkeypatch.setattr(sqlprofile, "SQL_PROFILE_KEY", "secret")
+    monkeypatch.setattr(sqlprofile.slow_queries, "threshold_ms", 0.0)
+    sqlprofile.slow_queries.reset()
+
+    r = client.get("/proposals/me", headers=auth_headers(emp_token))
+    assert "x-sql-profile-id" not in r.headers
+    r = client.get("/proposals/me", headers=dict(auth_headers(emp_token), **{"X-SQL-Profile": "wrong"}))
+    assert "x-sql-profile-id" not in r.headers
+
+    r = client.get("/proposals/me", headers=dict(auth_headers(emp_token), **{"X-SQL-Profile": "secret"}))
+    assert r.status_code == 200
+    queries = int(r.headers["x-sql-queries"])
+    assert queries >= 1
+    profile_id = r.headers["x-sql-profile-id"]
+
+    assert client.get(f"/admin/sql/profiles/{profile_id}", headers=auth_headers(emp_token)).status_code == 403
+    profile = client.get(f"/admin/sql/profiles/{profile_id}", headers=auth_headers(admin_token)).json()
+    assert profile["endpoint"] == "get_my_proposals"
+    assert profile["query_count"] == queries == len(profile["statements"])
+    callers = {s["caller"].split(" ")[-1] for s in profile["statements"] if s["caller"]}
+    assert "get_my_proposals" in callers
+    assert all("'" not in s["parameters"] for s in profile["statements"])
+    listed = client.get("/admin/sql/profiles", headers=auth_headers(admin_token)).json()
+    assert listed[0]["id"] == int(profile_id)
+
+    top = client.get("/admin/sql/slow-queries?order_by=count", headers=auth_headers(admin_token)).json()
+    assert top and top[0]["count"] >= 2
+    assert any("get_my_proposals" in e["endpoints"] for e in top)
+    assert client.get("/admin/sql/slow-queries?order_by=bogus", headers=auth_headers(admin_token)).status_code == 400
+    sqlprofile.slow_queries.reset()
+
+
+def test_cleanup_deletes_duplicate_projects_with_their_rows():
+    import cleanup_db
+    import storage
+    from sqlalchemy import update
+    from database import FileUpload, Notification, Project, ProjectEvent, Proposal, UploadSession, User
+
+    emp_token = login("emp@example.com", "pass123")
+    idea_id = client.post("/ideas", json={"title": "Duplicated idea", "description": "Two projects"},
+                          headers=auth_headers(login("creator@example.com", "pass123"))).json()["id"]
+    duplicate_id = client.post("/projects", json={"title": "Duplicate", "description": "d", "idea_id": idea_id},
+                               headers=auth_headers(emp_token)).json()["id"]
+    r = client.post("/proposals", json={"project_id": duplicate_id}, headers=auth_headers(login("bidder0@example.com", "pass123")))
+    assert r.status_code == 200, r.text
+    r = client.post(f"/projects/{duplicate_id}/files", files={"file": ("dup.txt", b"x" * 100, "text/plain")},
+                    headers=auth_headers(emp_token))
+    assert r.status_code == 200, r.text
+    stored = storage.disk_path(r.json()["file_url"])
+    session_id = client.post(f"/projects/{duplicate_id}/uploads", json={"filename": "dup.bin", "size": 10},
+                             headers=auth_headers(emp_token)).json()["id"]
+    kept_id = client.post("/projects", json={"title": "Kept", "description": "d"}, headers=auth_headers(emp_token)).json()["id"]
+
+    db = database.SessionLocal()
+    try:
+        db.execute(update(Project).where(Project.id == kept_id).values(idea_id=idea_id))
+        db.commit()
+        unread = {u.id: u.unread_notifications for u in db.query(User)}
+        assert db.query(Notification).filter(Notification.project_id == duplicate_id).count() >= 1
+        assert cleanup_db.cleanup_duplicates(db, delete=True) == 1
+        assert db.get(Project, duplicate_id) is None and db.get(Project, kept_id) is not None
+        for model in (Proposal, FileUpload, UploadSession, ProjectEvent, Notification):
+            assert db.query(model).filter(model.project_id == duplicate_id).count() == 0
+        # Notifications stay, so unread counters still match
+        assert {u.id: u.unread_notifications for u in db.query(User)} == unread
+    finally:
+        db.close()
+    assert not os.path.exists(stored) and not os.path.exists(storage.staging_path(session_id))
+
+
+def test_message_partitioning_only_ensures_index_on_sqlite():
+    import message_partitions
+    from sqlalchemy import inspect
+
+    engine = database.get_engine()
+    assert message_partitions.migrate(engine) == "unsupported"
+    assert "ix_messages_project_id_id" in {i["name"] for i in inspect(engine).get_indexes("messages")}
+
+
+def test_admin_analytics_served_from_incremental_rollups():
+    import analytics
+    from database import Idea, Project, Proposal, ProposalStatus
+
+    admin_token = login("admin@example.com", "pass123")
+    emp_token = login("emp@example.com", "pass123")
+    db = database.SessionLocal()
+    try:
+        assert analytics.run_rollup(db) >= 1
+        ideas, projects, proposals = db.query(Idea).count(), db.query(Project).count(), db.query(Proposal).count()
+        accepted = db.query(Proposal).filter(Proposal.status == ProposalStatus.ACCEPTED).count()
+        rejected = db.query(Proposal).filter(Proposal.status == ProposalStatus.REJECTED).count()
+    finally:
+        db.close()
+
+    assert client.get("/admin/analytics/summary", headers=auth_headers(emp_token)).status_code == 403
+    summary = client.get("/admin/analytics/summary", headers=auth_headers(admin_token)).json()
+    assert (summary["new_ideas"], summary["new_projects"], summary["new_proposals"]) == (ideas, projects, proposals)
+    assert summary["acceptance_rate"] == pytest.approx(accepted / (accepted + rejected))
+    assert sum(summary["projects_by_status"].values()) == projects
+    assert summary["computed_at"] is not None
+
+    days = client.get("/admin/analytics/daily", headers=auth_headers(admin_token)).json()
+    today = days[-1]
+    assert today["new_projects"] == projects
+    assert today["median_proposed_price"] is not None and today["proposals_per_project"] >= 1
+
+    # A new project shows up after the next incremental round
+    r = client.post("/projects", json={"title": "Counted", "description": "Rollup"}, headers=auth_headers(emp_token))
+    assert r.status_code == 200
+    db = database.SessionLocal()
+    try:
+        assert analytics.run_rollup(db, lookback_days=0) == 1
+    finally:
+        db.close()
+    summary = client.get("/admin/analytics/summary?days=1", headers=auth_headers(admin_token)).json()
+    assert summary["new_projects"] == projects + 1
+    assert summary["projects_by_status"]["new"] >= 1
+    assert client.get("/admin/analytics/daily?start=2030-01-02&end=2030-01-01",
+                      headers=auth_headers(admin_token)).status_code == 400
+
+    # A proposal decided weeks after it was made updates its own day on the next incremental round
+    from sqlalchemy import update
+    from database import DailyStats
+
+    project_id = client.post("/projects", json={"title": "Slow decision", "description": "Rollup"},
+                             headers=auth_headers(emp_token)).json()["id"]
+    proposal = client.post("/proposals", json={"project_id": project_id, "proposed_price": 10.0},
+                           headers=auth_headers(login("bidder1@example.com", "pass123"))).json()
+    made = datetime.utcnow() - timedelta(days=30)
+    db = database.SessionLocal()
+    try:
+        db.execute(update(Project).where(Project.id == project_id).values(created_at=made))
+        db.execute(update(Proposal).where(Proposal.id == proposal["id"]).values(created_at=made))
+        db.commit()
+        analytics.run_rollup(db, full=True)
+        assert db.get(DailyStats, made.date()).accepted_proposals == 0
+    finally:
+        db.close()
+    r = client.put(f"/proposals/{proposal['id']}", json={"status": "accepted"}, headers=auth_headers(emp_token))
+    assert r.status_code == 200, r.text
+    db = database.SessionLocal()
+    try:
+        assert analytics.run_rollup(db, lookback_days=0) >= 30
+        assert db.get(DailyStats, made.date()).accepted_proposals == 1
+    finally:
+        db.close()
+
+
+def test_proposal_comparison_ranks_by_precomputed_scores():
+    from database import Project
+    from proposal_ranking import parse_timeline_days, timeline_score
+    from query_plans import capture_sql
+
+    assert parse_timeline_days("3 weeks") == 21
+    assert parse_timeline_days("۲ ماه") == 60
+    assert parse_timeline_days("ASAP") is None
+    # Measured against the project's fixed window, so it doesn't depend on when it is computed
+    month = Project(created_at=datetime(2026, 1, 1), deadline=datetime(2026, 1, 31))
+    assert timeline_score(10, month) == 1.0
+    assert timeline_score(60, month) == pytest.approx(0.5)
+
+    emp_token = login("emp@example.com", "pass123")
+    r = client.post(
+        "/projects",
+        json={"title": "Compare", "description": "A FastAPI backend on PostgreSQL", "budget": 1000.0},
+        headers=auth_headers(emp_token),
+    )
+    project_id = r.json()["id"]
+    bids = {
+        "exec2@example.com": (900.0, "2 weeks"),  # skills fastapi + postgresql match
+        "bidder1@example.com": (1500.0, "3 months"),
+        "bidder2@example.com": (800.0, None),
+    }
+    for email, (price, timeline) in bids.items():
+        r = client.post(
+            "/proposals",
+            json={"project_id": project_id, "proposed_price": price, "proposed_timeline": timeline},
+            headers=auth_headers(login(email, "pass123")),
+        )
+        assert r.status_code == 200, r.text
+
+    url = f"/projects/{project_id}/proposals/compare"
+    with capture_sql() as statements:
+        ranked = client.get(url, headers=auth_headers(emp_token)).json()
+    assert len([s for s in statements if "FROM proposals" in s.sql]) == 1
+    assert [row["full_name"] for row in ranked] == ["Executor Two", "Bidder 2", "Bidder 1"]
+    top = ranked[0]
+    assert top["price_ratio"] == pytest.approx(0.9) and top["timeline_days"] == 14
+    assert top["skill_score"] == 1.0 and ranked[-1]["price_score"] == pytest.approx(0.5)
+
+    by_price = client.get(url + "?sort=price", headers=auth_headers(emp_token)).json()
+    assert [row["proposed_price"] for row in by_price] == [800.0, 900.0, 1500.0]
+    within_budget = client.get(url + "?max_price_ratio=1&max_timeline_days=30", headers=auth_headers(emp_token)).json()
+    assert [row["full_name"] for row in within_budget] == ["Executor Two"]
+    assert client.get(url + "?sort=bogus", headers=auth_headers(emp_token)).status_code == 400
+    assert client.get(url, headers=auth_headers(login("exec2@example.com", "pass123"))).status_code == 403
+
+    # A rating for the executor updates the stored rating component
+    before = top["executor_rating"]
+    db = database.SessionLocal()
+    try:
+        import events
+        from database import Rating, User
+
+        bidder = db.query(User).filter(User.email == "bidder1@example.com").one()
+        db.add(Rating(rater_id=ranked[0]["executor_id"], rated_user_id=bidder.id, project_id=project_id, rating=5))
+        db.flush()
+        events.emit(db, "rating.created", project_id=project_id, rated_user_id=bidder.id, rating=5)
+        db.commit()
+    finally:
+        db.close()
+    rescored = client.get(url + "?sort=rating", headers=auth_headers(emp_token)).json()
+    assert rescored[0]["full_name"] == "Bidder 1" and rescored[0]["executor_rating"] > before
+
+
+
+def test_project_bundle_loads_page_in_one_request():
+    from query_plans import capture_sql
+
+    emp_token = login("emp@example.com", "pass123")
+    r = client.post("/projects", json={"title": "Bundle", "description": "One round trip"},
+                    headers=auth_headers(emp_token))
+    project_id = r.json()["id"]
+    for email in ("bidder0@example.com", "bidder1@example.com"):
+        r = client.post("/proposals", json={"project_id": project_id, "proposed_price": 100.0},
+                        headers=auth_headers(login(email, "pass123")))
+        assert r.status_code == 200, r.text
+
+    with capture_sql() as statements:
+        r = client.get(f"/projects/{project_id}/bundle", headers=auth_headers(emp_token))
+    assert r.status_code == 200, r.text
+    bundle = r.json()
+    assert bundle["project"]["id"] == project_id and bundle["project"]["employer"]["email"] == "emp@example.com"
+    assert [p["executor"]["full_name"] for p in bundle["proposals"]] == ["Bidder 0", "Bidder 1"]
+    assert bundle["files"] == [] and bundle["messages"] == [] and bundle["ratings"] == []
+    # Fixed query count: more proposals do not mean more queries
+    assert len(statements) <= 12
+
+    outsider = client.get(f"/projects/{project_id}/bundle", headers=auth_headers(login("bidder3@example.com", "pass123")))
+    assert outsider.status_code == 200
+    assert outsider.json()["proposals"] is None and outsider.json()["files"] is None
+    assert outsider.json()["messages"] is None
+    # Anonymous visitors see the public page; a bad token is still rejected so the client can refresh it
+    anonymous = client.get(f"/projects/{project_id}/bundle")
+    assert anonymous.status_code == 200, anonymous.text
+    assert anonymous.json()["project"]["id"] == project_id and anonymous.json()["ratings"] == []
+    assert anonymous.json()["proposals"] is None and anonymous.json()["files"] is None
+    assert anonymous.json()["messages"] is None
+    assert client.get(f"/projects/{project_id}/bundle", headers=auth_headers("not-a-token")).status_code == 401
+    assert client.get("/projects/999999/bundle", headers=auth_headers(emp_token)).status_code == 404
+
+
+def test_idempotency_key_replays_writes_without_rerunning_them():
+    from database import IdempotencyKey, Project
+    import idempotency
+
+    emp_token = login("emp@example.com", "pass123")
+    headers = dict(auth_headers(emp_token), **{"Idempotency-Key": "create-project-1"})
+    payload = {"title": "Retried", "description": "Sent twice after a timeout"}
+    first = client.post("/projects", json=payload, headers=headers)
+    assert first.status_code == 200 and "idempotent-replayed" not in first.headers
+    retry = client.post("/projects", json=payload, headers=headers)
+    assert retry.status_code == 200 and retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    db = database.SessionLocal()
+    try:
+        assert db.query(Project).filter(Project.title == "Retried").count() == 1
+    finally:
+        db.close()
+
+    # Same key, different request; the same key from another user is independent
+    changed = client.post("/projects", json=dict(payload, title="Other"), headers=headers)
+    assert changed.status_code == 422
+    other = client.post("/proposals", json={"project_id": first.json()["id"]},
+                        headers=dict(auth_headers(login("bidder0@example.com", "pass123")),
+                                     **{"Idempotency-Key": "create-project-1"}))
+    assert other.status_code == 200 and "idempotent-replayed" not in other.headers
+    assert client.post("/projects", json=payload, headers=dict(headers, **{"Idempotency-Key": ""})).status_code == 400
+
+    # Client errors are replayed too; without a key nothing is stored
+    bad = dict(auth_headers(emp_token), **{"Idempotency-Key": "bad-proposal"})
+    assert client.post("/proposals", json={"project_id": first.json()["id"]}, headers=bad).status_code == 403
+    assert client.post("/proposals", json={"project_id": first.json()["id"]}, headers=bad).headers[
+        "idempotent-replayed"] == "true"
+
+    # Concurrent duplicates: the unique row is the lock; stale and expired claims are taken over
+    db = database.SessionLocal()
+    try:
+        now = datetime.utcnow()
+        state, record = idempotency.claim(db, "user:test", "k", "fp", now=now)
+        assert state == "claimed"
+        assert idempotency.claim(db, "user:test", "k", "fp", now=now)[0] == "busy"
+        assert idempotency.claim(db, "user:test", "k", "other", now=now)[0] == "mismatch"
+        later = now + timedelta(seconds=idempotency.IDEMPOTENCY_LOCK_SECONDS + 1)
+        assert idempotency.claim(db, "user:test", "k", "fp", now=later)[0] == "claimed"
+        idempotency.complete(db, record.id, 201, [["content-type", "application/json"]], b"{}")
+        assert idempotency.claim(db, "user:test", "k", "fp", now=later)[0] == "replay"
+        expired = now + timedelta(seconds=idempotency.IDEMPOTENCY_TTL_SECONDS + 1)
+        assert idempotency.purge_expired(db, now=expired) >= 1
+        assert db.query(IdempotencyKey).filter(IdempotencyKey.owner == "user:test").count() == 0
+    finally:
+        db.close()
+
+
+def test_etags_make_updates_conditional():
+    from sqlalchemy.orm.exc import StaleDataError
+    from database import Idea
+
+    token = login("creator@example.com", "pass123")
+    r = client.post("/ideas", json={"title": "Versioned idea", "description": "Edited from two tabs"},
+                    headers=auth_headers(token))
+    idea_id = r.json()["id"]
+    r = client.get(f"/ideas/{idea_id}")
+    etag, version = r.headers["etag"], r.json()["version"]
+    assert etag.startswith(f'"{version}.')
+    cached = client.get(f"/ideas/{idea_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.headers["etag"] == etag and not cached.content
+
+    # The first tab's edit wins; the second tab still holds the old ETag and gets 412
+    first = client.put(f"/ideas/{idea_id}", json={"title": "First tab"},
+                       headers=dict(auth_headers(token), **{"If-Match": etag}))
+    assert first.status_code == 200 and first.json()["version"] == version + 1
+    assert first.headers["etag"] != etag
+    second = client.put(f"/ideas/{idea_id}", json={"title": "Second tab"},
+                        headers=dict(auth_headers(token), **{"If-Match": etag}))
+    assert second.status_code == 412
+    assert client.get(f"/ideas/{idea_id}").json()["title"] == "First tab"
+    assert client.get(f"/ideas/{idea_id}", headers={"If-None-Match": etag}).status_code == 200
+    # Weak tags and "*" match too; no If-Match keeps last-writer-wins
+    assert client.put(f"/ideas/{idea_id}", json={"title": "Weak"},
+                      headers=dict(auth_headers(token), **{"If-Match": "W/" + first.headers["etag"]})).status_code == 200
+    assert client.put(f"/ideas/{idea_id}", json={"title": "Any"},
+                      headers=dict(auth_headers(token), **{"If-Match": "*"})).status_code == 200
+
+    me = client.get("/users/me", headers=auth_headers(token))
+    assert client.get("/users/me", headers=dict(auth_headers(token), **{"If-None-Match": me.headers["etag"]})).status_code == 304
+    r = client.put("/users/me", json={"bio": "Updated"}, headers=dict(auth_headers(token), **{"If-Match": me.headers["etag"]}))
+    assert r.status_code == 200
+    r = client.put("/users/me", json={"bio": "Stale"}, headers=dict(auth_headers(token), **{"If-Match": me.headers["etag"]}))
+    assert r.status_code == 412
+
+    # Accepting a proposal (Core UPDATEs) bumps the project's and proposal's versions
+    emp_token = login("emp@example.com", "pass123")
+    project_id = client.post("/projects", json={"title": "Versioned", "description": "d"},
+                             headers=auth_headers(emp_token)).json()["id"]
+    project_etag = client.get(f"/projects/{project_id}").headers["etag"]
+    proposal = client.post("/proposals", json={"project_id": project_id},
+                           headers=auth_headers(login("bidder2@example.com", "pass123"))).json()
+    r = client.put(f"/proposals/{proposal['id']}", json={"status": "accepted"},
+                   headers=dict(auth_headers(emp_token), **{"If-Match": f'"{proposal["version"]}"'}))
+    assert r.status_code == 200 and r.json()["version"] == proposal["version"] + 1
+    assert client.get(f"/projects/{project_id}", headers={"If-None-Match": project_etag}).status_code == 200
+
+    # Rescoring a proposal after its executor is rated leaves its version, so the employer's ETag still holds
+    bidder_token = login("bidder3@example.com", "pass123")
+    bidder_id = client.get("/users/me", headers=auth_headers(bidder_token)).json()["id"]
+    project_id = client.post("/projects", json={"title": "Rescored", "description": "d", "budget": 100},
+                             headers=auth_headers(emp_token)).json()["id"]
+    proposal = client.post("/proposals", json={"project_id": project_id, "proposed_price": 80},
+                           headers=auth_headers(bidder_token)).json()
+    compare_url = f"/projects/{project_id}/proposals/compare"
+    before = client.get(compare_url, headers=auth_headers(emp_token)).json()[0]["executor_rating"]
+    other_id = client.post("/projects", json={"title": "Rated on", "description": "d"},
+                           headers=auth_headers(emp_token)).json()["id"]
+    r = client.post("/ratings", json={"project_id": other_id, "rated_user_id": bidder_id, "rating": 5},
+                    headers=auth_headers(emp_token))
+    assert r.status_code == 200, r.text
+    assert client.get(compare_url, headers=auth_headers(emp_token)).json()[0]["executor_rating"] > before
+    r = client.put(f"/proposals/{proposal['id']}", json={"status": "accepted"},
+                   headers=dict(auth_headers(emp_token), **{"If-Match": f'"{proposal["version"]}"'}))
+    assert r.status_code == 200, r.text
+
+    # Two sessions editing the same row: the later flush's UPDATE ... WHERE version = ? matches nothing
+    a, b = database.SessionLocal(), database.SessionLocal()
+    try:
+        idea_a = a.get(Idea, idea_id)
+        idea_b = b.get(Idea, idea_id)
+        idea_a.title = "Session A"
+        a.commit()
+        idea_b.title = "Session B"
+        with pytest.raises(StaleDataError):
+            b.commit()
+    finally:
+        a.close()
+        b.close()
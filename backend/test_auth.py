@@ -0,0 +1,90 @@
+import os
+from fastapi.testclient import TestClient
+
+
+# Configure test environment before importing app
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["SECRET_KEY"] = "test-secret"
+os.environ["ALGORITHM"] = "HS256"
+os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"] = "60"
+os.environ["UPLOAD_DIR"] = "test_uploads"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import auth  # noqa: E402
+import database  # noqa: E402
+from main import app  # noqa: E402
+
+
+client = TestClient(app)
+
+
+def setup_module(module):
+    database.engine.dispose()
+    if os.path.exists("test.db"):
+        os.remove("test.db")
+    database.Base.metadata.create_all(bind=database.engine)
+
+
+def auth_headers(token: str):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def register_and_login(email: str, role: str = "executor") -> dict:
+    r = client.post("/auth/register", json={
+        "email": email,
+        "password": "pass123",
+        "full_name": "Auth Tester",
+        "role": role,
+    })
+    assert r.status_code == 200, r.text
+    r = client.post("/auth/login", data={"username": email, "password": "pass123"})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_refresh_issues_new_pair_and_refresh_token_is_not_an_access_token():
+    tokens = register_and_login("refresh@example.com")
+    assert tokens["refresh_token"]
+
+    r = client.get("/users/me", headers=auth_headers(tokens["refresh_token"]))
+    assert r.status_code == 401
+
+    r = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert r.status_code == 200, r.text
+    r = client.get("/users/me", headers=auth_headers(r.json()["access_token"]))
+    assert r.status_code == 200
+
+
+def test_logout_revokes_access_and_refresh_tokens():
+    tokens = register_and_login("logout@example.com")
+    r = client.post("/auth/logout", headers=auth_headers(tokens["access_token"]))
+    assert r.status_code == 204
+
+    assert client.get("/users/me", headers=auth_headers(tokens["access_token"])).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+
+def test_stateless_mode_uses_claims_and_honours_revocation(monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_MODE", "stateless")
+    monkeypatch.setattr(auth, "token_versions", auth.TokenVersionCache())
+    tokens = register_and_login("stateless@example.com")
+
+    r = client.get("/dashboard/stats", headers=auth_headers(tokens["access_token"]))
+    assert r.status_code == 200, r.text
+
+    client.post("/auth/logout", headers=auth_headers(tokens["access_token"]))
+    r = client.get("/dashboard/stats", headers=auth_headers(tokens["access_token"]))
+    assert r.status_code == 401
+
+
+def test_key_rotation_keeps_old_kid_valid_until_removed(monkeypatch):
+    monkeypatch.setattr(auth, "SIGNING_KEYS", {"k1": "secret-one"})
+    monkeypatch.setattr(auth, "ACTIVE_KID", "k1")
+    tokens = register_and_login("rotate@example.com")
+
+    monkeypatch.setattr(auth, "SIGNING_KEYS", {"k1": "secret-one", "k2": "secret-two"})
+    monkeypatch.setattr(auth, "ACTIVE_KID", "k2")
+    assert client.get("/users/me", headers=auth_headers(tokens["access_token"])).status_code == 200
+
+    monkeypatch.setattr(auth, "SIGNING_KEYS", {"k2": "secret-two"})
+    assert client.get("/users/me", headers=auth_headers(tokens["access_token"])).status_code == 401
@@ -0,0 +1,95 @@
+import gzip
+
+import zstandard
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from compression import CompressionMiddleware, negotiate
+
+PAYLOAD = [{"id": i, "title": f"Project {i}", "description": "A fairly repetitive description. " * 4} for i in range(50)]
+
+
+def make_client(**options):
+    app = FastAPI()
+
+    @app.get("/items")
+    def items():
+        return PAYLOAD
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((f"line {i}\n" * 50 for i in range(20)), media_type="text/plain")
+
+    @app.get("/archive")
+    def archive():
+        return Response(b"PK" + b"\0" * 4000, media_type="application/zip")
+
+    @app.get("/uploads/report.json")
+    def upload():
+        return PAYLOAD
+
+    options.setdefault("enabled", True)
+    app.add_middleware(CompressionMiddleware, minimum_size=500, **options)
+    return TestClient(app)
+
+
+def test_negotiate_honours_q_values_and_server_order():
+    supported = ["zstd", "br", "gzip"]
+    assert negotiate("gzip, deflate, br", supported) == "br"
+    assert negotiate("gzip;q=1.0, br;q=0.5", supported) == "gzip"
+    assert negotiate("br;q=0, gzip", supported) == "gzip"
+    assert negotiate("*", supported) == "zstd"
+    assert negotiate("identity", supported) is None
+
+
+def test_compresses_large_json_with_negotiated_encoding():
+    client = make_client()
+    for encoding in ("gzip", "br"):
+        r = client.get("/items", headers={"Accept-Encoding": encoding})
+        assert r.headers["content-encoding"] == encoding
+        assert "Accept-Encoding" in r.headers["vary"]
+        assert r.json() == PAYLOAD  # httpx decodes gzip and br
+
+    # Read the raw bytes: this httpx version cannot decode zstd itself.
+    with client.stream("GET", "/items", headers={"Accept-Encoding": "zstd"}) as r:
+        assert r.headers["content-encoding"] == "zstd"
+        raw = b"".join(r.iter_raw())
+    assert int(r.headers["content-length"]) == len(raw)
+    assert zstandard.ZstdDecompressor().decompress(raw, max_output_size=1 << 20).startswith(b'[{"id":0')
+
+
+def test_levels_are_configurable():
+    fast = make_client(levels={"gzip": 0}).get("/items", headers={"Accept-Encoding": "gzip"})
+    best = make_client(levels={"gzip": 9}).get("/items", headers={"Accept-Encoding": "gzip"})
+    assert fast.json() == best.json() == PAYLOAD
+    assert int(best.headers["content-length"]) < int(fast.headers["content-length"])
+
+
+def test_skips_small_binary_uploads_and_identity():
+    client = make_client()
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/archive", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/uploads/report.json", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/items", headers={"Accept-Encoding": "identity"}).headers
+    assert "content-encoding" not in make_client(enabled=False).get(
+        "/items", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_streaming_response_is_compressed_incrementally():
+    client = make_client(encodings=["gzip"])
+    r = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "content-length" not in r.headers
+    assert r.text == "".join(f"line {i}\n" * 50 for i in range(20))
+
+
+def test_raw_gzip_body_round_trips():
+    client = make_client(encodings=["gzip"])
+    with client.stream("GET", "/items", headers={"Accept-Encoding": "gzip"}) as r:
+        raw = b"".join(r.iter_raw())
+    assert gzip.decompress(raw).startswith(b'[{"id":0')
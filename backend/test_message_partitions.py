@@ -0,0 +1,165 @@
+import os
+import re
+
+import pytest
+from sqlalchemy import create_engine, insert, inspect, text
+
+import database
+import message_partitions
+
+# A disposable PostgreSQL database: every table in it is dropped and recreated.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL.startswith("postgresql"), reason="set TEST_DATABASE_URL to a disposable PostgreSQL database"
+)
+
+PROJECTS = 3
+MESSAGES = 300
+
+
+def reset(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {message_partitions.NEW_TABLE}, {message_partitions.OLD_TABLE} CASCADE"))
+        conn.execute(text("DROP FUNCTION IF EXISTS messages_mirror() CASCADE"))
+    database.Base.metadata.drop_all(bind=engine)
+    database.Base.metadata.create_all(bind=engine)
+
+
+def seed(engine):
+    with engine.begin() as conn:
+        conn.execute(insert(database.User), [
+            {"id": uid, "email": f"user{uid}@example.com", "hashed_password": "x", "full_name": f"User {uid}",
+             "role": database.UserRole.EMPLOYER}
+            for uid in (1, 2)
+        ])
+        conn.execute(insert(database.Project), [
+            {"id": pid, "title": f"Project {pid}", "description": "Chat", "employer_id": 1}
+            for pid in range(1, PROJECTS + 1)
+        ])
+        conn.execute(insert(database.Message), [
+            {"project_id": i % PROJECTS + 1, "sender_id": 1, "receiver_id": 2, "content": f"message {i}"}
+            for i in range(MESSAGES)
+        ])
+        # Explicit ids above bypassed the sequences; later inserts must not collide with them.
+        conn.execute(text("SELECT setval('users_id_seq', 2), setval('projects_id_seq', :n)"), {"n": PROJECTS})
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(TEST_DATABASE_URL)
+    reset(engine)
+    seed(engine)
+    yield engine
+    reset(engine)
+    engine.dispose()
+
+
+def contents(conn):
+    return dict(conn.execute(text("SELECT id, content FROM messages")).all())
+
+
+def test_online_partitioning_keeps_rows_and_mirrored_writes(engine):
+    message_partitions.prepare(engine, partitions=4)
+    # Re-running a step is safe.
+    message_partitions.prepare(engine, partitions=4)
+
+    # Writes land between backfill batches, against rows already copied and not copied yet.
+    writes = iter([
+        "INSERT INTO messages (project_id, sender_id, receiver_id, content) VALUES (1, 2, 1, 'during backfill')",
+        "UPDATE messages SET content = 'edited after copy' WHERE id = 10",
+        "UPDATE messages SET content = 'edited before copy', is_read = true WHERE id = 250",
+        "DELETE FROM messages WHERE id = 20",
+        "DELETE FROM messages WHERE id = 280",
+    ])
+
+    def write_between_batches(line):
+        statement = next(writes, None)
+        if statement:
+            with engine.begin() as conn:
+                conn.execute(text(statement))
+
+    copied = message_partitions.backfill(engine, batch_size=50, log=write_between_batches)
+    assert 0 < copied <= MESSAGES
+    assert next(writes, None) is None
+    assert message_partitions.verify(engine)
+
+    with engine.connect() as conn:
+        expected = contents(conn)
+    message_partitions.swap(engine)
+
+    with engine.connect() as conn:
+        assert message_partitions.is_partitioned(conn)
+        assert contents(conn) == expected
+        assert len(expected) == MESSAGES + 1 - 2
+        assert expected[10] == "edited after copy" and expected[250] == "edited before copy"
+        assert 20 not in expected and 280 not in expected
+        assert "during backfill" in expected.values()
+        assert conn.execute(text("SELECT is_read FROM messages WHERE id = 250")).scalar() is True
+
+    # After the swap, new rows take the next id from the same sequence and land in one partition.
+    with engine.begin() as conn:
+        new_id, partition = conn.execute(text(
+            "INSERT INTO messages (project_id, sender_id, receiver_id, content) VALUES (2, 1, 2, 'after swap') "
+            "RETURNING id, tableoid::regclass::text"
+        )).one()
+    assert new_id > max(expected)
+    assert partition.startswith("messages_p")
+    names = {i["name"] for i in inspect(engine).get_indexes("messages")}
+    assert "ix_messages_project_id_id" in names
+    with engine.connect() as conn:
+        assert not conn.execute(text("SELECT 1 FROM pg_trigger WHERE tgname = 'messages_mirror'")).first()
+        plan = "\n".join(r[0] for r in conn.execute(text("EXPLAIN SELECT * FROM messages WHERE project_id = 2")))
+    # Pruned to the one partition that holds project 2.
+    assert len(set(re.findall(r" on (messages_p\d+)", plan))) == 1
+
+    assert message_partitions.migrate(engine) == "already partitioned"
+    message_partitions.drop_old(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text(f"SELECT to_regclass('{message_partitions.OLD_TABLE}')")).scalar() is None
+
+
+def test_migrate_runs_every_step(engine):
+    assert message_partitions.migrate(engine, partitions=2, batch_size=100, log=lambda line: None) == "partitioned"
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM messages")).scalar() == MESSAGES
+        assert conn.execute(text(f"SELECT count(*) FROM {message_partitions.OLD_TABLE}")).scalar() == MESSAGES
+
+
+def test_backfill_races_a_concurrent_writer(engine):
+    import threading
+
+    message_partitions.prepare(engine, partitions=4)
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        i = 0
+        try:
+            while not stop.is_set():
+                i += 1
+                with engine.begin() as conn:
+                    conn.execute(text("UPDATE messages SET content = :c WHERE id = :id"),
+                                 {"c": f"race {i}", "id": i % MESSAGES + 1})
+                    conn.execute(text(
+                        "INSERT INTO messages (project_id, sender_id, receiver_id, content) VALUES (3, 2, 1, :c)"
+                    ), {"c": f"insert {i}"})
+        except Exception as exc:  # surfaced below; a thread's exception would otherwise be lost
+            errors.append(exc)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        message_partitions.backfill(engine, batch_size=10, log=lambda line: None)
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == []
+
+    assert message_partitions.verify(engine)
+    with engine.connect() as conn:
+        expected = contents(conn)
+    message_partitions.swap(engine)
+    with engine.connect() as conn:
+        assert contents(conn) == expected
+    assert len(expected) > MESSAGES
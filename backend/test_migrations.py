@@ -0,0 +1,69 @@
+import os
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+import database
+from create_tables import upgrade
+
+MIGRATIONS_DB = "test_migrations.db"
+
+
+def fresh_engine():
+    if os.path.exists(MIGRATIONS_DB):
+        os.remove(MIGRATIONS_DB)
+    return create_engine(f"sqlite:///./{MIGRATIONS_DB}")
+
+
+def schema_diff(connection):
+    return compare_metadata(MigrationContext.configure(connection), database.Base.metadata)
+
+
+def test_upgrade_from_empty_matches_models():
+    engine = fresh_engine()
+    with engine.begin() as connection:
+        upgrade(connection)
+    with engine.connect() as connection:
+        assert schema_diff(connection) == []
+    engine.dispose()
+
+
+def test_upgrade_adds_columns_to_a_baseline_database():
+    engine = fresh_engine()
+    with engine.begin() as connection:
+        upgrade(connection, "baseline")
+        assert "token_version" not in {c["name"] for c in inspect(connection).get_columns("users")}
+        connection.execute(text(
+            "INSERT INTO users (email, hashed_password, full_name, role) "
+            "VALUES ('old@example.com', 'x', 'Old User', 'EXECUTOR')"
+        ))
+        connection.execute(text(
+            "INSERT INTO projects (title, description, employer_id) VALUES ('Old', 'Project', 1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO file_uploads (project_id, uploaded_by, filename, file_url, file_size) "
+            "VALUES (1, 1, 'a.txt', '/uploads/a.txt', 300)"
+        ))
+    with engine.begin() as connection:
+        upgrade(connection)
+        row = connection.execute(text(
+            "SELECT token_version, unread_notifications, storage_bytes, version FROM users"
+        )).one()
+        assert tuple(row) == (0, 0, 300, 1)
+        assert tuple(connection.execute(text("SELECT storage_bytes, version FROM projects")).one()) == (300, 1)
+    with engine.connect() as connection:
+        assert schema_diff(connection) == []
+    engine.dispose()
+
+
+def test_upgrade_is_a_no_op_on_a_create_all_database():
+    engine = fresh_engine()
+    database.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        upgrade(connection)
+        assert connection.execute(text("SELECT version_num FROM alembic_version")).scalar() is not None
+    with engine.connect() as connection:
+        assert schema_diff(connection) == []
+    engine.dispose()
+    os.remove(MIGRATIONS_DB)
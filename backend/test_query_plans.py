@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+from query_plans import compare, full_scans
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PLANS_DB = "test_plans.db"
+
+
+def result(queries, scans=(), plans=None):
+    return {"status": 200, "queries": queries, "full_scans": list(scans), "plans": plans or []}
+
+
+def test_full_scans_ignores_index_lookups():
+    plan = [
+        "SEARCH projects USING INDEX ix_projects_status (status=?)",
+        "SCAN ratings",
+        "  SCAN users AS users_1",
+        "SCAN proposals USING INDEX ix_proposals_project_id",
+        "Seq Scan on messages",
+        "Index Scan using ix_ideas_id on ideas",
+    ]
+    assert full_scans(plan) == ["ratings", "users", "messages"]
+
+
+def test_compare_fails_on_extra_queries_and_new_large_scans():
+    snapshot = {"GET /a": result(2, ["ratings"]), "GET /b": result(3)}
+    current = {
+        "GET /a": result(2, ["ratings"]),
+        "GET /b": result(4, ["messages", "tiny_lookup"]),
+        "GET /c": result(1),
+    }
+    failures, notes = compare(current, snapshot)
+    assert failures == ["GET /b: 3 -> 4 queries", "GET /b: new full scan of messages"]
+    assert "GET /c: not in snapshot" in notes
+
+
+def test_compare_accepts_fewer_queries():
+    failures, notes = compare({"GET /a": result(1)}, {"GET /a": result(5)})
+    assert failures == []
+    assert notes == ["GET /a: 5 -> 1 queries"]
+
+
+def test_hot_endpoints_match_snapshot():
+    try:
+        proc = subprocess.run(
+            [sys.executable, "query_plans.py", "--database-url", f"sqlite:///./{PLANS_DB}",
+             "--check", "query_plans.json"],
+            cwd=HERE, capture_output=True, text=True, timeout=300,
+        )
+    finally:
+        if os.path.exists(os.path.join(HERE, PLANS_DB)):
+            os.remove(os.path.join(HERE, PLANS_DB))
+    assert proc.returncode == 0, proc.stdout + proc.stderr
@@ -0,0 +1,63 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ratelimit import ConcurrencyLimit, MemoryBucketStore, RateLimitMiddleware, RateLimitRule
+
+
+def make_client(rules, concurrency_limits=()):
+    app = FastAPI()
+
+    @app.get("/ideas")
+    def ideas():
+        return []
+
+    @app.post("/auth/login")
+    async def login():
+        await asyncio.sleep(0.2)
+        return {}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=rules,
+        concurrency_limits=list(concurrency_limits),
+        store=MemoryBucketStore(),
+        enabled=True,
+    )
+    return TestClient(app)
+
+
+def test_bucket_exhaustion_returns_429_with_headers():
+    client = make_client([RateLimitRule("ideas", r"^/ideas$", per_minute=60, burst=2, key="ip")])
+
+    first = client.get("/ideas")
+    assert first.status_code == 200
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Remaining"] == "1"
+    assert client.get("/ideas").status_code == 200
+
+    limited = client.get("/ideas")
+    assert limited.status_code == 429
+    assert limited.headers["RateLimit-Remaining"] == "0"
+    assert int(limited.headers["Retry-After"]) >= 1
+
+
+def test_query_param_rule_only_limits_searches():
+    client = make_client([RateLimitRule("search", r"^/ideas$", per_minute=1, burst=1, query_param="search")])
+
+    assert client.get("/ideas?search=x").status_code == 200
+    assert client.get("/ideas?search=x").status_code == 429
+    plain = client.get("/ideas")
+    assert plain.status_code == 200
+    assert "RateLimit-Limit" not in plain.headers
+
+
+def test_concurrency_cap_sheds_excess_requests():
+    from concurrent.futures import ThreadPoolExecutor
+
+    client = make_client([], [ConcurrencyLimit("login", r"^/auth/login$", max_in_flight=1)])
+    with client:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            codes = list(pool.map(lambda _: client.post("/auth/login").status_code, range(4)))
+    assert codes.count(200) >= 1
+    assert 503 in codes
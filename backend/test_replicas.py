@@ -0,0 +1,81 @@
+import os
+from fastapi.testclient import TestClient
+
+
+# Configure test environment before importing app
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["SECRET_KEY"] = "test-secret"
+os.environ["ALGORITHM"] = "HS256"
+os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"] = "60"
+os.environ["UPLOAD_DIR"] = "test_uploads"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import database  # noqa: E402
+from main import app  # noqa: E402
+
+REPLICA_DB = "test_replica.db"
+
+
+def setup_module(module):
+    database.engine.dispose()
+    for path in ("test.db", REPLICA_DB):
+        if os.path.exists(path):
+            os.remove(path)
+    database.Base.metadata.create_all(bind=database.engine)
+
+
+def teardown_module(module):
+    database.replica_router.dispose()
+    database.replica_router = database.ReplicaRouter([])
+    if os.path.exists(REPLICA_DB):
+        os.remove(REPLICA_DB)
+
+
+def use_replicas(monkeypatch, urls):
+    router = database.ReplicaRouter(urls)
+    monkeypatch.setattr(database, "replica_router", router)
+    return router
+
+
+def test_reads_go_to_replica_until_client_writes(monkeypatch):
+    router = use_replicas(monkeypatch, [f"sqlite:///./{REPLICA_DB}"])
+    # The "replica" has the schema but never receives the primary's writes.
+    database.Base.metadata.create_all(bind=router.replicas[0].engine)
+
+    client = TestClient(app)
+    client.post("/auth/register", json={
+        "email": "replica@example.com", "password": "pass123", "full_name": "Replica", "role": "idea_creator",
+    })
+    token = client.post("/auth/login", data={"username": "replica@example.com", "password": "pass123"}).json()["access_token"]
+    r = client.post("/ideas", json={"title": "Replicated", "description": "Routing test"},
+                    headers={"Authorization": f"Bearer {token}", "Origin": "http://localhost:3000"})
+    assert r.status_code == 200, r.text
+    assert r.cookies.get(database.READ_YOUR_WRITES_COOKIE)
+    # Cross-origin frontends can read the header and echo it on their next reads.
+    assert float(r.headers["X-Read-Your-Writes"]) > 0
+    assert "X-Read-Your-Writes" in r.headers["Access-Control-Expose-Headers"]
+
+    # Sticky client reads its own write from the primary.
+    assert [i["title"] for i in client.get("/ideas").json()] == ["Replicated"]
+
+    # A fresh client is routed to the lagging replica.
+    assert TestClient(app).get("/ideas").json() == []
+
+
+def test_unhealthy_replica_falls_back_to_primary(monkeypatch):
+    router = use_replicas(monkeypatch, ["sqlite:////nonexistent-dir/replica.db"])
+    assert router.check_all() == {"sqlite:////nonexistent-dir/replica.db": False}
+
+    client = TestClient(app)
+    client.post("/auth/register", json={
+        "email": "fallback@example.com", "password": "pass123", "full_name": "Fallback", "role": "idea_creator",
+    })
+    token = client.post("/auth/login", data={"username": "fallback@example.com", "password": "pass123"}).json()["access_token"]
+    r = client.post("/ideas", json={"title": "Fallback", "description": "Unhealthy replica test"},
+                    headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 200, r.text
+
+    # A client that never wrote would be sent to the replica; it is down, so the primary answers.
+    r = TestClient(app).get("/ideas")
+    assert r.status_code == 200
+    assert "Fallback" in [i["title"] for i in r.json()]
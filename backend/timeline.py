@@ -0,0 +1,61 @@
+"""
+Per-project activity log.
+
+Every domain event that carries a `project_id` (see events.py) is appended
+to project_events in the same transaction as the change itself. The log is
+read newest first with keyset pagination over the (project_id, id) index:
+a page is one index range scan no matter how deep the client scrolls, and
+rows appended while paging never shift or duplicate entries.
+"""
+import json
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import events
+from database import ProjectEvent, User
+
+MAX_PAGE_SIZE = 200
+
+
+@events.subscribe("*")
+def record_event(db: Session, name: str, data: dict) -> None:
+    project_id = data.get("project_id")
+    if project_id is None:
+        return
+    details = {k: v for k, v in data.items() if k not in ("project_id", "actor_id")}
+    db.add(ProjectEvent(
+        project_id=project_id,
+        actor_id=data.get("actor_id"),
+        kind=name,
+        data=json.dumps(details, ensure_ascii=False, default=str),
+    ))
+
+
+def read_timeline(db: Session, project_id: int, before: Optional[int] = None,
+                  limit: int = 50) -> Tuple[List[dict], Optional[int]]:
+    """One page of a project's events, newest first, and the cursor of the next page."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = (
+        db.query(ProjectEvent, User.full_name)
+        .outerjoin(User, User.id == ProjectEvent.actor_id)
+        .filter(ProjectEvent.project_id == project_id)
+    )
+    if before is not None:
+        query = query.filter(ProjectEvent.id < before)
+    # One extra row tells whether another page exists without a COUNT.
+    rows = query.order_by(ProjectEvent.id.desc()).limit(limit + 1).all()
+    items = [
+        {
+            "id": event.id,
+            "project_id": event.project_id,
+            "kind": event.kind,
+            "actor_id": event.actor_id,
+            "actor_name": actor_name,
+            "data": json.loads(event.data) if event.data else {},
+            "created_at": event.created_at,
+        }
+        for event, actor_name in rows[:limit]
+    ]
+    next_before = items[-1]["id"] if len(rows) > limit else None
+    return items, next_before
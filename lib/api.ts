@@ -14,6 +14,15 @@ axios.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    // One key per write: a retry of this same request config reuses it, so the
+    // backend replays the first response instead of creating a duplicate.
+    const method = (config.method || 'get').toLowerCase();
+    if ((method === 'post' || method === 'patch') && !config.headers['Idempotency-Key']) {
+      config.headers['Idempotency-Key'] =
+        typeof crypto !== 'undefined' && crypto.randomUUID
+          ? crypto.randomUUID()
+          : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
     return config;
   },
   (error) => {
@@ -33,4 +42,12 @@ axios.interceptors.response.use(
   }
 );
 
+// Project page data in one round trip: the project with its proposals, files,
+// messages and ratings. Sections the caller may not see are null; signed-out
+// visitors get the project and its ratings.
+export const fetchProjectBundle = async (projectId: number) => {
+  const res = await axios.get(`/projects/${projectId}/bundle`);
+  return res.data;
+};
+
 export default axios;